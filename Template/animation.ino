@@ -1,30 +1,142 @@
-#include <Wire.h>
-#include <Adafruit_GFX.h>
-#include <Adafruit_SSD1306.h> // Corrected library name
-
-#define SCREEN_WIDTH 128
-#define SCREEN_HEIGHT 64 // Corrected define name
-
-Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, -1);
-
-int frame_delay = 70;
-
-// __FRAME_DEFINITIONS__ // Placeholder for generated array definitions
-
-void setup() {
-  Serial.begin(9600); // Optional: Good for debugging
-  
-  if(!display.begin(SSD1306_SWITCHCAPVCC, 0x3C)) {
-    Serial.println(F("SSD1306 allocation failed"));
-    for(;;);
-  }
-  display.clearDisplay(); // Clear display on setup
-  display.display();
-}
-
-void loop() {
-  // __FRAME_LOOP__ // Placeholder for generated loop code
-
-  // Optional: Adjust delay logic if needed
-  // if (frame_delay>50) frame_delay=frame_delay-20; 
+#include <Wire.h>
+#include <Adafruit_GFX.h>
+#include <Adafruit_SSD1306.h> // Corrected library name
+
+#define SCREEN_WIDTH 128
+#define SCREEN_HEIGHT 64 // Corrected define name
+#define SCREEN_ADDRESS 0x3C
+
+Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, -1);
+
+int frame_delay = 70;
+
+// __FRAME_DEFINITIONS__ // Placeholder for generated array definitions
+
+#ifdef FRAME_CODEC
+// Frame decoder for compressed frames (format described in frame_codec.py)
+#define FRAME_RAW 0
+#define FRAME_RLE 1
+#define FRAME_XOR 2
+
+#ifndef FRAME_LAYOUT_PAGES
+uint8_t frame_buffer[FRAME_BYTES]; // Page layout frames decode straight into the display buffer
+#endif
+
+// Unpacks one encoded frame into dst, which must still hold the previous frame
+void decodeFrame(uint8_t* dst, const uint8_t* src) {
+  uint8_t type = pgm_read_byte(src++);
+  if (type == FRAME_RAW) {
+    memcpy_P(dst, src, FRAME_BYTES);
+    return;
+  }
+
+  uint16_t pos = 0;
+  while (pos < FRAME_BYTES) {
+    uint8_t control = pgm_read_byte(src++);
+    if (control & 0x80) { // Repeat run
+      uint8_t count = (control & 0x7F) + 2;
+      uint8_t value = pgm_read_byte(src++);
+      if (type == FRAME_XOR) {
+        if (value) {
+          for (uint8_t i = 0; i < count; i++) dst[pos + i] ^= value;
+        }
+      } else {
+        memset(dst + pos, value, count);
+      }
+      pos += count;
+    } else { // Literal run
+      uint8_t count = control + 1;
+      for (uint8_t i = 0; i < count; i++) {
+        uint8_t value = pgm_read_byte(src++);
+        if (type == FRAME_XOR) dst[pos + i] ^= value;
+        else dst[pos + i] = value;
+      }
+      pos += count;
+    }
+  }
+}
+#endif
+
+#ifdef DIRTY_RECTS
+// Partial updates: rect is { x0, x1, page0, page1 } (inclusive, pages are 8 rows)
+
+#ifdef FRAME_LAYOUT_PAGES
+// Copies only the window of a page layout frame into the display buffer
+void copyWindow(const uint8_t* bitmap, const uint8_t* rect) {
+  uint8_t* buffer = display.getBuffer();
+  for (uint8_t page = rect[2]; page <= rect[3]; page++) {
+    uint16_t offset = page * SCREEN_WIDTH + rect[0];
+    memcpy_P(buffer + offset, bitmap + offset, rect[1] - rect[0] + 1);
+  }
+}
+#else
+// Redraws only the window of a horizontally packed bitmap into the display buffer.
+// pgm_read_byte() reads flash and RAM alike on the ESP8266.
+void drawWindow(const uint8_t* bitmap, const uint8_t* rect) {
+  const uint16_t row_bytes = (SCREEN_WIDTH + 7) / 8;
+  for (int16_t y = rect[2] * 8; y < (rect[3] + 1) * 8 && y < SCREEN_HEIGHT; y++) {
+    for (int16_t x = rect[0]; x <= rect[1]; x++) {
+      uint8_t bits = pgm_read_byte(bitmap + y * row_bytes + x / 8);
+      display.drawPixel(x, y, (bits & (0x80 >> (x & 7))) ? SSD1306_WHITE : SSD1306_BLACK);
+    }
+  }
+}
+#endif
+
+// Adafruit_SSD1306 raises the bus to 400 kHz only inside its own transactions
+// and drops it back to 100 kHz after each one, so sendWindow() raises it itself
+#define I2C_CLOCK 400000UL       // Adafruit_SSD1306's default clkDuring
+#define I2C_CLOCK_AFTER 100000UL // Adafruit_SSD1306's default clkAfter
+
+// Data bytes per transaction: the Wire buffer less the 0x40 control byte,
+// sized like display() does (128 bytes on the ESP8266, 32 on AVR boards)
+#if defined(I2C_BUFFER_LENGTH)
+#define WIRE_DATA_BYTES (I2C_BUFFER_LENGTH - 1)
+#elif defined(BUFFER_LENGTH)
+#define WIRE_DATA_BYTES (BUFFER_LENGTH - 1)
+#else
+#define WIRE_DATA_BYTES 31
+#endif
+
+// Sends only the window from the display buffer over I2C
+void sendWindow(const uint8_t* rect) {
+  display.ssd1306_command(SSD1306_COLUMNADDR);
+  display.ssd1306_command(rect[0]);
+  display.ssd1306_command(rect[1]);
+  display.ssd1306_command(SSD1306_PAGEADDR);
+  display.ssd1306_command(rect[2]);
+  display.ssd1306_command(rect[3]);
+
+  uint8_t* buffer = display.getBuffer();
+  Wire.setClock(I2C_CLOCK);
+  for (uint8_t page = rect[2]; page <= rect[3]; page++) {
+    uint8_t* src = buffer + page * SCREEN_WIDTH;
+    uint16_t x = rect[0];
+    while (x <= rect[1]) {
+      Wire.beginTransmission(SCREEN_ADDRESS);
+      Wire.write((uint8_t)0x40); // Data stream
+      for (uint16_t n = 0; n < WIRE_DATA_BYTES && x <= rect[1]; n++, x++) Wire.write(src[x]);
+      Wire.endTransmission();
+    }
+  }
+  Wire.setClock(I2C_CLOCK_AFTER);
+}
+#endif
+
+void setup() {
+  Serial.begin(9600); // Optional: Good for debugging
+  
+  if(!display.begin(SSD1306_SWITCHCAPVCC, SCREEN_ADDRESS)) {
+    Serial.println(F("SSD1306 allocation failed"));
+    for(;;);
+  }
+  display.clearDisplay(); // Clear display on setup
+  display.display();
+}
+
+void loop() {
+  // __FRAME_LOOP__ // Placeholder for generated loop code
+
+  // Optional: Adjust delay logic if needed
+  // if (frame_delay>50) frame_delay=frame_delay-20; 
 }
\ No newline at end of file
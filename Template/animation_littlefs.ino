@@ -0,0 +1,82 @@
+#include <Wire.h>
+#include <Adafruit_GFX.h>
+#include <Adafruit_SSD1306.h>
+#include <LittleFS.h>
+
+#define SCREEN_WIDTH 128
+#define SCREEN_HEIGHT 64
+#define SCREEN_ADDRESS 0x3C
+
+Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, -1);
+
+int frame_delay = 70;
+
+// __FRAME_DEFINITIONS__ // Placeholder for generated asset settings
+
+// Frames are streamed from a binary asset on LittleFS (format described in frame_asset.py).
+// Upload the sketch's data/ folder with the LittleFS filesystem uploader.
+#define ASSET_HEADER_BYTES 20
+
+File asset;
+uint16_t FRAME_COUNT = 0;
+
+#ifdef FRAME_LAYOUT_PAGES
+#define ASSET_LAYOUT 1 // Layout byte in the asset header: 0 = horizontal, 1 = SSD1306 pages
+#else
+#define ASSET_LAYOUT 0
+uint8_t frame_buffer[FRAME_BYTES]; // Page layout frames are read straight into the display buffer
+#endif
+
+uint16_t readU16(const uint8_t* p) { return p[0] | (p[1] << 8); }
+uint32_t readU32(const uint8_t* p) { return readU16(p) | ((uint32_t)readU16(p + 2) << 16); }
+
+// Opens the asset and checks it was built for this sketch's frame settings
+bool openAsset() {
+  if (!LittleFS.begin()) return false;
+  asset = LittleFS.open(ASSET_PATH, "r");
+  if (!asset) return false;
+
+  uint8_t header[ASSET_HEADER_BYTES];
+  if (asset.read(header, sizeof(header)) != sizeof(header)) return false;
+  if (memcmp(header, "ANIM", 4) != 0 || readU16(header + 4) != 1) return false;
+  if (readU16(header + 6) != FRAME_WIDTH || readU16(header + 8) != FRAME_HEIGHT) return false;
+  if (header[10] != ASSET_LAYOUT) return false; // Both layouts can have the same frame size
+  if (readU16(header + 14) != FRAME_BYTES) return false;
+  FRAME_COUNT = readU16(header + 12);
+  return true;
+}
+
+// Reads frame i into dst and returns its duration. The offset table gives
+// the frame's position directly, so any frame can be read in constant time.
+uint16_t readFrame(uint16_t i, uint8_t* dst) {
+  uint8_t entry[4];
+  asset.seek(ASSET_HEADER_BYTES + 4 * (uint32_t)FRAME_COUNT + 2 * i); // Durations follow the offset table
+  asset.read(entry, 2);
+  uint16_t duration = readU16(entry);
+
+  asset.seek(ASSET_HEADER_BYTES + 4 * (uint32_t)i);
+  asset.read(entry, 4);
+  asset.seek(readU32(entry));
+  asset.read(dst, FRAME_BYTES);
+  return duration;
+}
+
+void setup() {
+  Serial.begin(9600); // Optional: Good for debugging
+
+  if(!display.begin(SSD1306_SWITCHCAPVCC, SCREEN_ADDRESS)) {
+    Serial.println(F("SSD1306 allocation failed"));
+    for(;;);
+  }
+  display.clearDisplay(); // Clear display on setup
+  display.display();
+
+  if (!openAsset()) {
+    Serial.println(F("Frame asset " ASSET_PATH " missing or built for other settings"));
+    for(;;) delay(1000);
+  }
+}
+
+void loop() {
+  // __FRAME_LOOP__ // Placeholder for generated loop code
+}
@@ -0,0 +1,97 @@
+"""
+Compares bbox-limited GIF compositing (image_splitter.iter_gif_frames) with
+the previous full-canvas approach on large, heavily optimized GIFs.
+
+    python3 benchmarks/bench_compositing.py [--frames 200] [--size 1280x720]
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageSequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_splitter import iter_gif_frames
+
+
+def make_optimized_gif(path, size, frame_count, disposal):
+    """Writes a GIF with a static background and a small moving sprite, so
+    every frame after the first only updates a small rectangle."""
+    width, height = size
+    background = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(background)
+    for x in range(0, width, 40):
+        draw.line((x, 0, x, height), fill="gray")
+
+    frames = []
+    for i in range(frame_count):
+        frame = background.copy()
+        x = (i * 7) % (width - 48)
+        y = (i * 3) % (height - 48)
+        ImageDraw.Draw(frame).ellipse((x, y, x + 47, y + 47), fill="black")
+        frames.append(frame)
+
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=40,
+                   loop=0, optimize=True, disposal=disposal)
+
+
+def composite_full_frames(gif_path):
+    """The previous approach: every frame is converted to a full-size RGBA
+    image and pasted over the whole canvas."""
+    with Image.open(gif_path) as im:
+        canvas = Image.new("RGBA", im.size)
+        for frame in ImageSequence.Iterator(im):
+            frame_rgba = frame.convert("RGBA")
+            canvas.paste(frame_rgba, (0, 0), frame_rgba)
+            yield canvas
+
+
+def first_mismatch(gif_path):
+    """Compares both compositors frame by frame. Returns the index of the
+    first frame they disagree on, or None if every frame is identical."""
+    pairs = itertools.zip_longest(composite_full_frames(gif_path), iter_gif_frames(gif_path))
+    for frame_index, (full_frame, bbox_frame) in enumerate(pairs):
+        if full_frame is None or bbox_frame is None or not np.array_equal(np.asarray(full_frame),
+                                                                          np.asarray(bbox_frame)):
+            return frame_index
+    return None
+
+
+def time_frames(frame_iterator):
+    start = time.perf_counter()
+    count = sum(1 for _ in frame_iterator)
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT")
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for disposal in (1, 2, 3):
+            gif_path = os.path.join(temp_dir, f"bench_disposal{disposal}.gif")
+            make_optimized_gif(gif_path, size, args.frames, disposal)
+
+            # Timings only mean something if both produce the same frames
+            mismatch = first_mismatch(gif_path)
+            if mismatch is not None:
+                print(f"Error: disposal {disposal}: the compositors differ at frame {mismatch}")
+                sys.exit(1)
+
+            count, full_time = time_frames(composite_full_frames(gif_path))
+            _, bbox_time = time_frames(iter_gif_frames(gif_path))
+            print(f"{size[0]}x{size[1]}, {count} frames, disposal {disposal}: "
+                  f"full canvas {count / full_time:7.1f} fps, "
+                  f"bbox {count / bbox_time:7.1f} fps "
+                  f"({full_time / bbox_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Times the three stages of the script workflow (split, convert, generate) on a
+synthetic GIF corpus plus input_videos/test.gif, and compares runs.
+
+    python3 benchmarks/bench_stages.py -o results.json
+    python3 benchmarks/bench_stages.py --compare baseline.json [--threshold 0.1]
+    python3 benchmarks/bench_stages.py --compare baseline.json --results results.json
+
+Every stage is run --repeat times and the fastest run is kept. Peak memory is
+measured in one extra run under tracemalloc, so it covers Python and numpy
+allocations but not Pillow's own image buffers. Compare mode exits with
+status 1 when a stage got slower (frames/sec) or hungrier (peak memory) than
+the baseline by more than the threshold, or when a baseline stage or case is
+missing from the new results.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPT_DIR)
+from image_splitter import split_gif_frames
+from frame_generator import batch_convert_images_to_c_array
+from code_generator import (
+    TEMPLATE_INO_PATH,
+    build_frame_code,
+    load_header_frames,
+    read_file_content,
+    write_sketch,
+)
+
+# --- Configuration ---
+TARGET_WIDTH = 128
+TARGET_HEIGHT = 64
+REPEAT = 3
+THRESHOLD = 0.10          # Allowed frames/sec drop before compare mode fails (10%)
+MEMORY_THRESHOLD = 0.25   # Allowed peak memory growth before compare mode fails (25%)
+TEST_GIF = os.path.join(SCRIPT_DIR, "input_videos", "test.gif")
+# --- End Configuration ---
+
+RESULTS_VERSION = 1
+STAGES = ("split", "convert", "generate")
+
+# name: (size, frame count, style)
+#   full     every pixel changes, no GIF optimization
+#   sprite   static background with a moving sprite, optimized, frames kept (disposal 1)
+#   restore  like sprite, each frame's region cleared afterwards (disposal 2)
+#   previous like sprite, each frame's region restored afterwards (disposal 3)
+CORPUS = {
+    "small_full": ((128, 64), 60, "full"),
+    "medium_full": ((320, 240), 60, "full"),
+    "medium_sprite": ((320, 240), 120, "sprite"),
+    "large_sprite": ((640, 360), 120, "sprite"),
+    "medium_restore": ((320, 240), 120, "restore"),
+    "medium_previous": ((320, 240), 120, "previous"),
+}
+DISPOSALS = {"full": 0, "sprite": 1, "restore": 2, "previous": 3}
+
+
+def make_gif(path, size, frame_count, style):
+    """Writes one synthetic GIF of the corpus."""
+    width, height = size
+    frames = []
+    if style == "full":
+        # Diagonal stripes sliding across the whole frame
+        y, x = np.mgrid[0:height, 0:width]
+        for i in range(frame_count):
+            stripes = ((x + y + 3 * i) // 6 % 2 * 255).astype(np.uint8)
+            frames.append(Image.fromarray(stripes).convert("RGB"))
+    else:
+        background = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(background)
+        for x in range(0, width, 16):
+            draw.line((x, 0, x, height), fill="gray")
+        sprite = max(min(width, height) // 6, 4)
+        for i in range(frame_count):
+            frame = background.copy()
+            x = (i * 5) % (width - sprite)
+            y = (i * 3) % (height - sprite)
+            ImageDraw.Draw(frame).ellipse((x, y, x + sprite - 1, y + sprite - 1), fill="black")
+            frames.append(frame)
+
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=50, loop=0,
+                   optimize=style != "full", disposal=DISPOSALS[style])
+
+
+def run_quietly(function, *args):
+    """Runs a stage with its progress output discarded."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def measure(function, args, repeat):
+    """Returns (fastest run in seconds, peak traced memory in bytes) for one stage."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_quietly(function, *args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        run_quietly(function, *args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def generate_sketch_from_headers(header_folder, template_content, output_path):
+    """The code_generator.py assembly step: read headers, build the sketch and write it."""
+    packed_frames, source_names, durations = load_header_frames(header_folder)
+    frame_definitions, loop_code_blocks = build_frame_code(
+        packed_frames, source_names, width=TARGET_WIDTH, height=TARGET_HEIGHT,
+        durations=durations if any(durations) else None
+    )
+    write_sketch(output_path, template_content, frame_definitions, loop_code_blocks)
+
+
+def benchmark_gif(name, gif_path, work_dir, template_content, repeat, workers):
+    """Times every stage for one GIF. Returns {"<name>/<stage>": result}."""
+    frames_dir = os.path.join(work_dir, name, "frames")
+    headers_dir = os.path.join(work_dir, name, "headers")
+    output_path = os.path.join(work_dir, name, "sketch.ino")
+
+    stage_calls = {
+        "split": (split_gif_frames, (gif_path, frames_dir)),
+        "convert": (batch_convert_images_to_c_array,
+                    (frames_dir, headers_dir, TARGET_WIDTH, TARGET_HEIGHT, False, workers)),
+        "generate": (generate_sketch_from_headers, (headers_dir, template_content, output_path)),
+    }
+
+    results = {}
+    for stage in STAGES:
+        function, args = stage_calls[stage]
+        seconds, peak = measure(function, args, repeat)
+        frame_count = len(os.listdir(frames_dir))
+        results[f"{name}/{stage}"] = {
+            "frames": frame_count,
+            "seconds": round(seconds, 6),
+            "fps": round(frame_count / seconds, 2),
+            "peak_memory_kb": peak // 1024,
+        }
+        print(f"  {name:<16} {stage:<9} {frame_count:4d} frames  {seconds * 1000:9.1f} ms  "
+              f"{frame_count / seconds:9.1f} fps  {peak // 1024:7d} KiB peak")
+    return results
+
+
+def run_benchmarks(repeat=REPEAT, workers=1, cases=None):
+    """Builds the corpus in a temporary folder and benchmarks every GIF. Returns the results dict."""
+    template_content = read_file_content(TEMPLATE_INO_PATH)
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        gifs = {}
+        for name, (size, frame_count, style) in CORPUS.items():
+            if cases and name not in cases:
+                continue
+            gifs[name] = os.path.join(work_dir, f"{name}.gif")
+            make_gif(gifs[name], size, frame_count, style)
+        if os.path.exists(TEST_GIF) and (not cases or "test_gif" in cases):
+            gifs["test_gif"] = TEST_GIF
+
+        print(f"Benchmarking {len(gifs)} GIF(s), best of {repeat} run(s), {TARGET_WIDTH}x{TARGET_HEIGHT} target")
+        for name, gif_path in gifs.items():
+            results.update(benchmark_gif(name, gif_path, work_dir, template_content, repeat, workers))
+
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "workers": workers,
+        "results": results,
+    }
+
+
+def compare_results(baseline, current, threshold=THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    """
+    Prints every stage of current against baseline.
+
+    Args:
+        baseline (dict): Results of an earlier run.
+        current (dict): Results to check.
+        threshold (float): Allowed relative drop in frames/sec.
+        memory_threshold (float): Allowed relative growth in peak memory.
+
+    Returns:
+        bool: True if no stage regressed past the thresholds and every
+        baseline stage and case is in current.
+    """
+    ok = True
+    missing = 0
+    print(f"\n{'stage':<28} {'baseline fps':>12} {'fps':>10} {'change':>8} {'peak KiB':>10} {'change':>8}")
+    for key, old in baseline["results"].items():
+        new = current["results"].get(key)
+        if new is None:
+            # A stage that stopped running (or crashed) is a failure, not a skip
+            missing += 1
+            ok = False
+            print(f"{key:<28} {old['fps']:12.1f} {'-':>10} {'':>8} {'-':>10} {'':>8}  MISSING")
+            continue
+        fps_change = new["fps"] / old["fps"] - 1
+        memory_change = new["peak_memory_kb"] / max(old["peak_memory_kb"], 1) - 1
+        problems = []
+        if fps_change < -threshold:
+            problems.append("SLOWER")
+        if memory_change > memory_threshold:
+            problems.append("MORE MEMORY")
+        ok = ok and not problems
+        print(f"{key:<28} {old['fps']:12.1f} {new['fps']:10.1f} {100 * fps_change:+7.1f}% "
+              f"{new['peak_memory_kb']:10d} {100 * memory_change:+7.1f}%  {' '.join(problems)}")
+
+    if missing:
+        print(f"Error: {missing} baseline stage(s) not in the new results")
+    print(f"\n{'No regressions' if ok else 'Regressions found'} "
+          f"(thresholds: {100 * threshold:.0f}% fps, {100 * memory_threshold:.0f}% peak memory)")
+    return ok
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a baseline results file")
+    parser.add_argument("--results", help="with --compare, compare this results file instead of running")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="allowed frames/sec drop as a fraction (default: %(default)s)")
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD,
+                        help="allowed peak memory growth as a fraction (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="runs per stage, the fastest is kept (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for the convert stage (default: %(default)s)")
+    parser.add_argument("--cases", nargs="+", choices=list(CORPUS) + ["test_gif"],
+                        help="only run these GIFs")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.results:
+        current = load_results(args.results)
+    else:
+        current = run_benchmarks(args.repeat, args.workers, args.cases)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+            print(f"\nResults written to '{args.output}'")
+
+    if args.compare:
+        sys.exit(0 if compare_results(load_results(args.compare), current,
+                                      args.threshold, args.memory_threshold) else 1)
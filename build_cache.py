@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+
+from dithering import DITHER_PILLOW
+
+# --- Configuration ---
+CACHE_DIR_NAME = ".build_cache"   # Created next to the scripts
+MANIFEST_FILE = "manifest.json"
+KEEP_BUILDS = 3                   # Entries unused for this many builds are evicted
+# --- End Configuration ---
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, CACHE_DIR_NAME)
+MANIFEST_VERSION = 4   # Bumped whenever cached frames or sketches would come out differently
+
+
+def hash_bytes(*parts):
+    """Returns the sha1 hex digest of the given bytes / str parts."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+    return digest.hexdigest()
+
+
+def hash_file(filepath, chunk_size=1 << 20):
+    """Returns the sha1 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def conversion_key(target_width, target_height, invert, layout, dither=DITHER_PILLOW):
+    """Describes the conversion parameters that packed frames depend on."""
+    key = f"{target_width}x{target_height}|invert={int(bool(invert))}|layout={layout}"
+    # Left out for the default so frames cached before dither modes existed stay valid
+    return key if dither == DITHER_PILLOW else f"{key}|dither={dither}"
+
+
+class BuildCache:
+    """
+    Content addressed cache for the three build stages, backed by a JSON manifest.
+
+    - split:    GIF file hash -> hashes and durations of its composited frames
+    - convert:  composited frame hash + conversion parameters -> packed frame
+                (stored as a .bin file next to the manifest)
+    - generate: output sketch path -> hash of everything the sketch was built
+                from, plus the hash of the file that was written
+
+    Every lookup marks the entry as used by the current build. When the cache
+    is saved, entries that no build has used for KEEP_BUILDS builds are
+    evicted along with their files. With force=True every lookup misses, so
+    all stages run again and refresh the cache.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, force=False, keep_builds=KEEP_BUILDS):
+        self.cache_dir = cache_dir
+        self.frames_dir = os.path.join(cache_dir, "frames")
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        self.force = force
+        self.keep_builds = keep_builds
+        self.hits = {"split": 0, "convert": 0, "generate": 0}
+        self.misses = {"split": 0, "convert": 0, "generate": 0}
+        self.manifest = self._load_manifest()
+        self.manifest["build"] += 1
+        self.build = self.manifest["build"]
+
+    def _load_manifest(self):
+        empty = {"version": MANIFEST_VERSION, "build": 0, "split": {}, "convert": {}, "generate": {}}
+        if not os.path.exists(self.manifest_path):
+            return empty
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable build cache manifest '{self.manifest_path}': {e}")
+            return empty
+        if manifest.get("version") != MANIFEST_VERSION:
+            print("Build cache manifest is from another version. Starting a fresh cache.")
+            return empty
+        return manifest
+
+    def _lookup(self, stage, key):
+        entry = None if self.force else self.manifest[stage].get(key)
+        if entry is not None:
+            entry["used"] = self.build
+        return entry
+
+    def _count(self, stage, hit):
+        if hit:
+            self.hits[stage] += 1
+        else:
+            self.misses[stage] += 1
+
+    # --- split stage ---
+
+    def get_split(self, gif_hash):
+        """Returns (frame hashes, frame durations) recorded for a GIF, or None."""
+        entry = self._lookup("split", gif_hash)
+        self._count("split", entry is not None)
+        return (entry["frames"], entry["durations"]) if entry else None
+
+    def put_split(self, gif_hash, frame_hashes, durations):
+        self.manifest["split"][gif_hash] = {
+            "frames": list(frame_hashes),
+            "durations": list(durations),
+            "used": self.build,
+        }
+
+    # --- convert stage ---
+
+    def _frame_path(self, key):
+        return os.path.join(self.frames_dir, f"{key}.bin")
+
+    def get_packed(self, frame_hash, params_key):
+        """Returns the cached packed bytes for a composited frame, or None."""
+        key = hash_bytes(frame_hash, params_key)
+        packed_bytes = None
+        if self._lookup("convert", key) is not None:
+            try:
+                with open(self._frame_path(key), "rb") as f:
+                    packed_bytes = f.read()
+            except IOError:
+                # The file went missing, forget the entry
+                del self.manifest["convert"][key]
+        self._count("convert", packed_bytes is not None)
+        return packed_bytes
+
+    def put_packed(self, frame_hash, params_key, packed_bytes):
+        key = hash_bytes(frame_hash, params_key)
+        os.makedirs(self.frames_dir, exist_ok=True)
+        with open(self._frame_path(key), "wb") as f:
+            f.write(packed_bytes)
+        self.manifest["convert"][key] = {"used": self.build}
+
+    # --- generate stage ---
+
+    def output_is_current(self, output_path, build_key):
+        """True if output_path was generated from build_key and has not changed since."""
+        output_path = os.path.abspath(output_path)
+        entry = self._lookup("generate", output_path)
+        current = (
+            entry is not None
+            and entry["key"] == build_key
+            and os.path.exists(output_path)
+            and hash_file(output_path) == entry["output_hash"]
+        )
+        self._count("generate", current)
+        return current
+
+    def put_output(self, output_path, build_key):
+        output_path = os.path.abspath(output_path)
+        self.manifest["generate"][output_path] = {
+            "key": build_key,
+            "output_hash": hash_file(output_path),
+            "used": self.build,
+        }
+
+    # --- persistence ---
+
+    def evict_stale(self):
+        """Drops entries no build has used in the last keep_builds builds. Returns the count."""
+        evicted = 0
+        for stage in ("split", "convert", "generate"):
+            entries = self.manifest[stage]
+            for key in [k for k, e in entries.items() if self.build - e["used"] >= self.keep_builds]:
+                del entries[key]
+                evicted += 1
+                if stage == "convert":
+                    try:
+                        os.remove(self._frame_path(key))
+                    except OSError:
+                        pass
+        return evicted
+
+    def save(self):
+        """Evicts stale entries and writes the manifest."""
+        evicted = self.evict_stale()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self.manifest_path)
+        return evicted
+
+    def print_summary(self, evicted=0):
+        parts = [f"{stage} {self.hits[stage]} hit / {self.misses[stage]} miss" for stage in ("split", "convert", "generate")]
+        print(f"Build cache: {', '.join(parts)}, {evicted} stale entr{'y' if evicted == 1 else 'ies'} evicted")
@@ -2,160 +2,405 @@ import re
 import os
 import sys
 import glob # For finding files
+import hashlib
+import itertools
+import time
+
+from frame_codec import encode_frames, print_codec_report
+from dirty_rects import compute_dirty_rects, print_i2c_report
+from frame_generator import LAYOUT_PAGES, packed_frame_width
+from frame_store import FrameStore
+import instrumentation
 
 # --- Configuration ---
 TEMPLATE_INO_FILE = "Template/animation.ino"  # Path to your template INO file
+TEMPLATE_LITTLEFS_INO_FILE = "Template/animation_littlefs.ino" # Template that streams frames from LittleFS
 HEADER_FOLDER_NAME = "output_headers"        # Folder with your frame_XXX.h files
+FRAME_STORE_FILE = None                      # e.g. "frames.fstore": read frames from this frame store
+                                             # (see frame_store.py) instead of HEADER_FOLDER_NAME
 OUTPUT_INO_FILE = "animation_updated/animation_updated.ino" # Output file path
 FRAME_NUMBER_PADDING = 3                     # Digits for frame numbers (e.g., 3 for 000)
 PLACEHOLDER_DEFINITIONS = "// __FRAME_DEFINITIONS__"
 PLACEHOLDER_LOOP = "// __FRAME_LOOP__"
+USE_FRAME_CODEC = False                      # True stores frames RLE / XOR delta compressed
+USE_DIRTY_RECTS = False                      # True only redraws/sends the region that changed
+FRAME_WIDTH = 128                            # Frame size the headers were generated with
+FRAME_HEIGHT = 64
+FRAME_LAYOUT = "horizontal"                  # "horizontal" or "pages", as passed to frame_generator.py
+FRAME_TIMING = "delay"                       # "delay" waits each frame's duration after drawing it,
+                                             # "compensated" subtracts the draw time to match the GIF's speed
 # --- End Configuration ---
 
+TIMING_DELAY = "delay"
+TIMING_COMPENSATED = "compensated"
+FRAME_TIMINGS = (TIMING_DELAY, TIMING_COMPENSATED)
+
 # Construct full paths relative to the script location
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_INO_PATH = os.path.join(SCRIPT_DIR, TEMPLATE_INO_FILE)
+TEMPLATE_LITTLEFS_INO_PATH = os.path.join(SCRIPT_DIR, TEMPLATE_LITTLEFS_INO_FILE)
 HEADER_FOLDER_PATH = os.path.join(SCRIPT_DIR, HEADER_FOLDER_NAME)
+FRAME_STORE_PATH = os.path.join(SCRIPT_DIR, FRAME_STORE_FILE) if FRAME_STORE_FILE else None
 OUTPUT_INO_PATH = os.path.join(SCRIPT_DIR, OUTPUT_INO_FILE)
 
-# Ensure the output directory exists
-OUTPUT_DIR = os.path.dirname(OUTPUT_INO_PATH)
-if OUTPUT_DIR and not os.path.exists(os.path.join(SCRIPT_DIR, OUTPUT_DIR)):
-    try:
-        os.makedirs(os.path.join(SCRIPT_DIR, OUTPUT_DIR))
-        print(f"Created output directory: '{OUTPUT_DIR}'")
-    except OSError as e:
-        print(f"Error creating output directory '{OUTPUT_DIR}': {e}")
-        sys.exit(1)
+
+def ensure_output_dir(output_path):
+    """Creates the directory that will hold output_path if it does not exist yet."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        try:
+            os.makedirs(output_dir)
+            print(f"Created output directory: '{output_dir}'")
+        except OSError as e:
+            print(f"Error creating output directory '{output_dir}': {e}")
+            return False
+    return True
 
 
 def read_file_content(filepath):
     """Reads the entire content of a file."""
+    metrics = instrumentation.current()
+    frame_name = os.path.basename(filepath)
     content = None
+    start = time.perf_counter()
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             content = f.read()
     except UnicodeDecodeError:
-        print(f"  [DEBUG] Read with UTF-8 FAILED for {filepath}. Trying Latin-1.")
+        # Not UTF-8, fall back to Latin-1
         try:
             with open(filepath, 'r', encoding='latin-1') as f:
                 content = f.read()
         except Exception as e_latin1:
-            print(f"  [DEBUG] Error reading file {filepath} even with Latin-1: {e_latin1}")
+            metrics.error("read", f"Error reading file {filepath} even with Latin-1: {e_latin1}", frame_name)
             return None
     except IOError as e_io:
-        print(f"  [DEBUG] Error reading file {filepath}: {e_io}")
+        metrics.error("read", f"Error reading file {filepath}: {e_io}", frame_name)
         return None
     except Exception as e_other:
-        print(f"  [DEBUG] An unexpected error occurred reading file {filepath}: {e_other}")
+        metrics.error("read", f"An unexpected error occurred reading file {filepath}: {e_other}", frame_name)
         return None
-    
+
+    metrics.record("read", time.perf_counter() - start, frame_name, bytes_in=len(content))
     return content
 
 
-def write_file_content(filepath, content):
-    """Writes content to a file."""
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"\nSuccessfully wrote generated sketch to: '{OUTPUT_INO_FILE}'")
-        return True
-    except IOError as e:
-        print(f"Error writing file {filepath}: {e}")
-        return False
-    except Exception as e:
-        print(f"An unexpected error occurred writing file {filepath}: {e}")
-        return False
+def set_screen_size(template_content, screen_width, screen_height):
+    """Sets the template's SCREEN_WIDTH and SCREEN_HEIGHT defines to the display's size."""
+    for name, value in (("SCREEN_WIDTH", screen_width), ("SCREEN_HEIGHT", screen_height)):
+        template_content = re.sub(rf"^(#define[ \t]+{name}[ \t]+)\d+", rf"\g<1>{value}", template_content,
+                                  flags=re.MULTILINE)
+    return template_content
+
 
-def extract_frame_data(header_content, header_filename):
+def extract_frame_duration(header_content):
+    """Returns the '// Duration: N ms' value written by frame_generator.py, or None."""
+    match = re.search(r"//\s*Duration:\s*(\d+)\s*ms", header_content)
+    return int(match.group(1)) if match else None
+
+def format_frame_definition(frame_name, frame_bytes, source_name):
     """
-    Extracts just the array data block { ..., ... }; from the header content.
-    Returns the block as a string, or None if extraction fails.
+    Builds the PROGMEM C++ definition for an already packed frame held in memory.
+    Returns the full C++ definition string, followed by a comment naming its source.
     """
-    
-    # CRITICAL FIX: Clean the content AGAIN, focusing on non-breaking spaces (chr 160)
-    # and tabs which might be invisible but break regex \s
-    if header_content:
-        cleaned_content = header_content.replace(chr(160), ' ').replace('\t', ' ')
-    else:
-        return None
-
-    # *** NEW SAFER REGEX ***
-    # This regex now captures ONLY the data *inside* the braces
-    #   =                  (the assignment operator)
-    #   \s*\{\s* (optional whitespace, literal {, optional whitespace)
-    #   (                  (start capturing group 1: the data)
-    #     [\s\S]+?         (non-greedily match of any character, including newlines)
-    #   )                  (end capturing group 1)
-    #   \s*\};             (optional whitespace, literal }, literal ;)
-    array_data_regex = re.compile(
-         r"=\s*\{\s*([\s\S]+?)\s*\};",
-        re.IGNORECASE | re.DOTALL
+    lines = []
+    for i in range(0, len(frame_bytes), 16): # 16 bytes per line for readability
+        lines.append(", ".join(f"0x{byte:02X}" for byte in frame_bytes[i:i + 16]))
+    values_block = "{\n    " + ",\n    ".join(lines) + "\n};"
+
+    return (
+        f"const unsigned char {frame_name}[] PROGMEM = {values_block}"
+        + "\n// Data from " + source_name + "\n"
     )
 
-    # print(f"  [DEBUG] Cleaned header snippet (first 300 chars): '{cleaned_content[:300].strip()}'")
-    match = array_data_regex.search(cleaned_content) # Use the cleaned content
-
-    if match:
-        data_inside_braces = match.group(1).strip() # Capture data *inside* { };
-        
-        if data_inside_braces:
-             # Reconstruct the block safely
-             values_block = "{\n    " + data_inside_braces + "\n};"
-             print(f"  [DEBUG] Regex matched. Reconstructed block.")
-             return values_block
-        else:
-             print(f"  [DEBUG] Regex matched, but captured data block was empty. Skipping.")
-             return None
-    else:
-        print(f"  [DEBUG] Error: Regex '={{...}};' FAILED to find a match in '{header_filename}'.")
+def tokenize_header_bytes(header_content):
+    """
+    Reads the packed frame bytes straight out of a frame header in one linear
+    pass: the text between the '{' after the first '=' and the next '}' is
+    split on commas and every token parsed as hex.
+
+    Returns:
+        bytes: The frame bytes, or None if the header has no '= { ... }' array
+        or a token is not a hex byte.
+    """
+    equals = header_content.find("=")
+    start = header_content.find("{", equals + 1) if equals >= 0 else -1
+    end = header_content.find("}", start + 1) if start >= 0 else -1
+    if end < 0:
+        return None
+    tokens = header_content[start + 1:end].split(",")
+    try:
+        # int(token, 16) accepts the 0x prefix and surrounding whitespace
+        return bytes(int(token, 16) for token in tokens if token.strip())
+    except ValueError:
         return None
 
-def process_header_content(header_content, original_frame_name, header_filename_for_debug):
+def dedupe_frames(packed_frames):
     """
-    Extracts data, reconstructs declaration using original_frame_name and adds PROGMEM.
-    Returns the full C++ definition string or None if extraction fails.
+    Stores every distinct bitmap only once, keyed on a hash of its contents.
+
+    Returns:
+        tuple: (unique_positions, frame_index) where unique_positions lists
+        where each distinct bitmap first appears in packed_frames and
+        frame_index[i] is the position of frame i inside unique_positions.
+        Only positions are kept, so frames read from a frame store stay in
+        the mapped file.
     """
-    values_block = extract_frame_data(header_content, header_filename_for_debug)
-
-    if not values_block:
-        return None # Indicate failure
-
-    # Reconstruct the full array definition WITH PROGMEM and correct name
-    reconstructed_definition = (
-        f"const unsigned char {original_frame_name}[] PROGMEM = {values_block};"
+    unique_positions = []
+    frame_index = []
+    seen = {}
+    for position, frame_bytes in enumerate(packed_frames):
+        digest = hashlib.sha1(frame_bytes).digest()
+        if digest not in seen:
+            seen[digest] = len(unique_positions)
+            unique_positions.append(position)
+        frame_index.append(seen[digest])
+    return unique_positions, frame_index
+
+def loop_start_lines(timing):
+    """Opens the playback loop over FRAME_COUNT frames (first line unindented, the template supplies it)."""
+    if timing == TIMING_COMPENSATED:
+        # Deadline scheduling: the next frame is due a full duration after
+        # this one was due, however long drawing it took
+        return [
+            "static uint32_t next_frame_at = millis();",
+            "  for (uint16_t i = 0; i < FRAME_COUNT; i++) {",
+        ]
+    return ["for (uint16_t i = 0; i < FRAME_COUNT; i++) {"]
+
+def loop_end_lines(timing):
+    """Waits out the frame's 'duration' and closes the playback loop."""
+    if timing == TIMING_COMPENSATED:
+        return [
+            "    next_frame_at += duration;",
+            "    int32_t wait = (int32_t)(next_frame_at - millis());",
+            "    if (wait > 0) delay(wait);",
+            "    else if (wait < -1000) next_frame_at = millis(); // Too far behind, resync instead of rushing",
+            "  }",
+        ]
+    return [
+        "    delay(duration);",
+        "  }",
+    ]
+
+def build_frame_code(packed_frames, source_names, codec=False, dirty_rects=False,
+                     width=FRAME_WIDTH, height=FRAME_HEIGHT, layout=FRAME_LAYOUT,
+                     durations=None, timing=FRAME_TIMING):
+    """
+    Builds the PROGMEM frame definitions, the frame index table and the loop
+    code for a list of packed frames. Byte-identical frames share one array.
+
+    Args:
+        packed_frames (list[bytes]): Packed frames in playback order.
+        source_names (list[str]): Where each frame came from, for the comments.
+        codec (bool): If True, frames are stored RLE / XOR delta encoded
+            (see frame_codec.py) and unpacked by decodeFrame() on the device.
+        dirty_rects (bool): If True, only the page aligned window that changed
+            since the previous frame is redrawn and sent to the display.
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        layout (str): LAYOUT_HORIZONTAL frames are drawn with drawBitmap(),
+            LAYOUT_PAGES frames are copied straight into the display buffer.
+        durations (list[int]): Optional display time of each frame in ms, as
+            stored in the GIF. Missing (None or 0) entries use frame_delay.
+        timing (str): TIMING_DELAY waits the full duration after drawing a
+            frame, TIMING_COMPENSATED schedules frames against millis() so
+            the time spent drawing is taken out of the wait.
+
+    Returns:
+        tuple: (frame_definitions, loop_code_blocks) ready for write_sketch().
+        frame_definitions is an iterator: each frame array
+        is only formatted as it is consumed, so the sketch text never has to be
+        held in memory at once.
+    """
+    start = time.perf_counter()
+    stored_frames = packed_frames
+    if codec:
+        stored_frames = encode_frames(packed_frames)
+        print_codec_report(packed_frames, stored_frames)
+
+    unique_positions, frame_index = dedupe_frames(stored_frames)
+    width = packed_frame_width(width, layout)
+
+    # Settings read by the helper code in the template
+    frame_settings = [
+        f"#define FRAME_BYTES {len(packed_frames[0]) if packed_frames else 0}",
+        f"#define FRAME_WIDTH {width}",
+        f"#define FRAME_HEIGHT {height}",
+    ]
+    if codec:
+        frame_settings.append("#define FRAME_CODEC 1")
+    if dirty_rects:
+        frame_settings.append("#define DIRTY_RECTS 1")
+    if layout == LAYOUT_PAGES:
+        frame_settings.append("#define FRAME_LAYOUT_PAGES 1")
+    settings_definitions = ["\n".join(frame_settings) + "\n"]
+
+    # Unique bitmaps are named Frame1, Frame2, ... in order of first appearance
+    frame_arrays = (
+        format_frame_definition(f"Frame{i + 1}", stored_frames[position], source_names[position])
+        for i, position in enumerate(unique_positions)
+    )
+    frame_definitions = []
+    table_entries = ", ".join(f"Frame{i + 1}" for i in frame_index)
+    frame_definitions.append(
+        f"const uint16_t FRAME_COUNT = {len(frame_index)};\n"
+        f"const unsigned char* const frame_table[] PROGMEM = {{ {table_entries} }};\n"
     )
-    
-    reconstructed_definition = re.sub(r';\s*;', ';', reconstructed_definition)
-    
-    return reconstructed_definition + "\n// Data from " + header_filename_for_debug + "\n"
-
-
-# --- Main Execution ---
-if __name__ == "__main__":
-    print(f"Building animation sketch from template '{TEMPLATE_INO_FILE}'...")
-    print(f"Looking for headers in: '{HEADER_FOLDER_NAME}'")
-
-    if not os.path.exists(TEMPLATE_INO_PATH):
-         print(f"\nError: Template file '{TEMPLATE_INO_FILE}' not found.")
-         sys.exit(1)
-
-    if not os.path.exists(HEADER_FOLDER_PATH):
-        print(f"\nError: Header folder '{HEADER_FOLDER_NAME}' not found.")
-        sys.exit(1)
 
-    template_content = read_file_content(TEMPLATE_INO_FILE)
-    if not template_content:
-        print(f"\nCould not read the template file '{TEMPLATE_INO_FILE}'. Aborting.")
-        sys.exit(1)
+    if durations is not None:
+        # 0 means "use frame_delay" for frames whose GIF duration is unknown
+        duration_entries = ", ".join(str(min(int(d or 0), 0xFFFF)) for d in durations)
+        frame_definitions.append(f"const uint16_t frame_durations[] PROGMEM = {{ {duration_entries} }};\n")
+
+    if dirty_rects:
+        rects = compute_dirty_rects(packed_frames, width, height, layout)
+        print_i2c_report(rects, width, height)
+        # { x0, x1, page0, page1 }, x0 > x1 marks a frame with nothing to send
+        rect_entries = ", ".join(
+            "{ 1, 0, 0, 0 }" if rect is None else "{ %d, %d, %d, %d }" % rect
+            for rect in rects
+        )
+        frame_definitions.append(f"const uint8_t frame_rects[][4] PROGMEM = {{ {rect_entries} }};\n")
+
+    loop_lines = loop_start_lines(timing)
+    loop_lines += [
+        "    const unsigned char* frame = (const unsigned char*)pgm_read_ptr(&frame_table[i]);",
+    ]
+    if layout == LAYOUT_PAGES:
+        # Frames already match the display buffer, so they are copied (or
+        # decoded) into it directly instead of being drawn pixel by pixel
+        if codec:
+            loop_lines.append("    decodeFrame(display.getBuffer(), frame);")
+        if dirty_rects:
+            loop_lines += [
+                "    uint8_t rect[4];",
+                "    memcpy_P(rect, frame_rects[i], sizeof(rect));",
+                "    if (rect[0] <= rect[1]) {",
+            ]
+            if not codec:
+                loop_lines.append("      copyWindow(frame, rect);")
+            loop_lines += [
+                "      sendWindow(rect);",
+                "    }",
+            ]
+        else:
+            if not codec:
+                loop_lines.append("    memcpy_P(display.getBuffer(), frame, FRAME_BYTES);")
+            loop_lines.append("    display.display();")
+    else:
+        bitmap = "frame"
+        if codec:
+            loop_lines.append("    decodeFrame(frame_buffer, frame);")
+            bitmap = "frame_buffer"
+
+        if dirty_rects:
+            loop_lines += [
+                "    uint8_t rect[4];",
+                "    memcpy_P(rect, frame_rects[i], sizeof(rect));",
+                "    if (rect[0] <= rect[1]) {",
+                f"      drawWindow({bitmap}, rect);",
+                "      sendWindow(rect);",
+                "    }",
+            ]
+        else:
+            loop_lines += [
+                "    display.clearDisplay();",
+                # Frames smaller than the display (see flash_planner.py) are centred
+                f"    display.drawBitmap((SCREEN_WIDTH - FRAME_WIDTH) / 2, (SCREEN_HEIGHT - FRAME_HEIGHT) / 2, "
+                f"{bitmap}, FRAME_WIDTH, FRAME_HEIGHT, 1);",
+                "    display.display();",
+            ]
+    if durations is not None:
+        loop_lines += [
+            "    uint16_t duration = pgm_read_word(&frame_durations[i]);",
+            "    if (!duration) duration = frame_delay;",
+        ]
+    else:
+        loop_lines.append("    uint16_t duration = frame_delay;")
+
+    loop_lines += loop_end_lines(timing)
+    loop_code_blocks = ["\n".join(loop_lines) + "\n"]
+
+    if durations is not None:
+        known = [int(d) for d in durations if d]
+        if known:
+            print(f"\nFrame durations: {min(known)}-{max(known)} ms, "
+                  f"{sum(known) / len(known):.0f} ms average ({timing} timing)")
+
+    # Report what deduplication saved (each table entry costs one 4 byte pointer)
+    duplicate_count = len(stored_frames) - len(unique_positions)
+    saved_bytes = sum(len(f) for f in stored_frames) - sum(len(stored_frames[p]) for p in unique_positions)
+    print(f"\nFrames: {len(stored_frames)} total, {len(unique_positions)} unique, {duplicate_count} duplicate(s).")
+    print(f"Flash saved by deduplication: {saved_bytes} bytes "
+          f"(frame table costs {4 * len(frame_index)} bytes).")
+
+    # Only the codec, deduplication and tables: the frame arrays are formatted lazily, inside the "write" step
+    instrumentation.current().record("build", time.perf_counter() - start, bytes_in=sum(len(f) for f in packed_frames))
+    return itertools.chain(settings_definitions, frame_arrays, frame_definitions), loop_code_blocks
+
+def build_asset_code(asset_name, frame_bytes, width=FRAME_WIDTH, height=FRAME_HEIGHT, layout=FRAME_LAYOUT,
+                     timing=FRAME_TIMING):
+    """
+    Builds the settings and loop code for Template/animation_littlefs.ino,
+    which streams frames from a binary asset (see frame_asset.py) instead of
+    storing them in the sketch.
+
+    Args:
+        asset_name (str): Asset file name on LittleFS, e.g. "animation.bin".
+        frame_bytes (int): Size of one packed frame.
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        layout (str): LAYOUT_HORIZONTAL frames are drawn with drawBitmap(),
+            LAYOUT_PAGES frames are read straight into the display buffer.
+        timing (str): TIMING_DELAY or TIMING_COMPENSATED, see build_frame_code().
+
+    Returns:
+        tuple: (frame_definitions, loop_code_blocks) ready for write_sketch().
+    """
+    width = packed_frame_width(width, layout)
+    frame_settings = [
+        f'#define ASSET_PATH "/{asset_name}"',
+        f"#define FRAME_BYTES {frame_bytes}",
+        f"#define FRAME_WIDTH {width}",
+        f"#define FRAME_HEIGHT {height}",
+    ]
+    if layout == LAYOUT_PAGES:
+        frame_settings.append("#define FRAME_LAYOUT_PAGES 1")
+    frame_definitions = ["\n".join(frame_settings) + "\n"]
+
+    loop_lines = loop_start_lines(timing)
+    if layout == LAYOUT_PAGES:
+        loop_lines += [
+            "    uint16_t duration = readFrame(i, display.getBuffer());",
+            "    display.display();",
+        ]
+    else:
+        loop_lines += [
+            "    uint16_t duration = readFrame(i, frame_buffer);",
+            "    display.clearDisplay();",
+            "    display.drawBitmap((SCREEN_WIDTH - FRAME_WIDTH) / 2, (SCREEN_HEIGHT - FRAME_HEIGHT) / 2, "
+            "frame_buffer, FRAME_WIDTH, FRAME_HEIGHT, 1);",
+            "    display.display();",
+        ]
+    loop_lines.append("    if (!duration) duration = frame_delay;")
+    loop_lines += loop_end_lines(timing)
+    return frame_definitions, ["\n".join(loop_lines) + "\n"]
+
+def load_header_frames(header_folder_path):
+    """
+    Reads the frame_XXX.h headers written by frame_generator.py, in frame number order.
 
-    if PLACEHOLDER_DEFINITIONS not in template_content or PLACEHOLDER_LOOP not in template_content:
-         print(f"\nError: Placeholders '{PLACEHOLDER_DEFINITIONS}' or '{PLACEHOLDER_LOOP}' not found in the template file.")
-         print("Please ensure 'templet/animation.ino' contains these exact lines as placeholders.")
-         sys.exit(1)
+    Args:
+        header_folder_path (str): Folder holding the headers.
 
+    Returns:
+        tuple: (packed_frames, source_names, durations) - the packed bytes,
+        header filename and duration (None if unknown) of every frame that
+        could be read. All three lists are empty if no headers were found.
+    """
     # Find and sort header files based on filename number
-    file_pattern = os.path.join(HEADER_FOLDER_PATH, f"frame_{'[0-9]' * FRAME_NUMBER_PADDING}.h")
+    file_pattern = os.path.join(header_folder_path, f"frame_{'[0-9]' * FRAME_NUMBER_PADDING}.h")
     found_files = glob.glob(file_pattern)
 
     filename_num_regex = re.compile(rf"frame_(\d{{{FRAME_NUMBER_PADDING}}})\.h", re.IGNORECASE)
@@ -172,54 +417,141 @@ if __name__ == "__main__":
             print(f"  Skipping file with unexpected name format: '{fname}'")
 
     if not valid_frames:
-        print(f"\nError: No valid header files (e.g., frame_000.h) found in '{HEADER_FOLDER_NAME}'.")
-        sys.exit(1)
+        return [], [], []
 
     sorted_frame_numbers = sorted(valid_frames.keys())
     print(f"Found and sorted {len(sorted_frame_numbers)} frame headers based on filename number.")
 
-    all_frame_definitions = []
-    loop_code_blocks = []
+    packed_frames = []
+    source_names = []
+    durations = []
 
+    metrics = instrumentation.current()
     for frame_num_from_filename in sorted_frame_numbers: # Iterate through 0, 1, 2...
         filepath = valid_frames[frame_num_from_filename]
         header_filename = os.path.basename(filepath)
-        
-        # 'frame_000.h' (number 0) becomes 'Frame1'
-        # 'frame_001.h' (number 1) becomes 'Frame2'
-        ino_frame_name = f"Frame{frame_num_from_filename + 1}" 
-
-        print(f"\nProcessing {header_filename} (Assigning to {ino_frame_name})...")
 
         header_content = read_file_content(filepath)
+        if header_content is None:
+            continue # Read errors are already reported
         if not header_content:
-            print(f"  Error: Failed to read {header_filename}. Skipping this frame.")
-            continue 
-
-        processed_definition = process_header_content(header_content, ino_frame_name, header_filename)
-
-        if processed_definition:
-            all_frame_definitions.append(processed_definition)
-            
-            loop_block = (
-                f"  display.clearDisplay();\n"
-                f"  display.drawBitmap(0, 0, {ino_frame_name}, SCREEN_WIDTH, SCREEN_HEIGHT, 1);\n"
-                f"  display.display();\n"
-                f"  delay(frame_delay);\n"
-            )
-            loop_code_blocks.append(loop_block)
-            
-            print(f"  Successfully processed {header_filename} as {ino_frame_name}.")
-        else:
-            print(f"  Error processing content of {header_filename}. Skipping this frame.")
+            metrics.error("read", f"{header_filename} is empty. Skipping this frame.", header_filename)
+            continue
+
+        with metrics.measure("parse", header_filename, len(header_content)) as record:
+            frame_bytes = tokenize_header_bytes(header_content)
+            if frame_bytes:
+                record["bytes_out"] = len(frame_bytes)
+                packed_frames.append(frame_bytes)
+                source_names.append(header_filename)
+                durations.append(extract_frame_duration(header_content))
+        if not frame_bytes:
+            metrics.error("parse", f"No valid '= {{ 0x.., ... }};' array in '{header_filename}'. Skipping this frame.",
+                          header_filename)
+
+    return packed_frames, source_names, durations
+
+def write_sketch(filepath, template_content, frame_definitions, loop_code_blocks):
+    """
+    Writes the sketch straight to filepath: the template text around the
+    placeholders, then every definition and loop block as it is produced.
+    The sketch is never built as one string. Returns True on success.
+    """
+    metrics = instrumentation.current()
+    # Template pieces in file order, with what replaces each placeholder
+    placeholders = sorted(
+        (template_content.find(placeholder), placeholder, blocks, separator)
+        for placeholder, blocks, separator in (
+            (PLACEHOLDER_DEFINITIONS, frame_definitions, "\n\n"),
+            (PLACEHOLDER_LOOP, loop_code_blocks, "\n"),
+        )
+        if placeholder in template_content
+    )
+    try:
+        with metrics.measure("write", os.path.basename(filepath)) as record:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                position = 0
+                for index, placeholder, blocks, separator in placeholders:
+                    f.write(template_content[position:index])
+                    for block_number, block in enumerate(blocks):
+                        if block_number:
+                            f.write(separator)
+                        f.write(block)
+                    position = index + len(placeholder)
+                f.write(template_content[position:])
+                record["bytes_out"] = f.tell()
+        print(f"\nSuccessfully wrote generated sketch to: '{os.path.relpath(filepath, SCRIPT_DIR)}'")
+        return True
+    except IOError as e:
+        metrics.print_error(f"Error writing file {filepath}: {e}")
+        return False
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    print(f"Building animation sketch from template '{TEMPLATE_INO_FILE}'...")
+    if FRAME_STORE_PATH:
+        print(f"Reading frames from frame store: '{FRAME_STORE_FILE}'")
+    else:
+        print(f"Looking for headers in: '{HEADER_FOLDER_NAME}'")
 
-    # Combine generated parts
-    final_definitions = "\n\n".join(all_frame_definitions)
-    final_loop_code = "\n".join(loop_code_blocks)
+    if not os.path.exists(TEMPLATE_INO_PATH):
+         print(f"\nError: Template file '{TEMPLATE_INO_FILE}' not found.")
+         sys.exit(1)
 
-    # Replace placeholders in the template
-    output_content = template_content.replace(PLACEHOLDER_DEFINITIONS, final_definitions)
-    output_content = output_content.replace(PLACEHOLDER_LOOP, final_loop_code)
+    if not FRAME_STORE_PATH and not os.path.exists(HEADER_FOLDER_PATH):
+        print(f"\nError: Header folder '{HEADER_FOLDER_NAME}' not found.")
+        sys.exit(1)
+
+    if not ensure_output_dir(OUTPUT_INO_PATH):
+        sys.exit(1)
 
-    # Write the final .ino file
-    write_file_content(OUTPUT_INO_PATH, output_content)
\ No newline at end of file
+    metrics = instrumentation.current()
+    with metrics.stage("generate"):
+        template_content = read_file_content(TEMPLATE_INO_PATH)
+        if not template_content:
+            print(f"\nCould not read the template file '{TEMPLATE_INO_FILE}'. Aborting.")
+            sys.exit(1)
+
+        if PLACEHOLDER_DEFINITIONS not in template_content or PLACEHOLDER_LOOP not in template_content:
+             print(f"\nError: Placeholders '{PLACEHOLDER_DEFINITIONS}' or '{PLACEHOLDER_LOOP}' not found in the template file.")
+             print("Please ensure 'templet/animation.ino' contains these exact lines as placeholders.")
+             sys.exit(1)
+
+        frame_store = None
+        frame_width, frame_height, frame_layout = FRAME_WIDTH, FRAME_HEIGHT, FRAME_LAYOUT
+        if FRAME_STORE_PATH:
+            try:
+                frame_store = FrameStore(FRAME_STORE_PATH)
+            except (IOError, ValueError) as e:
+                print(f"\nError: Could not open the frame store '{FRAME_STORE_FILE}': {e}")
+                sys.exit(1)
+            # Frames stay in the mapped file and are only read as the sketch is written.
+            # The store records the size and layout it was packed with.
+            packed_frames, source_names, durations = frame_store, frame_store.source_names, frame_store.durations
+            frame_width, frame_height, frame_layout = frame_store.width, frame_store.height, frame_store.layout
+            if not packed_frames:
+                print(f"\nError: The frame store '{FRAME_STORE_FILE}' holds no frames.")
+                sys.exit(1)
+        else:
+            packed_frames, source_names, durations = load_header_frames(HEADER_FOLDER_PATH)
+            if not packed_frames:
+                print(f"\nError: No valid header files (e.g., frame_000.h) found in '{HEADER_FOLDER_NAME}'.")
+                sys.exit(1)
+
+        if USE_DIRTY_RECTS and frame_layout != LAYOUT_PAGES and frame_width % 8:
+            print(f"\nError: Dirty rectangles need a frame width that is a multiple of 8 in the "
+                  f"{frame_layout} layout (got {frame_width}).")
+            sys.exit(1)
+        if frame_layout == LAYOUT_PAGES or USE_DIRTY_RECTS:
+            # Page frames and dirty rectangles address the display buffer directly,
+            # so the display has to be the frame's size
+            template_content = set_screen_size(template_content, frame_width, frame_height)
+
+        all_frame_definitions, loop_code_blocks = build_frame_code(
+            packed_frames, source_names, USE_FRAME_CODEC, USE_DIRTY_RECTS, frame_width, frame_height, frame_layout,
+            durations if any(durations) else None, FRAME_TIMING
+        )
+        # Write the final .ino file
+        write_sketch(OUTPUT_INO_PATH, template_content, all_frame_definitions, loop_code_blocks)
+        if frame_store is not None:
+            frame_store.close()
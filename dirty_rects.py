@@ -0,0 +1,89 @@
+import numpy as np
+
+from frame_generator import LAYOUT_HORIZONTAL, unpack_mono_pixels
+
+# SSD1306 I2C framing: every transaction starts with the address byte and a
+# control byte (0x00 for commands, 0x40 for data). The Wire buffer limits the
+# size of one transaction, so display data goes out in chunks. The ESP8266
+# core buffers 128 bytes; display() and sendWindow() size their chunks from
+# the buffer (AVR boards buffer 32 bytes, set 31 here for them).
+I2C_CHUNK_BYTES = 127
+COMMAND_TRANSACTION_BYTES = 2 + 1 # ssd1306_command(): one command byte per transaction
+
+
+def compute_dirty_rects(packed_frames, width, height, layout=LAYOUT_HORIZONTAL):
+    """
+    Computes the region that changes between each frame and the one before it,
+    aligned to SSD1306 pages (8 pixel rows) and single columns.
+
+    The first frame is always a full screen update so the loop can wrap around
+    and start from a known display state.
+
+    Args:
+        packed_frames (list[bytes]): Packed frames in playback order.
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        layout (str): Layout the frames are packed in (see frame_generator.py).
+
+    Returns:
+        list[tuple]: One (x0, x1, page0, page1) tuple per frame, inclusive
+        bounds, or None when a frame is identical to the previous one.
+    """
+    last_page = (height + 7) // 8 - 1
+    rects = []
+    previous = None
+    for frame_bytes in packed_frames:
+        pixels = unpack_mono_pixels(frame_bytes, width, height, layout)
+        if previous is None:
+            rects.append((0, pixels.shape[1] - 1, 0, last_page))
+        else:
+            changed = pixels ^ previous
+            rows = np.flatnonzero(changed.any(axis=1))
+            columns = np.flatnonzero(changed.any(axis=0))
+            if rows.size == 0:
+                rects.append(None)
+            else:
+                rects.append((int(columns[0]), int(columns[-1]), int(rows[0]) // 8, int(rows[-1]) // 8))
+        previous = pixels
+    return rects
+
+
+def display_transactions(screen_width, screen_height):
+    """Bytes in each I2C transaction of Adafruit_SSD1306::display() (address byte included)."""
+    transactions = [2 + 5, 2 + 1] # PAGEADDR 0 0xFF COLUMNADDR 0, then the last column
+    data_bytes = screen_width * ((screen_height + 7) // 8)
+    full_chunks, rest = divmod(data_bytes, I2C_CHUNK_BYTES)
+    transactions += [2 + I2C_CHUNK_BYTES] * full_chunks + ([2 + rest] if rest else [])
+    return transactions
+
+
+def window_transactions(rect):
+    """Bytes in each I2C transaction of sendWindow() in Template/animation.ino."""
+    x0, x1, page0, page1 = rect
+    transactions = [COMMAND_TRANSACTION_BYTES] * 6 # COLUMNADDR x0 x1, PAGEADDR p0 p1
+    # Every page is sent in chunks of its own
+    full_chunks, rest = divmod(x1 - x0 + 1, I2C_CHUNK_BYTES)
+    page_transactions = [2 + I2C_CHUNK_BYTES] * full_chunks + ([2 + rest] if rest else [])
+    return transactions + page_transactions * (page1 - page0 + 1)
+
+
+def estimate_i2c_bytes(rect):
+    """Bytes sendWindow() sends over I2C to update one window, framing included."""
+    if rect is None:
+        return 0
+    return sum(window_transactions(rect))
+
+
+def print_i2c_report(rects, width, height):
+    """Prints the estimated I2C bytes per frame against full screen updates."""
+    if not rects:
+        return
+    full_frame = sum(display_transactions(width, height))
+    per_frame = [estimate_i2c_bytes(rect) for rect in rects]
+    unchanged = sum(1 for rect in rects if rect is None)
+    average = sum(per_frame) / len(per_frame)
+
+    print(f"\nDirty rectangles: estimated I2C bytes per frame {average:.0f} average, "
+          f"{max(per_frame)} max (full screen update: {full_frame})")
+    print(f"  {unchanged} frame(s) unchanged, I2C traffic reduced to "
+          f"{100 * average / full_frame:.1f}% of full updates")
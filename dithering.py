@@ -0,0 +1,219 @@
+"""
+Dithering of whole frame stacks.
+
+Every mode takes the grayscale frames of an animation as one
+(frames, height, width) uint8 array and returns a bool array of the same
+shape (True = white pixel, like Pillow's '1' mode):
+
+    pillow     Pillow's Floyd-Steinberg, one frame at a time (the default,
+               what img.convert('1') has always done)
+    threshold  every pixel compared with THRESHOLD
+    bayer      ordered dithering with a BAYER_SIZE x BAYER_SIZE Bayer matrix
+    diffusion  Floyd-Steinberg over the whole stack with temporal coherence:
+               a pixel whose input has not moved more than
+               TEMPORAL_TOLERANCE gray levels from where it was when it last
+               took a dot keeps that dot
+
+Per-frame error diffusion spreads every change in a frame over the pixels
+after it, so even the static parts of an animation flicker and consecutive
+frames differ in many bits. That defeats duplicate frame storage, the XOR
+delta codec and dirty rectangles. With threshold, bayer and diffusion a
+pixel only changes when its own gray level does. bit_changes() and
+print_dither_report() show how many bits each mode changes between frames.
+"""
+
+import numpy as np
+from PIL import Image
+
+from frame_codec import encode_frame
+
+# --- Configuration ---
+THRESHOLD = 128            # Gray level from which a pixel is white (threshold and diffusion)
+BAYER_SIZE = 4             # Bayer matrix size for ordered dithering: 2, 4, 8, ...
+TEMPORAL_TOLERANCE = 4     # Gray levels a pixel may drift and keep its dot (diffusion)
+# --- End Configuration ---
+
+DITHER_PILLOW = "pillow"
+DITHER_THRESHOLD = "threshold"
+DITHER_BAYER = "bayer"
+DITHER_DIFFUSION = "diffusion"
+DITHER_MODES = (DITHER_PILLOW, DITHER_THRESHOLD, DITHER_BAYER, DITHER_DIFFUSION)
+TEMPORAL_DITHER_MODES = (DITHER_DIFFUSION,)   # Modes whose frames depend on the frames before them
+
+# Floyd-Steinberg weights: (row offset, column offset, weight)
+DIFFUSION_KERNEL = ((0, 1, 7 / 16), (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16))
+
+
+def pillow_dither_stack(gray):
+    """Dithers every frame on its own with Pillow's Floyd-Steinberg (img.convert('1'))."""
+    return np.stack([np.asarray(Image.fromarray(frame).convert("1")) for frame in gray])
+
+
+def threshold_stack(gray, threshold=THRESHOLD):
+    """Compares every pixel of the stack with threshold."""
+    return gray >= threshold
+
+
+def bayer_matrix(size):
+    """Returns the size x size Bayer index matrix (values 0 to size * size - 1). size must be a power of 2."""
+    if size < 1 or size & (size - 1):
+        raise ValueError(f"Bayer matrix size must be a power of 2, got {size}")
+    matrix = np.zeros((1, 1), dtype=np.int32)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+def bayer_stack(gray, size=BAYER_SIZE):
+    """
+    Ordered dithering: every pixel is compared with the Bayer matrix entry
+    for its position. The pattern is fixed to the screen, so a pixel only
+    changes when its own gray level crosses its threshold.
+    """
+    height, width = gray.shape[-2:]
+    thresholds = (bayer_matrix(size) + 0.5) * 255 / (size * size)
+    tiled = np.tile(thresholds, (-(-height // size), -(-width // size)))[:height, :width]
+    return gray >= tiled
+
+
+def diffuse_stack(gray, threshold=THRESHOLD, tolerance=TEMPORAL_TOLERANCE):
+    """
+    Floyd-Steinberg error diffusion of every frame of the stack at once.
+
+    Pixels are visited in a wavefront: step t handles pixel (y, t - 2 * y)
+    of every row, which is after all four pixels that diffuse error into it.
+    Each step processes a diagonal of every frame with numpy, so the Python
+    loop runs width + 2 * height times instead of once per pixel.
+
+    With a tolerance, a pixel whose gray level is within tolerance of its
+    level at the frame it last took a dot from keeps that dot. Its neighbours
+    still receive the error of the dot plain diffusion would have chosen, so
+    kept dots never build up error across the frame.
+
+    Args:
+        gray (numpy.ndarray): uint8 frames of shape (frames, height, width).
+        threshold (int): Gray level from which a pixel is white.
+        tolerance (int): Largest change that keeps a pixel's dot, or None
+            for plain per-frame Floyd-Steinberg.
+
+    Returns:
+        numpy.ndarray: bool array of the same shape, True for white pixels.
+    """
+    frame_count, height, width = gray.shape
+    work = gray.astype(np.float32)
+    bits = np.zeros(gray.shape, dtype=bool)
+    if not gray.size:
+        return bits
+
+    anchor = None
+    if tolerance is not None:
+        # For every pixel and frame, the frame whose dot it keeps. A pixel is
+        # re-anchored once its input moves more than tolerance away from the
+        # gray level at its anchor, so slow fades still update.
+        anchor = np.zeros(gray.shape, dtype=np.intp)
+        reference = gray[0].astype(np.int16)
+        current = np.zeros((height, width), dtype=np.intp)
+        for frame_number in range(1, frame_count):
+            frame = gray[frame_number].astype(np.int16)
+            moved = np.abs(frame - reference) > tolerance
+            current[moved] = frame_number
+            reference[moved] = frame[moved]
+            anchor[frame_number] = current
+
+    rows = np.arange(height)
+    for step in range(width + 2 * (height - 1)):
+        columns = step - 2 * rows
+        inside = (columns >= 0) & (columns < width)
+        ys, xs = rows[inside], columns[inside]
+        values = work[:, ys, xs]
+        natural = values >= threshold
+        if anchor is None:
+            bits[:, ys, xs] = natural
+        else:
+            bits[:, ys, xs] = np.take_along_axis(natural, anchor[:, ys, xs], axis=0)
+
+        error = values - natural * np.float32(255)
+        for dy, dx, weight in DIFFUSION_KERNEL:
+            target_y, target_x = ys + dy, xs + dx
+            valid = (target_y < height) & (target_x >= 0) & (target_x < width)
+            work[:, target_y[valid], target_x[valid]] += error[:, valid] * weight
+    return bits
+
+
+def dither_stack(gray, mode=DITHER_PILLOW):
+    """
+    Dithers a stack of grayscale frames with one of DITHER_MODES.
+
+    Args:
+        gray (numpy.ndarray): uint8 frames of shape (frames, height, width).
+        mode (str): Dithering mode, see the module docstring.
+
+    Returns:
+        numpy.ndarray: bool array of the same shape, True for white pixels.
+    """
+    gray = np.asarray(gray, dtype=np.uint8)
+    if mode == DITHER_PILLOW:
+        return pillow_dither_stack(gray)
+    if mode == DITHER_THRESHOLD:
+        return threshold_stack(gray)
+    if mode == DITHER_BAYER:
+        return bayer_stack(gray)
+    if mode == DITHER_DIFFUSION:
+        return diffuse_stack(gray)
+    raise ValueError(f"Unknown dither mode '{mode}'")
+
+
+def bit_changes(bits):
+    """
+    Counts the pixels that change from each frame to the next, including
+    from the last frame back to the first (the animation loops).
+
+    Returns:
+        numpy.ndarray: One count per frame, entry i is the change into frame i.
+    """
+    bits = np.asarray(bits, dtype=bool)
+    return (bits != np.roll(bits, 1, axis=0)).sum(axis=(1, 2))
+
+
+def dither_report(bit_stacks):
+    """
+    Measures what each dithered version of an animation costs to store and send.
+
+    Args:
+        bit_stacks (dict): mode -> bool stack of shape (frames, height, width).
+
+    Returns:
+        list[dict]: One row per mode with the changed bits per frame (mean
+        and max), the number of distinct frames, and the size of the frames
+        stored once each and with the frame codec (horizontal layout).
+    """
+    rows = []
+    for mode, bits in bit_stacks.items():
+        changes = bit_changes(bits)
+        width = bits.shape[-1] - bits.shape[-1] % 8
+        frames = [frame.tobytes() for frame in np.packbits(bits[..., :width], axis=-1)]
+        rows.append({
+            "mode": mode,
+            "mean_changed_bits": float(changes.mean()) if len(changes) else 0.0,
+            "max_changed_bits": int(changes.max()) if len(changes) else 0,
+            "distinct_frames": len(set(frames)),
+            "stored_bytes": sum(len(frame) for frame in set(frames)),
+            "codec_bytes": sum(len(encode_frame(frame, frames[i - 1] if i else None))
+                               for i, frame in enumerate(frames)),
+        })
+    return rows
+
+
+def print_dither_report(bit_stacks):
+    """Prints dither_report() as a table and marks the mode with the smallest codec output."""
+    rows = dither_report(bit_stacks)
+    if not rows:
+        return
+    frame_count = len(next(iter(bit_stacks.values())))
+    cheapest = min(rows, key=lambda row: row["codec_bytes"])["mode"]
+    print(f"\nDither modes ({frame_count} frames):")
+    print(f"  {'mode':<10} {'changed bits/frame':>18} {'max':>6} {'distinct':>8} {'stored':>8} {'codec':>8}")
+    for row in rows:
+        print(f"  {row['mode']:<10} {row['mean_changed_bits']:18.1f} {row['max_changed_bits']:6d} "
+              f"{row['distinct_frames']:8d} {row['stored_bytes']:8d} {row['codec_bytes']:8d}"
+              f"{'  <- cheapest' if row['mode'] == cheapest else ''}")
@@ -0,0 +1,532 @@
+"""
+Host-side playback emulator for generated sketches.
+
+Loads the frames of a generated sketch (the PROGMEM arrays, frame table,
+durations and dirty rectangles of animation_updated.ino), of a LittleFS
+frame asset (frame_asset.py) or of a frame store (frame_store.py) and replays
+the sketch's loop() on a model of the SSD1306:
+
+    display     every frame is decoded, drawn and sent the way the sketch
+                does it, and what the panel ends up showing is checked
+                against the frame it should show
+    timing      every frame costs CPU time (decoding, drawing into the
+                display buffer) and I2C time (the transactions display() or
+                sendWindow() make), simulated at 100 kHz, 400 kHz and 1 MHz
+                with the sketch's delay or compensated timing
+
+The report gives the effective frame rate and the frames that miss their
+deadline, i.e. that take longer to draw and send than they should be shown
+(delay timing) or are shown after their scheduled time (compensated timing).
+A preview GIF of the panel, timed as the device would play it, can be
+written too. The CPU costs below are rough figures for an ESP8266 at 80 MHz;
+calibrate them against a real board before trusting absolute numbers.
+
+    python3 emulator.py animation_updated/animation_updated.ino --preview preview.gif
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import numpy as np
+from PIL import Image
+
+from dirty_rects import display_transactions, window_transactions
+from frame_codec import decode_cost, decode_frame
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES, pack_mono_pixels, packed_frame_bytes, unpack_mono_pixels
+from frame_asset import ASSET_MAGIC, FrameAssetReader
+from frame_store import STORE_MAGIC, FrameStore
+from code_generator import OUTPUT_INO_PATH, TIMING_COMPENSATED, TIMING_DELAY, FRAME_TIMINGS
+
+# --- Configuration ---
+I2C_CLOCKS = (100000, 400000, 1000000)   # Bus speeds simulated, in Hz
+PREVIEW_CLOCK = 400000                    # Bus speed the preview GIF and per-frame table use
+PREVIEW_SCALE = 4                         # Preview pixels per display pixel
+DEFAULT_FRAME_DELAY = 70                  # frame_delay when the input is not a sketch
+I2C_IDLE_CLOCK = 100000                   # Adafruit_SSD1306's clkAfter: the bus speed outside its own
+                                          # transactions, which sendWindow() runs at unless it raises it
+# CPU cost model (microseconds)
+I2C_TRANSACTION_US = 20.0   # Wire.beginTransmission() / endTransmission() overhead per transaction
+PIXEL_LOOP_US = 0.12        # drawBitmap() / drawWindow() work per pixel visited
+PIXEL_WRITE_US = 0.25       # drawPixel() into the display buffer
+CLEAR_US = 15.0             # clearDisplay()
+FLASH_BYTE_US = 0.03        # memcpy_P() / pgm_read_byte() / buffer write per byte
+DECODE_TOKEN_US = 0.4       # decodeFrame() per run
+FS_READ_US = 150.0          # LittleFS seek + read call
+FS_BYTE_US = 0.05           # LittleFS read per byte
+# --- End Configuration ---
+
+I2C_BITS_PER_BYTE = 9   # 8 data bits + ACK
+I2C_FRAME_BITS = 2      # START and STOP
+WINDOW_COMMANDS = 6     # sendWindow() commands (COLUMNADDR x0 x1, PAGEADDR p0 p1), sent at the display's speed
+
+
+def parse_c_bytes(values):
+    """Converts the '0x12, 0x34, ...' inside an array initializer into bytes."""
+    return bytes(int(token, 16) for token in values.split(",") if token.strip())
+
+
+def load_sketch(sketch_path):
+    """
+    Reads the frames and playback settings of a generated sketch.
+
+    Sketches made with the LittleFS template are followed to their
+    data/<asset> file. Sketches from before the frame table are read in
+    the order of the drawBitmap() calls in their loop.
+
+    Returns:
+        dict: The animation (see load_animation()).
+    """
+    with open(sketch_path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    defines = dict(re.findall(r'^#define[ \t]+(\w+)[ \t]+("[^"\r\n]*"|[^\r\n/]*)', text, re.MULTILINE))
+
+    def define_int(name, default):
+        try:
+            return int(defines[name].strip())
+        except (KeyError, ValueError):
+            return default
+
+    screen = (define_int("SCREEN_WIDTH", 128), define_int("SCREEN_HEIGHT", 64))
+    send_window = re.search(r"void sendWindow\(.*?\n}", text, re.DOTALL)
+    delay_match = re.search(r"int\s+frame_delay\s*=\s*(\d+)\s*;", text)
+    loop_text = text[text.find("void loop()"):]
+    animation = {
+        "source": sketch_path,
+        "screen": screen,
+        "frame_size": (define_int("FRAME_WIDTH", screen[0]), define_int("FRAME_HEIGHT", screen[1])),
+        "layout": LAYOUT_PAGES if "FRAME_LAYOUT_PAGES" in defines else LAYOUT_HORIZONTAL,
+        "codec": "FRAME_CODEC" in defines,
+        "dirty_rects": "DIRTY_RECTS" in defines,
+        "asset": False,
+        "timing": TIMING_COMPENSATED if "next_frame_at" in loop_text else TIMING_DELAY,
+        "frame_delay": int(delay_match.group(1)) if delay_match else DEFAULT_FRAME_DELAY,
+        "rects": None,
+        # Adafruit_SSD1306 only raises the bus inside its own transactions
+        "window_clock": None if send_window and "Wire.setClock" in send_window.group(0) else I2C_IDLE_CLOCK,
+    }
+    animation["frame_bytes"] = define_int("FRAME_BYTES", packed_frame_bytes(*animation["frame_size"], animation["layout"]))
+
+    if "ASSET_PATH" in defines:
+        asset_name = defines["ASSET_PATH"].strip().strip('"').lstrip("/")
+        asset = load_animation(os.path.join(os.path.dirname(sketch_path), "data", asset_name))
+        # What openAsset() checks before the sketch plays anything
+        if asset["frame_size"] != animation["frame_size"] or asset["layout"] != animation["layout"]:
+            raise ValueError(f"'{asset['source']}' holds {asset['layout']} frames of "
+                             f"{asset['frame_size'][0]}x{asset['frame_size'][1]}, the sketch expects "
+                             f"{animation['layout']} frames of "
+                             f"{animation['frame_size'][0]}x{animation['frame_size'][1]}")
+        animation.update(asset=True, frames=asset["frames"], durations=asset["durations"])
+        return animation
+
+    arrays = {
+        name: parse_c_bytes(values)
+        for name, values in re.findall(r"const unsigned char (\w+)\[\] PROGMEM = \{([^}]*)\}", text)
+    }
+    table = re.search(r"frame_table\[\] PROGMEM = \{([^}]*)\}", text)
+    if table:
+        names = [name.strip() for name in table.group(1).split(",") if name.strip()]
+    else:
+        names = re.findall(r"drawBitmap\(\s*[^,]+,\s*[^,]+,\s*(\w+)", loop_text)
+    missing = sorted(set(names) - set(arrays))
+    if not names or missing:
+        raise ValueError(f"'{sketch_path}' has no frame arrays to play"
+                         + (f" (missing: {', '.join(missing)})" if missing else ""))
+    animation["frames"] = [arrays[name] for name in names]
+
+    durations = re.search(r"frame_durations\[\] PROGMEM = \{([^}]*)\}", text)
+    animation["durations"] = ([int(value) for value in durations.group(1).split(",")] if durations
+                              else [0] * len(names))
+
+    rects = re.search(r"frame_rects\[\]\[4\] PROGMEM = \{(.*?)\};", text, re.DOTALL)
+    if rects:
+        animation["rects"] = [tuple(map(int, rect)) for rect in
+                              re.findall(r"\{\s*(\d+),\s*(\d+),\s*(\d+),\s*(\d+)\s*\}", rects.group(1))]
+    return animation
+
+
+def load_animation(path):
+    """
+    Loads an animation to emulate from a sketch, a frame asset or a frame store.
+
+    Returns:
+        dict: source, screen (width, height), frame_size (width, height),
+        layout, codec, dirty_rects, asset, timing, frame_delay, frames
+        (stored bytes per frame, encoded when codec is set), durations (ms,
+        0 = frame_delay), rects (dirty rectangles or None), frame_bytes (the
+        sketch's FRAME_BYTES) and window_clock (the bus speed of sendWindow()'s
+        data in Hz, or None when it runs at the display's speed).
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+
+    if magic not in (ASSET_MAGIC, STORE_MAGIC):
+        return load_sketch(path)
+
+    if magic == ASSET_MAGIC:
+        with FrameAssetReader(path) as asset:
+            problems = asset.verify()
+            if problems:
+                raise ValueError(f"'{path}': {problems[0]}")
+            frames = [asset.frame(i) for i in range(len(asset))]
+            durations = [asset.duration(i) for i in range(len(asset))]
+            width, height, layout = asset.width, asset.height, asset.layout
+    else:
+        with FrameStore(path) as store:
+            frames = [bytes(frame) for frame in store]
+            durations = [int(duration) for duration in store.durations]
+            width, height, layout = store.width, store.height, store.layout
+    return {
+        "source": path,
+        "screen": (width, height),
+        "frame_size": (width, height),
+        "layout": layout,
+        "codec": False,
+        "dirty_rects": False,
+        "asset": magic == ASSET_MAGIC,
+        "timing": TIMING_DELAY,
+        "frame_delay": DEFAULT_FRAME_DELAY,
+        "frames": frames,
+        "durations": durations,
+        "rects": None,
+        "frame_bytes": len(frames[0]) if frames else packed_frame_bytes(width, height, layout),
+        "window_clock": None,
+    }
+
+
+def i2c_seconds(transactions, clock_hz):
+    """Time the transactions take on a bus running at clock_hz."""
+    bits = sum(I2C_BITS_PER_BYTE * size + I2C_FRAME_BITS for size in transactions)
+    return bits / clock_hz + len(transactions) * I2C_TRANSACTION_US / 1e6
+
+
+def buffer_pixels(buffer, screen_width, screen_height):
+    """Reads a display buffer (or the SSD1306's RAM) the way the panel maps it: pages of 8 rows, LSB on top."""
+    return unpack_mono_pixels(bytes(buffer), screen_width, screen_height, LAYOUT_PAGES)
+
+
+def read_bytes(source, size, offset=0):
+    """Reads size bytes of source from offset; bytes past its end read as 0."""
+    chunk = bytes(source[offset:offset + size])
+    return chunk + bytes(size - len(chunk))
+
+
+def draw_bitmap(buffer, screen_width, screen_height, x, y, bitmap, width, height):
+    """Adafruit_GFX::drawBitmap(): sets the pixels of a horizontally packed bitmap, clipped to the screen."""
+    byte_width = (width + 7) // 8
+    rows = np.frombuffer(read_bytes(bitmap, byte_width * height), dtype=np.uint8).reshape(height, byte_width)
+    bits = np.unpackbits(rows, axis=1)[:, :width].astype(bool)
+    pixels = buffer_pixels(buffer, screen_width, screen_height)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, screen_width), min(y + height, screen_height)
+    pixels[y0:y1, x0:x1] |= bits[y0 - y:y1 - y, x0 - x:x1 - x]
+    buffer[:] = pack_mono_pixels(pixels, layout=LAYOUT_PAGES).tobytes()
+    return int(bits.sum())
+
+
+def draw_window(buffer, screen_width, screen_height, bitmap, rect):
+    """drawWindow() in Template/animation.ino: redraws the window's pixels from a screen sized bitmap."""
+    x0, x1, page0, page1 = rect
+    row_bytes = (screen_width + 7) // 8
+    rows = np.frombuffer(read_bytes(bitmap, row_bytes * screen_height), dtype=np.uint8)
+    bits = np.unpackbits(rows.reshape(screen_height, row_bytes), axis=1).astype(bool)
+    window = np.s_[page0 * 8:min((page1 + 1) * 8, screen_height), x0:x1 + 1]
+    pixels = buffer_pixels(buffer, screen_width, screen_height)
+    pixels[window] = bits[window]
+    buffer[:] = pack_mono_pixels(pixels, layout=LAYOUT_PAGES).tobytes()
+
+
+def copy_window(destination, source, screen_width, rect):
+    """copyWindow() and the data loop of sendWindow(): copies the window's bytes, page by page."""
+    x0, x1, page0, page1 = rect
+    for page in range(page0, page1 + 1):
+        offset = page * screen_width + x0
+        destination[offset:offset + x1 - x0 + 1] = read_bytes(source, x1 - x0 + 1, offset)
+
+
+def replay_frames(animation):
+    """
+    Runs the sketch's loop() once on a model display.
+
+    The display buffer (SCREEN_WIDTH bytes per page) and the SSD1306's RAM
+    are modeled byte for byte: memcpy_P(), readFrame() and decodeFrame()
+    write FRAME_BYTES raw bytes into the buffer, copyWindow() and
+    sendWindow() copy every page at page * SCREEN_WIDTH, and drawBitmap()
+    reads FRAME_WIDTH rounded up to whole bytes per row. What the panel
+    shows is read back from its RAM, so frames packed with another stride
+    or size than the sketch assumes show up as mismatches.
+
+    Returns:
+        tuple: (screens, work, mismatches). screens holds what the panel
+        shows after each frame (bool arrays of the screen size); work holds
+        one dict per frame with "cpu_us", "transactions" (bytes per I2C
+        transaction at the display's bus speed) and "window_transactions"
+        (the data transactions of sendWindow()); mismatches lists the
+        frames where the panel does not show the frame it should.
+    """
+    screen_width, screen_height = animation["screen"]
+    frame_width, frame_height = animation["frame_size"]
+    layout = animation["layout"]
+    frame_bytes = animation["frame_bytes"]
+    offset_x = (screen_width - frame_width) // 2
+    offset_y = (screen_height - frame_height) // 2
+    full_update = display_transactions(screen_width, screen_height)
+
+    buffer = bytearray(screen_width * ((screen_height + 7) // 8))   # display.getBuffer()
+    panel = bytearray(len(buffer))                                  # The SSD1306's RAM
+    frame_buffer = bytearray(frame_bytes)                           # frame_buffer[FRAME_BYTES]
+    reference = bytearray(packed_frame_bytes(frame_width, frame_height, layout))   # The frame as packed on the host
+    screens = []
+    work = []
+    mismatches = []
+    for index, stored in enumerate(animation["frames"]):
+        cpu_us = 0.0
+        if animation["codec"]:
+            decode_frame(stored, reference)
+            # Page layout frames decode straight into the display buffer
+            target = memoryview(buffer)[:frame_bytes] if layout == LAYOUT_PAGES else frame_buffer
+            decode_frame(stored, target)
+            tokens, read_count, written = decode_cost(stored, frame_bytes)
+            cpu_us += tokens * DECODE_TOKEN_US + (read_count + written) * FLASH_BYTE_US
+            bitmap = frame_buffer
+        else:
+            reference[:] = stored
+            bitmap = stored
+            if animation["asset"]:
+                # readFrame() into the display buffer or frame_buffer
+                cpu_us += 3 * FS_READ_US + (6 + frame_bytes) * FS_BYTE_US
+                if layout == LAYOUT_PAGES:
+                    buffer[:frame_bytes] = read_bytes(stored, frame_bytes)
+                else:
+                    frame_buffer[:] = read_bytes(stored, frame_bytes)
+                    bitmap = frame_buffer
+
+        pixels = unpack_mono_pixels(bytes(reference), frame_width, frame_height, layout)
+        expected = np.zeros((screen_height, screen_width), dtype=bool)
+        expected[offset_y:offset_y + frame_height, offset_x:offset_x + pixels.shape[1]] = pixels
+
+        window = []
+        if animation["dirty_rects"]:
+            transactions = []
+            rect = animation["rects"][index]
+            x0, x1, page0, page1 = rect
+            if x0 <= x1:
+                if layout == LAYOUT_PAGES:
+                    if not animation["codec"]:
+                        copy_window(buffer, bitmap, screen_width, rect)
+                        cpu_us += (x1 - x0 + 1) * (page1 - page0 + 1) * FLASH_BYTE_US
+                else:
+                    draw_window(buffer, screen_width, screen_height, bitmap, rect)
+                    window_pixels = (min((page1 + 1) * 8, screen_height) - page0 * 8) * (x1 - x0 + 1)
+                    cpu_us += window_pixels * (PIXEL_LOOP_US + PIXEL_WRITE_US)
+                copy_window(panel, buffer, screen_width, rect)   # sendWindow()
+                sent = window_transactions(rect)
+                transactions, window = sent[:WINDOW_COMMANDS], sent[WINDOW_COMMANDS:]
+        else:
+            if layout == LAYOUT_PAGES:
+                if not animation["codec"] and not animation["asset"]:
+                    buffer[:frame_bytes] = read_bytes(stored, frame_bytes)   # memcpy_P()
+                    cpu_us += frame_bytes * FLASH_BYTE_US
+            else:
+                buffer[:] = bytes(len(buffer))   # clearDisplay()
+                set_pixels = draw_bitmap(buffer, screen_width, screen_height, offset_x, offset_y,
+                                         bitmap, frame_width, frame_height)
+                cpu_us += CLEAR_US + frame_width * frame_height * PIXEL_LOOP_US + set_pixels * PIXEL_WRITE_US
+                cpu_us += frame_bytes * FLASH_BYTE_US
+            panel[:] = buffer   # display()
+            transactions = full_update
+
+        shown = buffer_pixels(panel, screen_width, screen_height)
+        if not np.array_equal(shown, expected):
+            mismatches.append(index)
+        screens.append(shown)
+        work.append({"cpu_us": cpu_us, "transactions": transactions, "window_transactions": window})
+    return screens, work, mismatches
+
+
+def simulate_timing(animation, work, clock_hz):
+    """
+    Plays the frames through the sketch's timing code with the bus at clock_hz.
+    sendWindow()'s data goes out at the animation's window_clock instead,
+    when the sketch leaves the bus at Adafruit_SSD1306's idle speed.
+
+    Returns:
+        dict: clock_hz, seconds (one loop), fps (effective), nominal_fps (the
+        durations alone), speed (effective / nominal), missed (frame indices)
+        and frames, one dict per frame with cpu_ms, i2c_ms, i2c_bytes,
+        duration_ms, period_ms (time until the next frame starts) and missed.
+    """
+    now = 0.0
+    next_frame_at = 0.0 # static uint32_t next_frame_at = millis();
+    frames = []
+    for index, frame_work in enumerate(work):
+        start = now
+        cpu_ms = frame_work["cpu_us"] / 1000
+        i2c_ms = 1000 * (i2c_seconds(frame_work["transactions"], clock_hz)
+                         + i2c_seconds(frame_work["window_transactions"], animation["window_clock"] or clock_hz))
+        now += cpu_ms + i2c_ms
+        duration = animation["durations"][index] or animation["frame_delay"]
+
+        if animation["timing"] == TIMING_COMPENSATED:
+            next_frame_at += duration
+            wait = next_frame_at - now
+            missed = wait < 0
+            if wait > 0:
+                now += wait
+            elif wait < -1000:
+                next_frame_at = now # Too far behind, resync instead of rushing
+        else:
+            missed = cpu_ms + i2c_ms > duration
+            now += duration
+
+        frames.append({
+            "cpu_ms": round(cpu_ms, 3),
+            "i2c_ms": round(i2c_ms, 3),
+            "i2c_bytes": sum(frame_work["transactions"]) + sum(frame_work["window_transactions"]),
+            "duration_ms": duration,
+            "period_ms": round(now - start, 3),
+            "missed": missed,
+        })
+
+    nominal_ms = sum(frame["duration_ms"] for frame in frames)
+    fps = 1000 * len(frames) / now if now else 0.0
+    nominal_fps = 1000 * len(frames) / nominal_ms if nominal_ms else 0.0
+    return {
+        "clock_hz": clock_hz,
+        "seconds": round(now / 1000, 3),
+        "fps": round(fps, 2),
+        "nominal_fps": round(nominal_fps, 2),
+        "speed": round(fps / nominal_fps, 3) if nominal_fps else 0.0,
+        "missed": [index for index, frame in enumerate(frames) if frame["missed"]],
+        "frames": frames,
+    }
+
+
+def write_preview(screens, result, preview_path, scale=PREVIEW_SCALE):
+    """Writes what the panel shows as a GIF, every frame shown for its simulated period."""
+    images = [
+        Image.fromarray(screen.astype(np.uint8) * 255).resize(
+            (screen.shape[1] * scale, screen.shape[0] * scale), Image.NEAREST
+        )
+        for screen in screens
+    ]
+    durations = [max(int(round(frame["period_ms"])), 10) for frame in result["frames"]]
+    images[0].save(preview_path, save_all=True, append_images=images[1:], duration=durations, loop=0)
+    print(f"Wrote preview '{preview_path}' ({len(images)} frames, timed at {result['clock_hz'] // 1000} kHz)")
+
+
+def print_report(animation, results, mismatches, frame_clock=None):
+    """Prints the simulated timing per bus speed, and per frame for frame_clock."""
+    screen_width, screen_height = animation["screen"]
+    features = [animation["layout"], f"{animation['timing']} timing"]
+    features += [name for name, used in (("codec", animation["codec"]), ("dirty rects", animation["dirty_rects"]),
+                                         ("LittleFS asset", animation["asset"])) if used]
+    print(f"\n{animation['source']}: {len(animation['frames'])} frames, "
+          f"{animation['frame_size'][0]}x{animation['frame_size'][1]} on {screen_width}x{screen_height}, "
+          f"{', '.join(features)}")
+    if mismatches:
+        print(f"  Error: the display does not show the expected image in {len(mismatches)} frame(s), "
+              f"first: frame {mismatches[0]}")
+    else:
+        print("  Display output matches every frame.")
+    if animation["dirty_rects"] and animation["window_clock"]:
+        print(f"  Warning: sendWindow() does not raise the bus speed, its data is sent at "
+              f"{animation['window_clock'] // 1000} kHz whatever the display's clock")
+
+    print(f"\n  {'I2C':>8} {'cpu ms':>8} {'i2c ms':>8} {'fps':>7} {'nominal':>8} {'speed':>7} {'missed':>7}")
+    for result in results:
+        frames = result["frames"]
+        print(f"  {result['clock_hz'] // 1000:>4} kHz "
+              f"{sum(f['cpu_ms'] for f in frames) / len(frames):8.2f} "
+              f"{sum(f['i2c_ms'] for f in frames) / len(frames):8.2f} "
+              f"{result['fps']:7.2f} {result['nominal_fps']:8.2f} {100 * result['speed']:6.1f}% "
+              f"{len(result['missed']):7d}")
+
+    for result in results:
+        if result["clock_hz"] != frame_clock:
+            continue
+        print(f"\n  Frames at {frame_clock // 1000} kHz:")
+        print(f"  {'frame':>6} {'cpu ms':>8} {'i2c ms':>8} {'i2c bytes':>9} {'duration':>8} {'period':>8} {'fps':>7}")
+        for index, frame in enumerate(result["frames"]):
+            print(f"  {index:6d} {frame['cpu_ms']:8.2f} {frame['i2c_ms']:8.2f} {frame['i2c_bytes']:9d} "
+                  f"{frame['duration_ms']:8d} {frame['period_ms']:8.1f} {1000 / frame['period_ms']:7.2f}"
+                  f"{'  MISSED' if frame['missed'] else ''}")
+
+
+def emulate(path, clocks=I2C_CLOCKS, timing=None, frame_delay=None):
+    """
+    Loads an animation and simulates it at every bus speed in clocks.
+
+    Args:
+        path (str): Generated sketch, frame asset or frame store.
+        clocks (list[int]): I2C clock speeds in Hz.
+        timing (str): Overrides the sketch's timing (TIMING_DELAY or TIMING_COMPENSATED).
+        frame_delay (int): Overrides the sketch's frame_delay in ms.
+
+    Returns:
+        tuple: (animation, screens, results, mismatches), see
+        load_animation(), replay_frames() and simulate_timing().
+    """
+    animation = load_animation(path)
+    if timing is not None:
+        animation["timing"] = timing
+    if frame_delay is not None:
+        animation["frame_delay"] = frame_delay
+    screens, work, mismatches = replay_frames(animation)
+    results = [simulate_timing(animation, work, clock_hz) for clock_hz in clocks]
+    return animation, screens, results, mismatches
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Emulate a generated sketch's playback and I2C timing on the host.")
+    parser.add_argument("input", nargs="?", default=OUTPUT_INO_PATH,
+                        help="generated sketch, frame asset (.bin) or frame store (default: %(default)s)")
+    parser.add_argument("--clocks", type=int, nargs="+", default=list(I2C_CLOCKS), metavar="HZ",
+                        help="I2C clock speeds to simulate (default: %(default)s)")
+    parser.add_argument("--clock", type=int, default=PREVIEW_CLOCK, metavar="HZ",
+                        help="clock for the preview, --frames and --max-missed (default: %(default)s)")
+    parser.add_argument("--timing", choices=FRAME_TIMINGS, help="override the sketch's frame timing")
+    parser.add_argument("--frame-delay", type=int, metavar="MS", help="override the sketch's frame_delay")
+    parser.add_argument("--preview", metavar="GIF", help="write what the display shows to this GIF")
+    parser.add_argument("--scale", type=int, default=PREVIEW_SCALE,
+                        help="preview pixels per display pixel (default: %(default)s)")
+    parser.add_argument("--frames", action="store_true", help="print the timing of every frame at --clock")
+    parser.add_argument("--json", metavar="FILE", help="write the full results as JSON")
+    parser.add_argument("--max-missed", type=int, metavar="N",
+                        help="exit with status 1 if more than N frames miss their deadline at --clock")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    clocks = sorted(set(args.clocks) | {args.clock})
+    try:
+        animation, screens, results, mismatches = emulate(args.input, clocks, args.timing, args.frame_delay)
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print_report(animation, results, mismatches, args.clock if args.frames else None)
+    selected = next(result for result in results if result["clock_hz"] == args.clock)
+    if args.preview:
+        write_preview(screens, selected, args.preview, args.scale)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": animation["source"],
+                "frames": len(animation["frames"]),
+                "timing": animation["timing"],
+                "frame_delay": animation["frame_delay"],
+                "mismatched_frames": mismatches,
+                "results": results,
+            }, f, indent=2)
+        print(f"Results written to '{args.json}'")
+
+    failed = bool(mismatches)
+    if args.max_missed is not None and len(selected["missed"]) > args.max_missed:
+        print(f"Error: {len(selected['missed'])} frame(s) miss their deadline at {args.clock // 1000} kHz "
+              f"(allowed: {args.max_missed})")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,244 @@
+"""
+Flash budget planner.
+
+Decodes a GIF once into small previews at the display size and estimates how
+much flash the generated sketch would need for every combination of:
+
+    resolution     the display size, or a smaller centred frame (RESOLUTION_SCALES)
+    decimation     keep every Nth frame, up to MAX_DECIMATION
+    merging        drop frames within a Hamming distance of the frame before
+                   them, and store frames close to an earlier one only once
+
+Of the combinations that fit the budget, the one that shows the most pixels
+over the whole animation wins. The plan is printed before the sketch is
+generated, so an animation that cannot fit is rejected before the codec,
+the sketch build or the Arduino build run.
+"""
+
+import numpy as np
+from PIL import Image
+
+from image_splitter import iter_gif_frames
+from frame_generator import LAYOUT_HORIZONTAL, pack_mono_pixels
+from frame_codec import encode_frame
+from dithering import DITHER_PILLOW, dither_stack
+
+# --- Configuration ---
+RESOLUTION_SCALES = (1.0, 0.75, 0.5)   # Frame sizes tried, as a fraction of the display size
+MAX_DECIMATION = 4                     # Keep at least every 4th frame
+MERGE_THRESHOLD = 32                   # Default Hamming distance (differing pixels) for merging frames
+CODEC_SAMPLE_FRAMES = 16               # Frames encoded to estimate the compressed size
+DEFAULT_FRAME_DELAY = 70               # frame_delay in Template/animation.ino
+# --- End Configuration ---
+
+# Flash used per frame table entry in the generated sketch
+TABLE_ENTRY_BYTES = 4     # frame_table[] pointer
+DURATION_ENTRY_BYTES = 2  # frame_durations[] entry
+RECT_ENTRY_BYTES = 4      # frame_rects[] entry
+
+# Number of set bits in every byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def probe_gif_frames(gif_path, width, height):
+    """
+    Decodes a GIF once and keeps every composited frame resized to the display size.
+
+    Args:
+        gif_path (str): Path to the input GIF file.
+        width (int): Display width in pixels.
+        height (int): Display height in pixels.
+
+    Returns:
+        tuple: (previews, durations) - one RGBA PIL image and one display time
+        in ms per GIF frame, in playback order.
+    """
+    previews = []
+    durations = []
+    for canvas in iter_gif_frames(gif_path):
+        previews.append(canvas.resize((width, height), Image.LANCZOS))
+        durations.append(canvas.info.get("duration", 0))
+    return previews, durations
+
+
+def candidate_resolutions(width, height, layout=LAYOUT_HORIZONTAL, dirty_rects=False):
+    """
+    Lists the frame sizes the planner may use, largest first.
+
+    Frames smaller than the display are drawn centred with drawBitmap(), so
+    they are only offered for horizontal frames without dirty rectangles.
+    The page layout and the dirty rectangle code address the display buffer
+    directly and need frames of the full display size.
+    """
+    if layout != LAYOUT_HORIZONTAL or dirty_rects:
+        return [(width, height)]
+    resolutions = []
+    for scale in RESOLUTION_SCALES:
+        # Packing drops columns that do not fill a whole byte
+        candidate = (int(width * scale) // 8 * 8, max(int(height * scale), 1))
+        if candidate[0] and candidate not in resolutions:
+            resolutions.append(candidate)
+    return resolutions
+
+
+def pack_previews(previews, width, height, invert=False, layout=LAYOUT_HORIZONTAL, dither=DITHER_PILLOW):
+    """Packs the probed frames at the given size, exactly like frame_generator.images_to_mono_frames()."""
+    bitmaps = []
+    for preview in previews:
+        if preview.size != (width, height):
+            preview = preview.resize((width, height), Image.LANCZOS)
+        bitmaps.append(np.asarray(preview.convert("1" if dither == DITHER_PILLOW else "L")))
+    bitmaps = np.stack(bitmaps)
+    if dither != DITHER_PILLOW:
+        bitmaps = dither_stack(bitmaps, dither)
+    packed = pack_mono_pixels(bitmaps, invert, layout)
+    return [frame.tobytes() for frame in packed]
+
+
+def hamming_distances(frame_bytes, others):
+    """Returns the number of differing pixels between one packed frame and each row of others."""
+    frame = np.frombuffer(frame_bytes, dtype=np.uint8)
+    return POPCOUNT[np.bitwise_xor(others, frame)].sum(axis=1)
+
+
+def reduce_frames(packed_frames, durations, step=1, merge_threshold=0):
+    """
+    Applies frame decimation and near-duplicate merging.
+
+    Dropped frames hand their display time to the frame shown in their
+    place, so the animation keeps its overall speed. Frames without a
+    duration count as DEFAULT_FRAME_DELAY.
+
+    Args:
+        packed_frames (list[bytes]): Packed frames in playback order.
+        durations (list[int]): Display time of each frame in ms.
+        step (int): Keep every step-th frame.
+        merge_threshold (int): A frame that differs from the frame before it
+            in at most this many pixels is dropped. A frame that close to any
+            earlier kept frame reuses that frame's bitmap, so it is stored once.
+
+    Returns:
+        tuple: (packed_frames, durations) after reduction.
+    """
+    kept_frames = []
+    kept_durations = []
+    stored = []  # Distinct bitmaps kept so far, as rows of a uint8 array
+    for index in range(0, len(packed_frames), step):
+        frame_bytes = packed_frames[index]
+        duration = sum(d or DEFAULT_FRAME_DELAY for d in durations[index:index + step])
+
+        if kept_frames:
+            previous = np.frombuffer(kept_frames[-1], dtype=np.uint8)[None, :]
+            if hamming_distances(frame_bytes, previous)[0] <= merge_threshold:
+                kept_durations[-1] += duration
+                continue
+
+        if stored:
+            distances = hamming_distances(frame_bytes, np.stack(stored))
+            closest = int(distances.argmin())
+            if distances[closest] <= merge_threshold:
+                frame_bytes = stored[closest].tobytes()
+            else:
+                stored.append(np.frombuffer(frame_bytes, dtype=np.uint8))
+        else:
+            stored.append(np.frombuffer(frame_bytes, dtype=np.uint8))
+
+        kept_frames.append(frame_bytes)
+        kept_durations.append(duration)
+    return kept_frames, kept_durations
+
+
+def estimate_flash_bytes(packed_frames, codec=False, dirty_rects=False):
+    """
+    Estimates the flash the generated frame data takes: the distinct bitmaps
+    plus the per-frame tables.
+
+    Without the codec the bitmap size is exact. With it, CODEC_SAMPLE_FRAMES
+    frames spread over the animation are encoded and their average size is
+    assumed for every frame (identical encoded frames are not deduplicated
+    in the estimate, so it errs on the large side).
+    On input_videos/test.gif it is within 3% of the encode_frames() size,
+    and tests/test_flash_planner.py holds it to 10%.
+    """
+    frame_count = len(packed_frames)
+    if not frame_count:
+        return 0
+    if codec:
+        sample = sorted(set(np.linspace(0, frame_count - 1, min(CODEC_SAMPLE_FRAMES, frame_count)).astype(int)))
+        sample_bytes = sum(
+            len(encode_frame(packed_frames[i], packed_frames[i - 1] if i else None)) for i in sample
+        )
+        data_bytes = sample_bytes * frame_count // len(sample)
+    else:
+        data_bytes = sum(len(frame_bytes) for frame_bytes in set(packed_frames))
+
+    table_bytes = TABLE_ENTRY_BYTES + DURATION_ENTRY_BYTES + (RECT_ENTRY_BYTES if dirty_rects else 0)
+    return data_bytes + table_bytes * frame_count
+
+
+def plan_flash_budget(previews, durations, flash_budget, width, height, invert=False,
+                      layout=LAYOUT_HORIZONTAL, codec=False, dirty_rects=False,
+                      merge_threshold=MERGE_THRESHOLD, dither=DITHER_PILLOW):
+    """
+    Picks the resolution, decimation and merging that fit an animation into a flash budget.
+
+    Args:
+        previews (list[PIL.Image.Image]): Frames from probe_gif_frames().
+        durations (list[int]): Frame durations from probe_gif_frames().
+        flash_budget (int): Flash available for frame data, in bytes.
+        width (int): Display width in pixels.
+        height (int): Display height in pixels.
+        invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        layout (str): Frame layout, see frame_generator.FRAME_LAYOUTS.
+        codec (bool): If True, sizes are estimated for RLE / XOR delta compressed frames.
+        dirty_rects (bool): If True, the frame_rects[] table is counted.
+        merge_threshold (int): Largest Hamming distance at which frames are merged.
+        dither (str): Dithering mode, see dithering.DITHER_MODES.
+
+    Returns:
+        tuple: (plan, packed_frames, durations). plan is a dict describing the
+        chosen combination (plan["fits"] is False when nothing fits, and the
+        smallest combination is returned); packed_frames and durations are
+        the frames to build, already reduced.
+    """
+    merge_thresholds = sorted({0, max(merge_threshold, 0)})
+    best = None
+    smallest = None
+    for frame_width, frame_height in candidate_resolutions(width, height, layout, dirty_rects):
+        packed_frames = pack_previews(previews, frame_width, frame_height, invert, layout, dither)
+        for step in range(1, MAX_DECIMATION + 1):
+            for threshold in merge_thresholds:
+                frames, frame_durations = reduce_frames(packed_frames, durations, step, threshold)
+                plan = {
+                    "width": frame_width,
+                    "height": frame_height,
+                    "step": step,
+                    "merge_threshold": threshold,
+                    "source_frames": len(packed_frames),
+                    "frames": len(frames),
+                    "stored_frames": len(set(frames)),
+                    "flash_bytes": estimate_flash_bytes(frames, codec, dirty_rects),
+                    "flash_budget": flash_budget,
+                }
+                plan["fits"] = plan["flash_bytes"] <= flash_budget
+                candidate = (plan, frames, frame_durations)
+
+                if smallest is None or plan["flash_bytes"] < smallest[0]["flash_bytes"]:
+                    smallest = candidate
+                # Most pixels shown over the animation, then the least merging
+                quality = (frame_width * frame_height * -(-len(packed_frames) // step), -threshold)
+                if plan["fits"] and (best is None or quality > best[0]):
+                    best = (quality, candidate)
+
+    return best[1] if best else smallest
+
+
+def print_plan(plan):
+    """Prints a plan returned by plan_flash_budget()."""
+    kept = "every frame" if plan["step"] == 1 else f"1 of every {plan['step']} frames"
+    print(f"\nFlash plan: {plan['width']}x{plan['height']} frames, keeping {kept}, "
+          f"merging frames within {plan['merge_threshold']} pixel(s)")
+    print(f"  {plan['source_frames']} GIF frames -> {plan['frames']} shown, {plan['stored_frames']} stored")
+    print(f"  Estimated flash for frame data: {plan['flash_bytes']} of {plan['flash_budget']} bytes "
+          f"({100 * plan['flash_bytes'] / max(plan['flash_budget'], 1):.1f}%)"
+          f"{'' if plan['fits'] else ' - DOES NOT FIT'}")
@@ -0,0 +1,221 @@
+"""
+Binary frame asset for streaming playback from LittleFS.
+
+Instead of compiling every frame into the sketch, all packed frames go into
+one file that is uploaded to the board's LittleFS partition and read by
+Template/animation_littlefs.ino one frame at a time. All values are little
+endian:
+
+    header      20 bytes
+        magic           4 bytes  b"ANIM"
+        version         u16      ASSET_VERSION
+        width           u16      frame width in pixels
+        height          u16      frame height in pixels
+        layout          u8       0 = horizontal (drawBitmap), 1 = SSD1306 pages
+        reserved        u8
+        frame count     u16
+        frame bytes     u16      size of every packed frame
+        data offset     u32      where the frame data starts
+    offset table    u32 per frame, file offset of the frame's data
+    durations       u16 per frame, display time in ms (0 = use frame_delay)
+    frame data      frame bytes per distinct frame
+
+Identical frames share one copy of the data, so the offset table can point
+several frames at the same offset. Finding a frame takes one read from the
+offset table, whatever its index.
+"""
+import os
+import struct
+import sys
+
+import instrumentation
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES, packed_frame_bytes, packed_frame_width
+
+# --- Configuration ---
+ASSET_FILE_NAME = "animation.bin"   # Name of the asset on LittleFS (and in the sketch's data/ folder)
+# --- End Configuration ---
+
+ASSET_MAGIC = b"ANIM"
+ASSET_VERSION = 1
+HEADER_FORMAT = "<4sHHHBBHHI"
+HEADER_BYTES = struct.calcsize(HEADER_FORMAT)
+LAYOUT_CODES = {LAYOUT_HORIZONTAL: 0, LAYOUT_PAGES: 1}
+
+
+def build_frame_asset(packed_frames, durations, width, height, layout=LAYOUT_HORIZONTAL):
+    """
+    Builds the binary asset for a list of packed frames.
+
+    Args:
+        packed_frames (list[bytes]): Packed frames in playback order, all the same size.
+        durations (list[int]): Display time of each frame in ms, or None (0 = use frame_delay).
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        layout (str): Layout the frames are packed in (see frame_generator.py).
+
+    Returns:
+        bytes: The complete asset.
+    """
+    frame_count = len(packed_frames)
+    frame_bytes = len(packed_frames[0]) if packed_frames else 0
+    if any(len(f) != frame_bytes for f in packed_frames):
+        raise ValueError("All frames in an asset must have the same size")
+    if frame_count > 0xFFFF or frame_bytes > 0xFFFF:
+        raise ValueError(f"Too many or too large frames for an asset ({frame_count} x {frame_bytes} bytes)")
+    durations = durations or [0] * frame_count
+
+    data_offset = HEADER_BYTES + 6 * frame_count
+    offsets = []
+    data = bytearray()
+    seen = {}
+    for frame in packed_frames:
+        if frame not in seen:
+            seen[frame] = data_offset + len(data)
+            data += frame
+        offsets.append(seen[frame])
+
+    # The header records the width the frames were packed at, which openAsset() compares with FRAME_WIDTH
+    header = struct.pack(HEADER_FORMAT, ASSET_MAGIC, ASSET_VERSION, packed_frame_width(width, layout), height,
+                         LAYOUT_CODES[layout], 0, frame_count, frame_bytes, data_offset)
+    return b"".join([
+        header,
+        struct.pack(f"<{frame_count}I", *offsets),
+        struct.pack(f"<{frame_count}H", *(min(int(d or 0), 0xFFFF) for d in durations)),
+        bytes(data),
+    ])
+
+
+def write_frame_asset(asset_path, packed_frames, durations, width, height, layout=LAYOUT_HORIZONTAL):
+    """Writes the asset for packed_frames to asset_path. Returns True on success."""
+    metrics = instrumentation.current()
+    try:
+        with metrics.measure("write", os.path.basename(asset_path)) as record:
+            asset = build_frame_asset(packed_frames, durations, width, height, layout)
+            asset_dir = os.path.dirname(asset_path)
+            if asset_dir:
+                os.makedirs(asset_dir, exist_ok=True)
+            with open(asset_path, "wb") as f:
+                f.write(asset)
+            record["bytes_out"] = len(asset)
+    except (IOError, ValueError) as e:
+        # Already recorded by measure()
+        metrics.print_error(f"Could not write frame asset '{asset_path}': {e}")
+        return False
+
+    print(f"\nWrote frame asset '{asset_path}': {len(packed_frames)} frames, "
+          f"{len(set(packed_frames))} stored, {len(asset)} bytes")
+    return True
+
+
+class FrameAssetReader:
+    """
+    Random access reader for a frame asset, the host side of readFrame() in
+    Template/animation_littlefs.ino.
+
+        with FrameAssetReader("data/animation.bin") as asset:
+            frame_bytes = asset.frame(10)
+    """
+
+    def __init__(self, asset_path):
+        self.asset_path = asset_path
+        self.file = open(asset_path, "rb")
+        self.file_size = os.fstat(self.file.fileno()).st_size
+        header = self.file.read(HEADER_BYTES)
+        if len(header) != HEADER_BYTES:
+            self.file.close()
+            raise ValueError(f"'{asset_path}' is too short to be a frame asset")
+        (magic, self.version, self.width, self.height, layout_code, _,
+         self.frame_count, self.frame_bytes, self.data_offset) = struct.unpack(HEADER_FORMAT, header)
+        if magic != ASSET_MAGIC or self.version != ASSET_VERSION:
+            self.file.close()
+            raise ValueError(f"'{asset_path}' is not a version {ASSET_VERSION} frame asset")
+        layouts = {code: layout for layout, code in LAYOUT_CODES.items()}
+        self.layout = layouts.get(layout_code)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.frame_count
+
+    def close(self):
+        self.file.close()
+
+    def _read_at(self, offset, size):
+        self.file.seek(offset)
+        return self.file.read(size)
+
+    def frame_offset(self, index):
+        """File offset of a frame's data."""
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range (0-{self.frame_count - 1})")
+        return struct.unpack("<I", self._read_at(HEADER_BYTES + 4 * index, 4))[0]
+
+    def duration(self, index):
+        """Display time of a frame in ms (0 means frame_delay)."""
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range (0-{self.frame_count - 1})")
+        return struct.unpack("<H", self._read_at(HEADER_BYTES + 4 * self.frame_count + 2 * index, 2))[0]
+
+    def frame(self, index):
+        """Returns the packed bytes of a frame."""
+        return self._read_at(self.frame_offset(index), self.frame_bytes)
+
+    def verify(self, expected_layout=None):
+        """
+        Checks the header and that every frame lies inside the file's data section.
+
+        Args:
+            expected_layout (str): Layout the sketch reading the asset was
+                built for, or None to accept either. openAsset() in the
+                template checks the same header field.
+
+        Returns:
+            list[str]: Problems found, empty if the asset is valid.
+        """
+        problems = []
+        if self.layout is None:
+            problems.append("unknown frame layout")
+        elif expected_layout is not None and self.layout != expected_layout:
+            problems.append(f"frames are in the {self.layout} layout, the sketch expects {expected_layout}")
+        if self.layout is not None and packed_frame_bytes(self.width, self.height, self.layout) != self.frame_bytes:
+            problems.append(f"{self.frame_bytes} byte frames do not match {self.width}x{self.height} ({self.layout})")
+        if self.data_offset != HEADER_BYTES + 6 * self.frame_count:
+            problems.append(f"data offset {self.data_offset} does not follow the tables")
+        for index in range(self.frame_count):
+            offset = self.frame_offset(index)
+            if offset < self.data_offset or offset + self.frame_bytes > self.file_size:
+                problems.append(f"frame {index} at offset {offset} lies outside the frame data")
+        return problems
+
+
+def print_asset_info(asset_path):
+    """Prints an asset's header and verifies it. Returns True if it is valid."""
+    try:
+        with FrameAssetReader(asset_path) as asset:
+            problems = asset.verify()
+            stored = len({asset.frame_offset(i) for i in range(len(asset))})
+            durations = [asset.duration(i) for i in range(len(asset))]
+            print(f"{asset_path}: {asset.width}x{asset.height} {asset.layout}, {len(asset)} frames "
+                  f"({stored} stored, {asset.frame_bytes} bytes each), {asset.file_size} bytes")
+            if any(durations):
+                print(f"  Durations: {min(durations)}-{max(durations)} ms")
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
+
+    for problem in problems:
+        print(f"  Error: {problem}")
+    print("  Asset is valid." if not problems else f"  {len(problems)} problem(s) found.")
+    return not problems
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: python3 {os.path.basename(__file__)} <asset file> [...]")
+        sys.exit(1)
+    results = [print_asset_info(path) for path in sys.argv[1:]]
+    sys.exit(0 if all(results) else 1)
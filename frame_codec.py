@@ -0,0 +1,215 @@
+"""
+Frame codec for packed 1-bit frames.
+
+Every frame is stored as one type byte followed by its payload:
+
+    FRAME_RAW  (0)  the packed frame bytes, unchanged
+    FRAME_RLE  (1)  the packed frame, run-length encoded
+    FRAME_XOR  (2)  frame XOR previous frame, run-length encoded
+
+The run-length payload is a series of control bytes:
+
+    0x00-0x7F  literal run: the next (control + 1) bytes are copied as is
+    0x80-0xFF  repeat run:  the next byte is repeated ((control & 0x7F) + 2) times
+
+The first frame is never delta encoded, so playback can restart from it at
+the end of the loop. decodeFrame() in Template/animation.ino is the device
+side counterpart of decode_frame() below.
+"""
+
+FRAME_RAW = 0
+FRAME_RLE = 1
+FRAME_XOR = 2
+
+MAX_LITERAL_RUN = 128
+MAX_REPEAT_RUN = 129
+
+
+def rle_encode(data):
+    """Run-length encodes a byte string. Returns the encoded bytes."""
+    encoded = bytearray()
+    literal_start = 0
+    pos = 0
+    length = len(data)
+
+    while pos < length:
+        # Measure the repeat run starting at pos
+        run_end = pos + 1
+        while run_end < length and data[run_end] == data[pos] and run_end - pos < MAX_REPEAT_RUN:
+            run_end += 1
+
+        if run_end - pos >= 2:
+            _flush_literals(encoded, data, literal_start, pos)
+            encoded.append(0x80 | (run_end - pos - 2))
+            encoded.append(data[pos])
+            pos = run_end
+            literal_start = pos
+        else:
+            pos += 1
+
+    _flush_literals(encoded, data, literal_start, length)
+    return bytes(encoded)
+
+
+def _flush_literals(encoded, data, start, end):
+    """Appends data[start:end] as one or more literal runs."""
+    while start < end:
+        count = min(end - start, MAX_LITERAL_RUN)
+        encoded.append(count - 1)
+        encoded += data[start:start + count]
+        start += count
+
+
+def rle_decode_into(buffer, payload, offset=0, xor=False):
+    """
+    Decodes a run-length payload into buffer (a bytearray) in place.
+
+    Args:
+        buffer (bytearray): Output buffer, exactly one frame long.
+        payload (bytes): Encoded data.
+        offset (int): Where the run-length data starts inside payload.
+        xor (bool): If True, decoded bytes are XORed into buffer instead of copied.
+
+    Returns:
+        int: Number of control tokens decoded, a proxy for device decode time.
+    """
+    pos = 0
+    tokens = 0
+    while pos < len(buffer):
+        control = payload[offset]
+        offset += 1
+        tokens += 1
+        if control & 0x80:
+            count = (control & 0x7F) + 2
+            value = payload[offset]
+            offset += 1
+            if xor:
+                if value:
+                    for i in range(pos, pos + count):
+                        buffer[i] ^= value
+            else:
+                buffer[pos:pos + count] = bytes([value]) * count
+        else:
+            count = control + 1
+            chunk = payload[offset:offset + count]
+            offset += count
+            if xor:
+                for i, value in enumerate(chunk):
+                    buffer[pos + i] ^= value
+            else:
+                buffer[pos:pos + count] = chunk
+        pos += count
+
+    if pos != len(buffer):
+        raise ValueError(f"Encoded frame overruns the {len(buffer)} byte frame buffer")
+    return tokens
+
+
+def encode_frame(frame_bytes, previous_bytes=None):
+    """
+    Encodes one packed frame, choosing the smallest of raw, RLE and XOR delta.
+
+    Args:
+        frame_bytes (bytes): The packed frame.
+        previous_bytes (bytes): The frame shown before it, or None for a keyframe.
+
+    Returns:
+        bytes: Type byte followed by the payload.
+    """
+    candidates = [
+        bytes([FRAME_RAW]) + bytes(frame_bytes),
+        bytes([FRAME_RLE]) + rle_encode(frame_bytes),
+    ]
+    if previous_bytes is not None:
+        delta = bytes(a ^ b for a, b in zip(frame_bytes, previous_bytes))
+        candidates.append(bytes([FRAME_XOR]) + rle_encode(delta))
+    return min(candidates, key=len)
+
+
+def encode_frames(packed_frames):
+    """Encodes a list of packed frames in playback order. Returns a list of bytes."""
+    encoded_frames = []
+    previous_bytes = None
+    for frame_bytes in packed_frames:
+        encoded_frames.append(encode_frame(frame_bytes, previous_bytes))
+        previous_bytes = frame_bytes
+    return encoded_frames
+
+
+def decode_frame(encoded, buffer):
+    """
+    Decodes one encoded frame into buffer, which must hold the previous frame
+    for XOR delta frames. Returns the number of control tokens decoded.
+    """
+    frame_type = encoded[0]
+    if frame_type == FRAME_RAW:
+        buffer[:] = encoded[1:]
+        return 0
+    if frame_type == FRAME_RLE:
+        return rle_decode_into(buffer, encoded, 1)
+    if frame_type == FRAME_XOR:
+        return rle_decode_into(buffer, encoded, 1, xor=True)
+    raise ValueError(f"Unknown frame type {frame_type}")
+
+
+def decode_frames(encoded_frames, frame_size):
+    """Decodes a list of encoded frames back into packed frames (list of bytes)."""
+    buffer = bytearray(frame_size)
+    decoded_frames = []
+    for encoded in encoded_frames:
+        decode_frame(encoded, buffer)
+        decoded_frames.append(bytes(buffer))
+    return decoded_frames
+
+
+def decode_cost(encoded, frame_size):
+    """
+    Estimates the device work needed to decode one frame as
+    (control tokens, bytes read from flash, bytes written to the frame buffer).
+    XOR runs of zero bytes are skipped on the device, so they cost no writes.
+    """
+    frame_type = encoded[0]
+    if frame_type == FRAME_RAW:
+        return 0, len(encoded), frame_size
+
+    tokens = 0
+    written = 0
+    offset = 1
+    pos = 0
+    while pos < frame_size:
+        control = encoded[offset]
+        tokens += 1
+        if control & 0x80:
+            count = (control & 0x7F) + 2
+            if not (frame_type == FRAME_XOR and encoded[offset + 1] == 0):
+                written += count
+            offset += 2
+        else:
+            count = control + 1
+            written += count
+            offset += 1 + count
+        pos += count
+    return tokens, len(encoded), written
+
+
+def print_codec_report(packed_frames, encoded_frames):
+    """Prints the compression ratio and the worst case per frame decode cost."""
+    if not packed_frames:
+        return
+    frame_size = len(packed_frames[0])
+    raw_total = sum(len(f) for f in packed_frames)
+    encoded_total = sum(len(f) for f in encoded_frames)
+    type_counts = [0, 0, 0]
+    for encoded in encoded_frames:
+        type_counts[encoded[0]] += 1
+
+    costs = [decode_cost(encoded, frame_size) for encoded in encoded_frames]
+    worst_index = max(range(len(costs)), key=lambda i: (costs[i][2], costs[i][0]))
+    tokens, read_bytes, written = costs[worst_index]
+
+    print(f"\nFrame codec: {raw_total} -> {encoded_total} bytes "
+          f"(ratio {raw_total / max(encoded_total, 1):.2f}:1)")
+    print(f"  Frame types: {type_counts[FRAME_RAW]} raw, {type_counts[FRAME_RLE]} RLE, "
+          f"{type_counts[FRAME_XOR]} XOR delta")
+    print(f"  Worst case decode: frame {worst_index} "
+          f"({tokens} runs, {read_bytes} bytes read, {written} bytes written)")
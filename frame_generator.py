@@ -1,85 +1,355 @@
 from PIL import Image
+import numpy as np
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def convert_image_to_c_array_mono(image_path, output_folder, target_width, target_height, invert=False):
+import instrumentation
+from dithering import DITHER_PILLOW, TEMPORAL_DITHER_MODES, dither_stack
+
+# Frame layouts
+LAYOUT_HORIZONTAL = "horizontal" # Rows of 8 pixel wide bytes, MSB first (Adafruit drawBitmap)
+LAYOUT_PAGES = "pages"           # SSD1306 native: 8 pixel tall column bytes per page, LSB on top
+FRAME_LAYOUTS = (LAYOUT_HORIZONTAL, LAYOUT_PAGES)
+
+def pack_mono_pixels(pixels, invert=False, layout=LAYOUT_HORIZONTAL):
     """
-    Converts a single image file into a C-style 1-bit monochrome byte array.
-    
+    Packs a whole monochrome frame, or a stack of frames, into bytes in one go.
+
+    In the horizontal layout pixels are packed row by row (MSB first), 8
+    pixels per byte. In the pages layout every byte is one column of 8 rows
+    (LSB is the top row), pages top to bottom, exactly like the SSD1306
+    display buffer, so a frame can be copied into it with memcpy_P. Rows
+    that do not fill the last page are left off. Every column is kept, so a
+    frame is exactly width * pages bytes like the display buffer. In the
+    horizontal layout, like the original per-pixel loop, trailing columns
+    that do not fill a whole byte are dropped.
+
     Args:
-        image_path (str): Path to the input image file.
-        output_folder (str): Directory where the .h file will be saved.
+        pixels (numpy.ndarray): Array of shape (height, width) or
+            (frames, height, width). Any non-zero value is an 'on' pixel.
+        invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        layout (str): LAYOUT_HORIZONTAL or LAYOUT_PAGES.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (..., height, width // 8) for the
+        horizontal layout or (..., pages, width) for the pages layout.
+    """
+    pixels = np.asarray(pixels)
+    width = pixels.shape[-1]
+    if layout == LAYOUT_HORIZONTAL:
+        width -= width % 8
+    is_on = pixels[..., :width] != 0
+    if invert:
+        is_on = ~is_on # Flip if inversion is requested
+
+    if layout == LAYOUT_HORIZONTAL:
+        return np.packbits(is_on, axis=-1)
+    if layout == LAYOUT_PAGES:
+        height = is_on.shape[-2]
+        pad = [(0, 0)] * is_on.ndim
+        pad[-2] = (0, -height % 8)
+        is_on = np.pad(is_on, pad)
+        pages = is_on.reshape(is_on.shape[:-2] + (is_on.shape[-2] // 8, 8, width))
+        return np.packbits(pages, axis=-2, bitorder="little").squeeze(-2)
+    raise ValueError(f"Unknown frame layout '{layout}'")
+
+def packed_frame_width(width, layout=LAYOUT_HORIZONTAL):
+    """Width of a frame packed by pack_mono_pixels(): the horizontal layout drops columns that do not fill a byte."""
+    return width if layout == LAYOUT_PAGES else width - width % 8
+
+def packed_frame_bytes(width, height, layout=LAYOUT_HORIZONTAL):
+    """Size of one frame packed by pack_mono_pixels()."""
+    if layout == LAYOUT_PAGES:
+        return width * ((height + 7) // 8)
+    return width // 8 * height
+
+def unpack_mono_pixels(frame_bytes, width, height, layout=LAYOUT_HORIZONTAL):
+    """
+    Unpacks one packed frame back into a bool array of (height, width) for
+    the pages layout or (height, width // 8 * 8) for the horizontal layout.
+    The inverse of pack_mono_pixels() for a single frame.
+    """
+    packed = np.frombuffer(frame_bytes, dtype=np.uint8)
+    if layout == LAYOUT_HORIZONTAL:
+        width -= width % 8
+        pixels = np.unpackbits(packed.reshape(height, width // 8), axis=-1)
+    elif layout == LAYOUT_PAGES:
+        pages = packed.reshape((height + 7) // 8, 1, width)
+        pixels = np.unpackbits(pages, axis=-2, bitorder="little").reshape(-1, width)[:height]
+    else:
+        raise ValueError(f"Unknown frame layout '{layout}'")
+    return pixels.astype(bool)
+
+def convert_frame_layout(frame_bytes, width, height, from_layout, to_layout):
+    """Repacks one packed frame from one layout into another. Returns bytes."""
+    pixels = unpack_mono_pixels(frame_bytes, width, height, from_layout)
+    # Horizontal frames lack the columns after the last whole byte, they convert as off pixels
+    pixels = np.pad(pixels, [(0, 0), (0, width - pixels.shape[1])])
+    return pack_mono_pixels(pixels, layout=to_layout).tobytes()
+
+def image_to_mono_bytes(img, target_width, target_height, invert=False, layout=LAYOUT_HORIZONTAL, frame=None,
+                        dither=DITHER_PILLOW):
+    """
+    Resizes an in-memory image and packs it into 1-bit monochrome bytes.
+    Temporal dither modes need the whole animation (see images_to_mono_frames()),
+    for a single frame they dither it on its own.
+
+    Args:
+        img (PIL.Image.Image): Source image (any mode).
         target_width (int): Desired width to resize the image to.
         target_height (int): Desired height to resize the image to.
         invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        layout (str): LAYOUT_HORIZONTAL (drawBitmap) or LAYOUT_PAGES (SSD1306 buffer).
+        frame: Frame name or number the resize and pack timings are recorded under.
+        dither (str): Dithering mode, see dithering.DITHER_MODES.
+
+    Returns:
+        bytes: The packed frame in the requested layout.
     """
-    
-    try:
-        img = Image.open(image_path)
-    except IOError:
-        print(f"  Error: Cannot open image file {image_path}. Skipping.")
-        return
+    metrics = instrumentation.current()
 
     # Resize to target dimensions
-    img = img.resize((target_width, target_height), Image.LANCZOS)
-    
-    # Convert to 1-bit black and white
-    # Pillow's '1' mode converts to 1-bit pixels (0=black, 255=white)
-    img = img.convert('1')
-    
+    with metrics.measure("resize", frame):
+        img = img.resize((target_width, target_height), Image.LANCZOS)
+
+    with metrics.measure("pack", frame) as record:
+        if dither == DITHER_PILLOW:
+            # Convert to 1-bit black and white
+            # Pillow's '1' mode converts to 1-bit pixels (0=black, 255=white)
+            pixels = np.asarray(img.convert('1'))
+        else:
+            pixels = dither_stack(np.asarray(img.convert('L'))[None], dither)[0]
+        frame_bytes = pack_mono_pixels(pixels, invert, layout).tobytes()
+        record["bytes_out"] = len(frame_bytes)
+    return frame_bytes
+
+def reduce_image(img, target_width, target_height, dither=DITHER_PILLOW, frame=None):
+    """
+    Resizes an image to the frame size and reduces it to what the dither
+    step works on: Pillow's '1' pixels for DITHER_PILLOW, gray levels for the
+    other modes. The resize is timed under frame.
+
+    Returns:
+        numpy.ndarray: (target_height, target_width) bool or uint8 array.
+    """
+    with instrumentation.current().measure("resize", frame):
+        img = img.resize((target_width, target_height), Image.LANCZOS)
+        return np.asarray(img.convert('1' if dither == DITHER_PILLOW else 'L'))
+
+def dither_frame_stack(frames, dither=DITHER_PILLOW):
+    """
+    Dithers frames made by reduce_image() together as one stack.
+
+    Returns:
+        numpy.ndarray: bool array of shape (frames, height, width), True for white pixels.
+    """
+    with instrumentation.current().measure("dither", None, sum(frame.size for frame in frames)):
+        stack = np.stack(frames)
+        return stack if dither == DITHER_PILLOW else dither_stack(stack, dither)
+
+def frame_stack_to_mono_frames(frames, invert=False, layout=LAYOUT_HORIZONTAL, dither=DITHER_PILLOW):
+    """Dithers and packs frames made by reduce_image(). Returns one packed frame (bytes) per frame."""
+    if not frames:
+        return []
+    bits = dither_frame_stack(frames, dither)
+    with instrumentation.current().measure("pack") as record:
+        packed_frames = [frame.tobytes() for frame in pack_mono_pixels(bits, invert, layout)]
+        record["bytes_out"] = sum(len(frame_bytes) for frame_bytes in packed_frames)
+    return packed_frames
+
+def images_to_bit_stack(images, target_width, target_height, dither=DITHER_PILLOW):
+    """
+    Resizes a sequence of images and dithers them together as one stack.
+
+    Every image is reduced to a small grayscale frame as soon as it arrives,
+    so images can be a generator over a GIF's reused canvas.
+
+    Returns:
+        numpy.ndarray: bool array of shape (frames, target_height, target_width), True for white pixels.
+    """
+    frames = [reduce_image(img, target_width, target_height, dither, frame_number)
+              for frame_number, img in enumerate(images)]
+    if not frames:
+        return np.zeros((0, target_height, target_width), dtype=bool)
+    return dither_frame_stack(frames, dither)
+
+def images_to_mono_frames(images, target_width, target_height, invert=False, layout=LAYOUT_HORIZONTAL,
+                          dither=DITHER_PILLOW):
+    """
+    Converts a whole animation at once: resize, dither the frame stack, pack.
+
+    Args:
+        images (iterable[PIL.Image.Image]): Frames in playback order (any mode).
+        target_width (int): Desired width to resize the images to.
+        target_height (int): Desired height to resize the images to.
+        invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        layout (str): LAYOUT_HORIZONTAL (drawBitmap) or LAYOUT_PAGES (SSD1306 buffer).
+        dither (str): Dithering mode, see dithering.DITHER_MODES.
+
+    Returns:
+        list[bytes]: One packed frame per image.
+    """
+    frames = [reduce_image(img, target_width, target_height, dither, frame_number)
+              for frame_number, img in enumerate(images)]
+    return frame_stack_to_mono_frames(frames, invert, layout, dither)
+
+def write_c_array_header(image_path, output_folder, byte_array, target_width, target_height, invert=False,
+                         layout=LAYOUT_HORIZONTAL, duration=None):
+    """
+    Writes a packed frame to '<output_folder>/<image base name>.h' as a C array.
+    A known frame duration (ms) is recorded in a comment for code_generator.py.
+    Returns True if the header was written.
+    """
     # Extract base name for array and file naming
     base_name = os.path.splitext(os.path.basename(image_path))[0]
     # Sanitize for C variable name (replace non-alphanumeric with underscore)
     array_name = ''.join(c if c.isalnum() else '_' for c in base_name) + "_map"
-    
-    # Pack 8 pixels into one byte, row by row (horizontal packing, MSB first)
-    byte_array = bytearray()
-    for y in range(target_height):
-        for x_byte in range(target_width // 8):
-            current_byte = 0
-            for x_bit in range(8):
-                x = x_byte * 8 + x_bit
-                pixel = img.getpixel((x, y)) # 0 for black, 255 for white
-                
-                is_on = (pixel > 0) # True if white (or > 0), False if black (0)
-                if invert:
-                    is_on = not is_on # Flip if inversion is requested
-                    
-                if is_on:
-                    # Set the bit (MSB first for Digole-style display drivers)
-                    current_byte |= (1 << (7 - x_bit))
-            
-            byte_array.append(current_byte)
-                
-    # --- Write to output file ---
+
     output_filename = os.path.join(output_folder, f"{base_name}.h")
+    metrics = instrumentation.current()
     try:
-        with open(output_filename, 'w') as f:
-            f.write(f"// Generated from: {os.path.basename(image_path)}\n")
-            f.write(f"// Format: 1-bit Monochrome, Size: {target_width}x{target_height}\n")
-            if invert:
-                f.write(f"// Inverted: Yes (white pixels become 0, black become 1)\n")
-            else:
-                f.write(f"// Inverted: No (white pixels become 1, black become 0)\n")
-            f.write(f"const unsigned char {array_name}[] = {{\n    ")
+        with metrics.measure("write", os.path.basename(image_path), len(byte_array)) as record:
+            with open(output_filename, 'w') as f:
+                f.write(f"// Generated from: {os.path.basename(image_path)}\n")
+                f.write(f"// Format: 1-bit Monochrome, Size: {target_width}x{target_height}\n")
+                if invert:
+                    f.write(f"// Inverted: Yes (white pixels become 0, black become 1)\n")
+                else:
+                    f.write(f"// Inverted: No (white pixels become 1, black become 0)\n")
+                if layout == LAYOUT_PAGES:
+                    f.write(f"// Layout: SSD1306 pages (column bytes, LSB on top)\n")
+                if duration:
+                    f.write(f"// Duration: {duration} ms\n")
+                f.write(f"const unsigned char {array_name}[] = {{\n    ")
             
-            for i, byte in enumerate(byte_array):
-                f.write(f"0x{byte:02X}, ")
-                if (i + 1) % 16 == 0: # 16 bytes per line for readability
-                    f.write("\n    ")
+                for i, byte in enumerate(byte_array):
+                    f.write(f"0x{byte:02X}, ")
+                    if (i + 1) % 16 == 0: # 16 bytes per line for readability
+                        f.write("\n    ")
             
-            f.write("\n};")
-            f.write(f"\n// Array size: {len(byte_array)} bytes\n")
-        
-        print(f"  Successfully converted '{os.path.basename(image_path)}' to '{base_name}.h'")
+                f.write("\n};")
+                f.write(f"\n// Array size: {len(byte_array)} bytes\n")
+            record["bytes_out"] = os.path.getsize(output_filename)
+        return True
 
     except IOError:
-        print(f"  Error: Cannot write to output file {output_filename}. Skipping.")
+        # Already recorded by measure()
+        metrics.print_error(f"Cannot write to output file {output_filename}. Skipping.")
+        return False
+
+def convert_image_to_c_array_mono(image_path, output_folder, target_width, target_height, invert=False,
+                                  layout=LAYOUT_HORIZONTAL, dither=DITHER_PILLOW):
+    """
+    Converts a single image file into a C-style 1-bit monochrome byte array.
+    
+    Args:
+        image_path (str): Path to the input image file.
+        output_folder (str): Directory where the .h file will be saved.
+        target_width (int): Desired width to resize the image to.
+        target_height (int): Desired height to resize the image to.
+        invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        layout (str): LAYOUT_HORIZONTAL (drawBitmap) or LAYOUT_PAGES (SSD1306 buffer).
+        dither (str): Dithering mode, see image_to_mono_bytes().
 
-def batch_convert_images_to_c_array(input_folder, output_folder, target_width, target_height, invert=False):
+    Returns:
+        bool: True if the header was written.
+    """
+    metrics = instrumentation.current()
+    frame_name = os.path.basename(image_path)
+    try:
+        with metrics.measure("decode", frame_name) as record:
+            record["bytes_in"] = os.path.getsize(image_path)
+            img = Image.open(image_path)
+            img.load()
+    except IOError:
+        # Already recorded by measure()
+        metrics.print_error(f"Cannot open image file {image_path}. Skipping.")
+        return False
+
+    byte_array = image_to_mono_bytes(img, target_width, target_height, invert, layout, frame_name, dither)
+    duration = img.info.get("duration")
+
+    # --- Write to output file ---
+    return write_c_array_header(image_path, output_folder, byte_array, target_width, target_height, invert, layout,
+                                duration)
+
+def _pack_image_file(job):
+    """
+    Process pool worker: opens and packs one image file.
+    Returns (packed bytes, duration, None, records) on success or (None, None,
+    error message, records) on failure, so one bad frame never takes down the
+    rest of the batch. records are the worker's timing records, to be replayed
+    into the main process's instrumentation.
+    """
+    image_path, target_width, target_height, invert, layout, dither = job
+    records = instrumentation.RecordList()
+    worker_metrics = instrumentation.Instrumentation(instrumentation.MODE_QUIET)
+    worker_metrics.add_collector(records)
+    previous = instrumentation.install(worker_metrics)
+    frame_name = os.path.basename(image_path)
+    try:
+        with worker_metrics.measure("decode", frame_name) as record:
+            record["bytes_in"] = os.path.getsize(image_path)
+            img = Image.open(image_path)
+            img.load()
+        with img:
+            byte_array = image_to_mono_bytes(img, target_width, target_height, invert, layout, frame_name, dither)
+            return byte_array, img.info.get("duration"), None, records
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}", records
+    finally:
+        instrumentation.install(previous)
+
+def _convert_image_stack(input_folder, image_filenames, output_folder, target_width, target_height, invert,
+                         layout, dither):
+    """
+    Converts all images as one frame stack, for dither modes that look at
+    neighbouring frames. Images that cannot be opened are left out of the
+    stack. Returns the number of headers written.
+    """
+    metrics = instrumentation.current()
+    image_paths = []
+    durations = []
+
+    def decoded_images():
+        for filename in image_filenames:
+            image_path = os.path.join(input_folder, filename)
+            try:
+                with metrics.measure("decode", filename) as record:
+                    record["bytes_in"] = os.path.getsize(image_path)
+                    img = Image.open(image_path)
+                    img.load()
+            except IOError:
+                # Already recorded by measure()
+                metrics.print_error(f"Cannot open image file {image_path}. Skipping.")
+                continue
+            with img:
+                image_paths.append(image_path)
+                durations.append(img.info.get("duration"))
+                yield img
+
+    packed_frames = images_to_mono_frames(decoded_images(), target_width, target_height, invert, layout, dither)
+    written = 0
+    for image_path, byte_array, duration in zip(image_paths, packed_frames, durations):
+        written += write_c_array_header(image_path, output_folder, byte_array, target_width, target_height, invert,
+                                        layout, duration)
+    return written
+
+def batch_convert_images_to_c_array(input_folder, output_folder, target_width, target_height, invert=False, workers=1,
+                                    layout=LAYOUT_HORIZONTAL, dither=DITHER_PILLOW):
     """
     Processes all image files in an input folder, converting them to C-style
     monochrome byte arrays and saving them to an output folder.
+
+    With workers other than 1, resizing and packing run in a process pool
+    (workers=None uses every core). Headers are still written by this
+    process in sorted filename order, and a failed frame is reported in the
+    final error summary instead of aborting the batch.
+
+    Temporal dither modes (dithering.TEMPORAL_DITHER_MODES) need every frame
+    at once, so the images are then converted as one stack in this process,
+    in sorted filename order.
     """
     
     if not os.path.exists(input_folder):
@@ -93,25 +363,63 @@ def batch_convert_images_to_c_array(input_folder, output_folder, target_width, t
     print(f"\nStarting batch conversion from '{input_folder}' to '{output_folder}'...")
     print(f"Target dimensions: {target_width}x{target_height} (Monochrome)")
     print(f"Pixel Inversion: {'Enabled' if invert else 'Disabled'}")
+    print(f"Frame Layout: {layout}")
+    print(f"Dithering: {dither}")
     print("-" * 50)
 
-    processed_count = 0
-    supported_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif') # Add more if needed
+    metrics = instrumentation.current()
+    with metrics.stage("convert"):
+        processed_count = 0
+        supported_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif') # Add more if needed
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith(supported_extensions):
-            image_path = os.path.join(input_folder, filename)
-            print(f"Processing: {filename}")
-            convert_image_to_c_array_mono(image_path, output_folder, target_width, target_height, invert)
-            processed_count += 1
+        image_filenames = []
+        for filename in sorted(os.listdir(input_folder)):
+            if filename.lower().endswith(supported_extensions):
+                image_filenames.append(filename)
+            else:
+                print(f"Skipping non-image file: {filename}")
+
+        if dither in TEMPORAL_DITHER_MODES:
+            print(f"Dithering {len(image_filenames)} image(s) as one frame stack")
+            _convert_image_stack(input_folder, image_filenames, output_folder, target_width, target_height, invert,
+                                 layout, dither)
+            processed_count = len(image_filenames)
+        elif workers == 1:
+            for filename in image_filenames:
+                image_path = os.path.join(input_folder, filename)
+                convert_image_to_c_array_mono(image_path, output_folder, target_width, target_height, invert, layout,
+                                              dither)
+                processed_count += 1
         else:
-            print(f"Skipping non-image file: {filename}")
+            jobs = [
+                (os.path.join(input_folder, filename), target_width, target_height, invert, layout, dither)
+                for filename in image_filenames
+            ]
+            errors = []
+            print(f"Converting {len(jobs)} image(s) with {workers or os.cpu_count()} worker process(es)")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # map() yields results in submission order, so headers are written in frame order
+                for filename, job, (byte_array, duration, error, records) in zip(image_filenames, jobs, executor.map(_pack_image_file, jobs, chunksize=8)):
+                    metrics.replay(records)
+                    if error is not None:
+                        metrics.print_error(f"{filename}: {error}. Skipping.")
+                    elif not write_c_array_header(job[0], output_folder, byte_array, target_width, target_height, invert, layout, duration):
+                        error = "could not write output header"
+                    if error is not None:
+                        errors.append((filename, error))
+                    processed_count += 1
 
-    print("-" * 50)
-    if processed_count == 0:
-        print("No supported image files found in the input folder.")
-    else:
-        print(f"Batch conversion complete. Processed {processed_count} image(s).")
+            if errors:
+                print("-" * 50)
+                print(f"{len(errors)} of {processed_count} frame(s) failed:")
+                for filename, error in errors:
+                    print(f"  {filename}: {error}")
+
+        print("-" * 50)
+        if processed_count == 0:
+            print("No supported image files found in the input folder.")
+        else:
+            print(f"Batch conversion complete. Processed {processed_count} image(s).")
 
 # --- --- --- --- --- --- --- --- --- ---
 # --- HOW TO USE ---
@@ -130,11 +438,28 @@ if __name__ == "__main__":
     # Standard is False (1 for 'on', 0 for 'off').
     INVERT_PIXELS = False 
 
+    # Number of worker processes for resizing and packing.
+    # 1 converts frames one at a time, None uses every CPU core.
+    WORKERS = None
+
+    # LAYOUT_HORIZONTAL draws frames with drawBitmap(). LAYOUT_PAGES stores them
+    # in the SSD1306's native page order so they can be copied straight into
+    # the display buffer (set FRAME_LAYOUT in code_generator.py to match).
+    FRAME_LAYOUT = LAYOUT_HORIZONTAL
+
+    # One of dithering.DITHER_MODES. DITHER_PILLOW dithers every frame on its own, which
+    # makes static areas flicker; "diffusion" keeps unchanged pixels stable
+    # from frame to frame (see dithering.py).
+    DITHER_MODE = DITHER_PILLOW
+
     # Run the batch conversion
     batch_convert_images_to_c_array(
         INPUT_IMAGE_FOLDER, 
         OUTPUT_C_HEADER_FOLDER, 
         TARGET_WIDTH, 
         TARGET_HEIGHT,
-        INVERT_PIXELS
+        INVERT_PIXELS,
+        WORKERS,
+        FRAME_LAYOUT,
+        DITHER_MODE
     )
\ No newline at end of file
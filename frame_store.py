@@ -0,0 +1,271 @@
+"""
+Memory-mapped store for the packed frames of long animations.
+
+Instead of one GIF file per frame in input_images/ and one header per frame
+in output_headers/, image_splitter.py can append every frame, already packed,
+to a single store file, and code_generator.py reads the frames straight from
+it. All values are little endian:
+
+    header      32 bytes
+        magic           4 bytes  b"FSTO"
+        version         u16      STORE_VERSION
+        width           u16      frame width in pixels
+        height          u16      frame height in pixels
+        layout          u8       0 = horizontal (drawBitmap), 1 = SSD1306 pages
+        flags           u8       bit 0: pixels inverted
+        frame bytes     u16      size of every packed frame
+        record bytes    u32      size of one frame record (the stride)
+        frame count     u32      records written so far
+        reserved        10 bytes
+    records     one per frame, all record bytes long
+        duration        u16      display time in ms (0 = use frame_delay)
+        reserved        2 bytes
+        source hash     20 bytes sha1 of the composited source frame
+        frame data      frame bytes
+
+Every record has the same size, so frame N is at a fixed offset and is read
+without a table or a scan. The file is only ever appended to: a record is
+written first and the frame count in the header is updated after it, so an
+interrupted split leaves a store that is valid up to the last whole frame.
+Frames are returned as memoryviews of the mapped file, so reading a frame
+copies nothing and memory use does not depend on the number of frames.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+
+import numpy as np
+
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES, image_to_mono_bytes, packed_frame_bytes
+
+# --- Configuration ---
+STORE_FILE_NAME = "frames.fstore"   # Default store file name
+# --- End Configuration ---
+
+STORE_MAGIC = b"FSTO"
+STORE_VERSION = 1
+HEADER_FORMAT = "<4sHHHBBHII10x"
+HEADER_BYTES = struct.calcsize(HEADER_FORMAT)
+RECORD_FORMAT = "<H2x20s"
+RECORD_META_BYTES = struct.calcsize(RECORD_FORMAT)
+COUNT_OFFSET = struct.calcsize("<4sHHHBBHI")   # Position of the frame count inside the header
+LAYOUT_CODES = {LAYOUT_HORIZONTAL: 0, LAYOUT_PAGES: 1}
+FLAG_INVERT = 0x01
+
+
+class FrameStore(Sequence):
+    """
+    A frame store file, opened for reading or for appending.
+
+        with FrameStore.create("frames.fstore", 128, 64) as store:
+            store.append(frame_bytes, duration=100)
+
+        with FrameStore("frames.fstore") as store:
+            frame_bytes = store[10]     # memoryview into the mapped file
+
+    Frames handed out keep the mapping alive: close() unmaps the file once
+    no frame views are left.
+    """
+
+    def __init__(self, store_path, writable=False):
+        self.store_path = store_path
+        self.writable = writable
+        self.file = open(store_path, "r+b" if writable else "rb")
+        self._mmap = None
+        header = self.file.read(HEADER_BYTES)
+        try:
+            if len(header) != HEADER_BYTES:
+                raise ValueError(f"'{store_path}' is too short to be a frame store")
+            (magic, version, self.width, self.height, layout_code, self.flags,
+             self.frame_bytes, self.record_bytes, self.frame_count) = struct.unpack(HEADER_FORMAT, header)
+            if magic != STORE_MAGIC or version != STORE_VERSION:
+                raise ValueError(f"'{store_path}' is not a version {STORE_VERSION} frame store")
+            layouts = {code: layout for layout, code in LAYOUT_CODES.items()}
+            if layout_code not in layouts or self.record_bytes != RECORD_META_BYTES + self.frame_bytes:
+                raise ValueError(f"'{store_path}' has an invalid header")
+            self.layout = layouts[layout_code]
+            whole_records = (os.fstat(self.file.fileno()).st_size - HEADER_BYTES) // self.record_bytes
+            if whole_records < self.frame_count:
+                raise ValueError(f"'{store_path}' is truncated: {self.frame_count} frames in the header, "
+                                 f"{whole_records} in the file")
+        except ValueError:
+            self.file.close()
+            raise
+
+        if writable:
+            # Drop anything after the last counted record (an interrupted append)
+            self.file.truncate(self._record_offset(self.frame_count))
+
+    @classmethod
+    def create(cls, store_path, width, height, layout=LAYOUT_HORIZONTAL, invert=False):
+        """Creates an empty store (replacing any file at store_path) and opens it for appending."""
+        frame_bytes = packed_frame_bytes(width, height, layout)
+        store_dir = os.path.dirname(store_path)
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+        with open(store_path, "wb") as f:
+            f.write(struct.pack(HEADER_FORMAT, STORE_MAGIC, STORE_VERSION, width, height, LAYOUT_CODES[layout],
+                                FLAG_INVERT if invert else 0, frame_bytes, RECORD_META_BYTES + frame_bytes, 0))
+        return cls(store_path, writable=True)
+
+    @property
+    def invert(self):
+        return bool(self.flags & FLAG_INVERT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.frame_count
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass # Frame views are still in use, the mapping goes away with the last of them
+            self._mmap = None
+        self.file.close()
+
+    def _record_offset(self, index):
+        return HEADER_BYTES + index * self.record_bytes
+
+    def _mapping(self):
+        """Maps the file, again if frames were appended since it was last mapped."""
+        mapped_size = self._record_offset(self.frame_count)
+        if self._mmap is None or len(self._mmap) < mapped_size:
+            if self.writable:
+                self.file.flush()
+            # The old mapping, if any, is released once no frame views use it
+            self._mmap = mmap.mmap(self.file.fileno(), mapped_size, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _check_index(self, index):
+        if index < 0:
+            index += self.frame_count
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range (0-{self.frame_count - 1})")
+        return index
+
+    def append(self, frame_bytes, duration=0, source_hash=None):
+        """
+        Appends one packed frame. Returns its index.
+
+        Args:
+            frame_bytes (bytes): The packed frame, frame_bytes long.
+            duration (int): Display time in ms, 0 or None if unknown.
+            source_hash (str): sha1 hex digest of the source frame, or None.
+        """
+        if not self.writable:
+            raise IOError(f"'{self.store_path}' is open for reading only")
+        if len(frame_bytes) != self.frame_bytes:
+            raise ValueError(f"Frame is {len(frame_bytes)} bytes, the store holds {self.frame_bytes} byte frames")
+        source_digest = bytes.fromhex(source_hash) if source_hash else bytes(20)
+        self.file.seek(self._record_offset(self.frame_count))
+        self.file.write(struct.pack(RECORD_FORMAT, min(int(duration or 0), 0xFFFF), source_digest))
+        self.file.write(frame_bytes)
+        self.frame_count += 1
+        self.file.seek(COUNT_OFFSET)
+        self.file.write(struct.pack("<I", self.frame_count))
+        return self.frame_count - 1
+
+    def append_image(self, img, duration=None, source_hash=None):
+        """
+        Packs an in-memory image at the store's size, layout and inversion and appends it.
+        Without a source_hash, the image's own contents are hashed. Returns the frame index.
+        """
+        if source_hash is None:
+            digest = hashlib.sha1(f"{img.mode}{img.size}".encode("utf-8"))
+            digest.update(img.tobytes())
+            source_hash = digest.hexdigest()
+        frame_bytes = image_to_mono_bytes(img, self.width, self.height, self.invert, self.layout, self.frame_count)
+        return self.append(frame_bytes, duration, source_hash)
+
+    def __getitem__(self, index):
+        """Returns frame index as a read-only memoryview into the mapped file."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.frame_count))]
+        start = self._record_offset(self._check_index(index)) + RECORD_META_BYTES
+        return memoryview(self._mapping())[start:start + self.frame_bytes]
+
+    def __iter__(self):
+        for index in range(self.frame_count):
+            yield self[index]
+
+    def as_array(self):
+        """All frames as one (frames, frame bytes) uint8 array viewing the mapped file."""
+        if not self.frame_count:
+            return np.zeros((0, self.frame_bytes), dtype=np.uint8)
+        return np.ndarray((self.frame_count, self.frame_bytes), dtype=np.uint8, buffer=self._mapping(),
+                          offset=HEADER_BYTES + RECORD_META_BYTES, strides=(self.record_bytes, 1))
+
+    @property
+    def durations(self):
+        """Every frame's duration in ms (0 = unknown), as a uint16 array viewing the mapped file."""
+        if not self.frame_count:
+            return np.zeros(0, dtype="<u2")
+        return np.ndarray((self.frame_count,), dtype="<u2", buffer=self._mapping(), offset=HEADER_BYTES,
+                          strides=(self.record_bytes,))
+
+    def duration(self, index):
+        """Display time of a frame in ms (0 means unknown)."""
+        return int(self.durations[self._check_index(index)])
+
+    def source_hash(self, index):
+        """sha1 hex digest of the frame's source, or None if it was not recorded."""
+        start = self._record_offset(self._check_index(index)) + 4
+        digest = self._mapping()[start:start + 20]
+        return digest.hex() if any(digest) else None
+
+    @property
+    def source_names(self):
+        """A sequence naming every frame for the sketch comments, formatted only when asked for."""
+        return _SourceNames(self)
+
+
+class _SourceNames(Sequence):
+    """Names the frames of a store ('frames.fstore frame 12') without building a list of them."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self.store._check_index(index)
+        return f"{os.path.basename(self.store.store_path)} frame {index}"
+
+
+def print_store_info(store_path):
+    """Prints a store's header and a summary of its frames. Returns True if it could be read."""
+    try:
+        with FrameStore(store_path) as store:
+            durations = store.durations
+            known = durations[durations > 0]
+            unique = len({hashlib.sha1(frame).digest() for frame in store})
+            print(f"{store_path}: {store.width}x{store.height} {store.layout}"
+                  f"{' inverted' if store.invert else ''}, {len(store)} frames ({unique} distinct, "
+                  f"{store.frame_bytes} bytes each), {os.path.getsize(store_path)} bytes")
+            if known.size:
+                print(f"  Durations: {known.min()}-{known.max()} ms")
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: python3 {os.path.basename(__file__)} <store file> [...]")
+        sys.exit(1)
+    results = [print_store_info(path) for path in sys.argv[1:]]
+    sys.exit(0 if all(results) else 1)
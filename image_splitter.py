@@ -1,7 +1,77 @@
 import os
-from PIL import Image, ImageSequence
+import time
+from PIL import Image, ImageDraw, ImageSequence
 
-def split_gif_frames(gif_path, output_folder):
+import instrumentation
+from frame_generator import LAYOUT_HORIZONTAL
+from frame_store import FrameStore
+
+def iter_gif_frames(gif_path):
+    """
+    Yields the fully composited frames of a GIF file one at a time, without
+    writing anything to disk.
+
+    The same RGBA canvas object is reused between frames, so callers that need
+    to keep a frame around must copy it before advancing the iterator. Each
+    frame's display time in milliseconds is kept in canvas.info['duration'].
+
+    Args:
+        gif_path (str): Path to the input GIF file.
+
+    Yields:
+        PIL.Image.Image: The composited frame (RGBA, full GIF size).
+    """
+    metrics = instrumentation.current()
+    with Image.open(gif_path) as im:
+        # Non-animated files are handled as a single frame
+        if not getattr(im, "is_animated", False):
+            with metrics.measure("decode", 0):
+                single_frame = im.convert("RGBA")
+            single_frame.info["duration"] = im.info.get("duration", 0)
+            yield single_frame
+            return
+
+        # Create a base frame (canvas). Use RGBA for transparency handling.
+        canvas = Image.new("RGBA", im.size)
+
+        # 0=No disposal, 1=Do not dispose, 2=Restore background, 3=Restore previous
+        start = time.perf_counter()
+        for frame_index, frame in enumerate(ImageSequence.Iterator(im)):
+            # Only the frame's update rectangle is converted and pasted
+            bbox = getattr(frame, "dispose_extent", None) or (0, 0) + im.size
+
+            # Get disposal method for the *current* frame (to apply *after* showing it)
+            # (Pillow exposes it as an attribute, it is not part of frame.info)
+            disposal_method = getattr(frame, "disposal_method", frame.info.get('disposal', 0))
+
+            # Restore previous needs the region as it was before this frame drew on it.
+            # The first frame has nothing to restore, so like Pillow's decoder it is kept.
+            if disposal_method == 3 and frame_index == 0:
+                disposal_method = 1
+            snapshot = canvas.crop(bbox) if disposal_method == 3 else None
+
+            # --- Paste Current Frame ---
+            frame_rgba = frame.crop(bbox).convert("RGBA")
+            # Paste the region onto the canvas using its alpha channel as a mask
+            canvas.paste(frame_rgba, bbox[:2], frame_rgba)
+
+            # Saved along with the frame and used for per-frame playback timing
+            canvas.info["duration"] = frame.info.get("duration", 0)
+            # Decoding and compositing time, bytes out is the RGBA region that was updated
+            metrics.record("decode", time.perf_counter() - start, frame_index,
+                           bytes_out=4 * (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]))
+            yield canvas
+            start = time.perf_counter()
+
+            # --- Dispose of the frame before the next one is drawn ---
+            if disposal_method == 2: # Restore background, only inside this frame's region
+                canvas.paste((0, 0, 0, 0), bbox)
+            elif disposal_method == 3: # Restore previous
+                canvas.paste(snapshot, bbox[:2])
+            # For methods 0 and 1 the canvas is kept as is
+
+
+def split_gif_frames(gif_path, output_folder, frame_store=None):
     """
     Splits frames from a GIF file, handling potential optimizations by
     compositing frames, and saves them as individual GIF files.
@@ -9,83 +79,45 @@ def split_gif_frames(gif_path, output_folder):
     Args:
         gif_path (str): Path to the input GIF file.
         output_folder (str): Path to the folder where frames will be saved.
+        frame_store (FrameStore): Optional frame store opened for appending
+            (see frame_store.py). Every frame is then packed at the store's
+            size and layout and appended to it instead of being saved as a
+            GIF file, and output_folder is not used.
     """
-    try:
-        # Create the output folder if it doesn't exist
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-            print(f"Created output folder: {output_folder}")
-
-        # Open the GIF file
-        with Image.open(gif_path) as im:
-            print(f"Opened GIF: {gif_path} (Mode: {im.mode})")
-
-            # Check if the GIF is animated
-            if not getattr(im, "is_animated", False):
-                 print("Warning: Input file is not an animated GIF. Saving only the first frame.")
-                 frame_filename = os.path.join(output_folder, "frame_000.gif")
-                 im.save(frame_filename, "GIF")
-                 print(f"Saved single frame to {output_folder}")
-                 return
+    metrics = instrumentation.current()
+    with metrics.stage("split"):
+        try:
+            # Create the output folder if it doesn't exist
+            if frame_store is None and not os.path.exists(output_folder):
+                os.makedirs(output_folder)
+                print(f"Created output folder: {output_folder}")
+
+            print(f"Opened GIF: {gif_path}")
 
             frame_index = 0
-            # Create a base frame (canvas). Use RGBA for transparency handling.
-            # Use the first frame's size and mode initially, but convert to RGBA
-            canvas = Image.new("RGBA", im.size)
-            # Paste the first frame onto the canvas
-            first_frame = im.copy().convert("RGBA")
-            canvas.paste(first_frame, (0,0), first_frame) # Use alpha mask for transparency
-            
-            # Save the first frame
-            frame_filename = os.path.join(output_folder, f"frame_{frame_index:03d}.gif")
-            # Save canvas (which now holds the first full frame)
-            canvas.save(frame_filename, "GIF")
-            frame_index += 1
-
-            # Store the disposal method of the *previous* frame
-            # 0=No disposal, 1=Do not dispose, 2=Restore background, 3=Restore previous
-            last_disposal_method = first_frame.info.get('disposal', 0)
-
-            # Iterate through the rest of the frames
-            for frame in ImageSequence.Iterator(im):
-                if frame_index == 0: # Skip the first frame as we already handled it
+            for canvas in iter_gif_frames(gif_path):
+                if frame_store is not None:
+                    frame_store.append_image(canvas, canvas.info.get("duration", 0))
                     frame_index += 1
                     continue
-
-                # Get disposal method for the *current* frame (to apply *after* drawing it)
-                disposal_method = frame.info.get('disposal', 0)
-
-                # --- Handle Disposal of *Previous* Frame ---
-                if last_disposal_method == 2: # Restore background
-                    # Create a new transparent canvas area matching the last frame's bbox
-                    # Note: A more precise implementation might use im.dispose region
-                    canvas = Image.new("RGBA", im.size)
-                elif last_disposal_method == 3: # Restore previous (Pillow doesn't easily support this, approximate with not disposing)
-                    # For simplicity, we treat Restore Previous like Do Not Dispose (1)
-                    pass # Keep the canvas as is
-                # For methods 0 and 1, we also keep the canvas as is before pasting
-
-                # --- Paste Current Frame ---
-                # Convert current frame to RGBA
-                frame_rgba = frame.convert("RGBA")
-                # Paste the current frame onto the canvas using its alpha channel as a mask
-                canvas.paste(frame_rgba, (0, 0), frame_rgba)
-
                 # Construct the output filename
                 frame_filename = os.path.join(output_folder, f"frame_{frame_index:03d}.gif")
                 # Save the fully composited canvas
-                canvas.save(frame_filename, "GIF")
-
+                with metrics.measure("write", frame_index) as record:
+                    canvas.save(frame_filename, "GIF")
+                    record["bytes_out"] = os.path.getsize(frame_filename)
                 frame_index += 1
-                last_disposal_method = disposal_method # Update for the next iteration
 
+            if frame_store is not None:
+                print(f"Successfully extracted and composited {frame_index} frames into frame store "
+                      f"{frame_store.store_path}")
+            else:
+                print(f"Successfully extracted and composited {frame_index} frames to {output_folder} as GIF files")
 
-        print(f"Successfully extracted and composited {frame_index} frames to {output_folder} as GIF files")
-
-    except FileNotFoundError:
-        print(f"Error: GIF file not found at {gif_path}")
-    except Exception as e:
-        print(f"An error occurred while processing the GIF: {e}")
+        except FileNotFoundError:
+            metrics.error("decode", f"GIF file not found at {gif_path}")
+        except Exception as e:
+            metrics.error("decode", f"An error occurred while processing the GIF: {e}")
 
 # --- Example Usage ---
 if __name__ == "__main__":
@@ -115,7 +147,23 @@ if __name__ == "__main__":
         print(f"Dummy optimized GIF '{gif_file}' created.")
 
 
-    print("\n--- Processing GIF ---")
-    split_gif_frames(gif_file, output_directory) # Use unified output directory
+    # Set to a file name (e.g. "frames.fstore") to pack every frame into one
+    # frame store instead of writing a GIF file per frame; code_generator.py
+    # can then read it directly (set FRAME_STORE_FILE there). See frame_store.py.
+    frame_store_file = None
+    # Size, inversion and layout the store packs frames with (what TARGET_WIDTH,
+    # TARGET_HEIGHT, INVERT_PIXELS and FRAME_LAYOUT would be in frame_generator.py)
+    frame_store_width = 128
+    frame_store_height = 64
+    frame_store_invert = False
+    frame_store_layout = LAYOUT_HORIZONTAL # or LAYOUT_PAGES
 
-    print("\n--- Video processing skipped as only GIF input is used. ---")
\ No newline at end of file
+    print("\n--- Processing GIF ---")
+    if frame_store_file:
+        with FrameStore.create(frame_store_file, frame_store_width, frame_store_height, frame_store_layout,
+                               frame_store_invert) as store:
+            split_gif_frames(gif_file, None, store)
+    else:
+        split_gif_frames(gif_file, output_directory) # Use unified output directory
+
+    print("\n--- Video processing skipped as only GIF input is used. ---")
@@ -0,0 +1,184 @@
+"""
+Per-stage, per-frame build instrumentation.
+
+Stages (split, convert, generate, pipeline) time their steps (decode,
+resize, pack, parse, build, write, ...) for every frame, with the bytes that
+went in and out and any error. What happens to those records depends on the
+output mode:
+
+    quiet    nothing is printed except errors
+    summary  errors are printed, and one table per stage when it finishes
+    jsonl    every record is written as one JSON line (stdout or a file)
+
+The mode defaults to the ANIMATION_METRICS environment variable, and
+ANIMATION_METRICS_FILE selects the JSON lines file, so CI jobs can switch
+modes without editing the scripts. Custom collectors are plain callables that
+receive every record dict, see Instrumentation.add_collector().
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+
+# --- Configuration ---
+DEFAULT_MODE = os.environ.get("ANIMATION_METRICS", "summary")   # "quiet", "summary" or "jsonl"
+DEFAULT_JSONL_PATH = os.environ.get("ANIMATION_METRICS_FILE")    # None writes JSON lines to stdout
+# --- End Configuration ---
+
+MODE_QUIET = "quiet"
+MODE_SUMMARY = "summary"
+MODE_JSONL = "jsonl"
+METRICS_MODES = (MODE_QUIET, MODE_SUMMARY, MODE_JSONL)
+
+
+class Instrumentation:
+    """
+    Collects timing records and keeps running totals per stage and step.
+
+    Every record is a dict:
+
+        {"stage": "convert", "step": "resize", "frame": "frame_007.gif",
+         "seconds": 0.0012, "bytes_in": 0, "bytes_out": 0, "error": None}
+
+    Records are not kept, only their totals, so memory use does not grow
+    with the number of frames.
+    """
+
+    def __init__(self, mode=DEFAULT_MODE, jsonl_path=DEFAULT_JSONL_PATH):
+        if mode not in METRICS_MODES:
+            raise ValueError(f"Unknown metrics mode '{mode}', expected one of {', '.join(METRICS_MODES)}")
+        self.mode = mode
+        self.collectors = []
+        self.totals = {}         # stage -> step -> [count, seconds, bytes in, bytes out, errors]
+        self.stage_seconds = {}  # stage -> wall time spent inside stage()
+        self.current_stage = None
+        self._jsonl_file = None
+        if mode == MODE_JSONL:
+            self._jsonl_file = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else sys.stdout
+            self.add_collector(self._write_jsonl)
+
+    def add_collector(self, collector):
+        """Registers a callable that is given every record dict as it is made."""
+        self.collectors.append(collector)
+
+    def _write_jsonl(self, record):
+        self._jsonl_file.write(json.dumps(record) + "\n")
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Runs a block as one stage. In summary mode its table is printed when it ends."""
+        previous_stage = self.current_stage
+        self.current_stage = name
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + time.perf_counter() - start
+            self.current_stage = previous_stage
+            if self.mode == MODE_SUMMARY:
+                self.print_summary(name)
+
+    @contextlib.contextmanager
+    def measure(self, step, frame=None, bytes_in=0):
+        """
+        Times a block as one step of the current stage.
+
+        Yields the record dict, so the block can fill in record["bytes_out"].
+        An exception escaping the block is recorded as the step's error and
+        re-raised.
+        """
+        record = self._new_record(step, frame, bytes_in=bytes_in)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            self._add(record)
+
+    def record(self, step, seconds=0.0, frame=None, bytes_in=0, bytes_out=0, error=None, stage=None):
+        """Adds a record measured elsewhere (e.g. in a worker process)."""
+        record = self._new_record(step, frame, seconds, bytes_in, bytes_out, error, stage)
+        self._add(record)
+
+    def error(self, step, message, frame=None):
+        """Records a failed step and prints the message (see print_error())."""
+        self.record(step, frame=frame, error=message)
+        self.print_error(message)
+
+    def print_error(self, message):
+        """Prints an error that is already recorded, unless the mode is jsonl."""
+        if self.mode != MODE_JSONL:
+            print(f"  Error: {message}")
+
+    def replay(self, records):
+        """Adds records collected by another Instrumentation (see RecordList)."""
+        for record in records:
+            self._add(dict(record, stage=record["stage"] or self.current_stage))
+
+    def _new_record(self, step, frame=None, seconds=0.0, bytes_in=0, bytes_out=0, error=None, stage=None):
+        return {
+            "stage": stage or self.current_stage,
+            "step": step,
+            "frame": frame,
+            "seconds": seconds,
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "error": error,
+        }
+
+    def _add(self, record):
+        totals = self.totals.setdefault(record["stage"], {}).setdefault(record["step"], [0, 0.0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += record["seconds"]
+        totals[2] += record["bytes_in"]
+        totals[3] += record["bytes_out"]
+        totals[4] += record["error"] is not None
+        for collector in self.collectors:
+            collector(record)
+
+    def print_summary(self, stage):
+        """Prints the per-step totals of one stage."""
+        steps = self.totals.get(stage)
+        if not steps:
+            return
+        print(f"\n[{stage}] {self.stage_seconds.get(stage, 0.0) * 1000:.1f} ms total")
+        print(f"  {'step':<10} {'count':>6} {'total ms':>10} {'avg ms':>8} {'bytes in':>10} {'bytes out':>10} {'errors':>6}")
+        for step, (count, seconds, bytes_in, bytes_out, errors) in steps.items():
+            print(f"  {step:<10} {count:6d} {seconds * 1000:10.1f} {seconds * 1000 / count:8.3f} "
+                  f"{bytes_in:10d} {bytes_out:10d} {errors:6d}")
+
+    def close(self):
+        """Flushes and closes the JSON lines file, if one was opened."""
+        if self._jsonl_file is not None and self._jsonl_file is not sys.stdout:
+            self._jsonl_file.close()
+            self._jsonl_file = None
+
+
+class RecordList(list):
+    """A collector that keeps every record, e.g. to send them back from a worker process."""
+
+    def __call__(self, record):
+        self.append(record)
+
+
+_current = None
+
+
+def current():
+    """Returns the Instrumentation the build scripts record into, creating a default one."""
+    global _current
+    if _current is None:
+        _current = Instrumentation()
+    return _current
+
+
+def install(instrumentation):
+    """Makes instrumentation the current one. Returns the one it replaces (or None)."""
+    global _current
+    previous = _current
+    _current = instrumentation
+    return previous
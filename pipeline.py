@@ -0,0 +1,682 @@
+import argparse
+import collections
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from image_splitter import iter_gif_frames
+from frame_generator import (
+    FRAME_LAYOUTS,
+    LAYOUT_HORIZONTAL,
+    frame_stack_to_mono_frames,
+    image_to_mono_bytes,
+    images_to_bit_stack,
+    images_to_mono_frames,
+    reduce_image,
+)
+from dithering import DITHER_MODES, DITHER_PILLOW, TEMPORAL_DITHER_MODES, print_dither_report
+from build_cache import DEFAULT_CACHE_DIR, BuildCache, conversion_key, hash_bytes, hash_file
+from frame_asset import ASSET_FILE_NAME, write_frame_asset
+from flash_planner import MERGE_THRESHOLD, plan_flash_budget, print_plan, probe_gif_frames
+from code_generator import (
+    SCRIPT_DIR,
+    TEMPLATE_INO_PATH,
+    TEMPLATE_LITTLEFS_INO_PATH,
+    OUTPUT_INO_PATH,
+    PLACEHOLDER_DEFINITIONS,
+    PLACEHOLDER_LOOP,
+    ensure_output_dir,
+    read_file_content,
+    set_screen_size,
+    FRAME_TIMINGS,
+    TIMING_DELAY,
+    build_asset_code,
+    build_frame_code,
+    write_sketch,
+)
+
+# --- Configuration ---
+DEFAULT_GIF_FILE = "input_videos/test.gif"
+DEFAULT_WIDTH = 128
+DEFAULT_HEIGHT = 64
+FRAMES_IN_FLIGHT = 4   # With --targets, frames queued per worker process (bounds the decoded frames held)
+# --- End Configuration ---
+
+
+def pack_gif_frames(gif_path, target_width, target_height, invert=False, layout=LAYOUT_HORIZONTAL, cache=None,
+                    dither=DITHER_PILLOW):
+    """
+    Decodes a GIF and packs every composited frame straight into 1-bit bytes.
+
+    Args:
+        gif_path (str): Path to the input GIF file.
+        target_width (int): Width of the display in pixels.
+        target_height (int): Height of the display in pixels.
+        invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        layout (str): Frame layout, see frame_generator.FRAME_LAYOUTS.
+        cache (BuildCache): Optional build cache. When the GIF and the
+            conversion parameters are unchanged the GIF is not decoded at all,
+            otherwise only frames without a cached packed result are converted.
+        dither (str): Dithering mode, see dithering.DITHER_MODES. Temporal
+            modes dither all frames together, so their frames are not cached.
+
+    Returns:
+        tuple: (packed_frames, durations) - one packed frame (bytes) and one
+        display time in ms per GIF frame, in playback order.
+    """
+    if dither in TEMPORAL_DITHER_MODES:
+        durations = []
+
+        def gif_frames():
+            for canvas in iter_gif_frames(gif_path):
+                durations.append(canvas.info.get("duration", 0))
+                yield canvas
+
+        packed_frames = images_to_mono_frames(gif_frames(), target_width, target_height, invert, layout, dither)
+        return packed_frames, durations
+
+    if cache is None:
+        packed_frames = []
+        durations = []
+        for frame_number, canvas in enumerate(iter_gif_frames(gif_path)):
+            packed_frames.append(image_to_mono_bytes(canvas, target_width, target_height, invert, layout, frame_number,
+                                                     dither))
+            durations.append(canvas.info.get("duration", 0))
+        return packed_frames, durations
+
+    params_key = conversion_key(target_width, target_height, invert, layout, dither)
+    gif_hash = hash_file(gif_path)
+
+    cached_frames = []
+    split_entry = cache.get_split(gif_hash)
+    if split_entry is not None:
+        frame_hashes, durations = split_entry
+        cached_frames = [cache.get_packed(frame_hash, params_key) for frame_hash in frame_hashes]
+        if all(frame_bytes is not None for frame_bytes in cached_frames):
+            return cached_frames, durations
+
+    packed_frames = []
+    frame_hashes = []
+    durations = []
+    for frame_number, canvas in enumerate(iter_gif_frames(gif_path)):
+        frame_hash = hash_bytes(f"{canvas.mode}{canvas.size}", canvas.tobytes())
+        frame_hashes.append(frame_hash)
+        durations.append(canvas.info.get("duration", 0))
+
+        # Reuse what the split stage lookup already found, otherwise ask the cache
+        if frame_number < len(cached_frames):
+            frame_bytes = cached_frames[frame_number]
+        else:
+            frame_bytes = cache.get_packed(frame_hash, params_key)
+        if frame_bytes is None:
+            frame_bytes = image_to_mono_bytes(canvas, target_width, target_height, invert, layout, frame_number,
+                                              dither)
+            cache.put_packed(frame_hash, params_key, frame_bytes)
+        packed_frames.append(frame_bytes)
+
+    cache.put_split(gif_hash, frame_hashes, durations)
+    return packed_frames, durations
+
+
+def parse_target(spec):
+    """
+    Parses a display target, 'WIDTHxHEIGHT' or 'WIDTHxHEIGHT:invert' (e.g. '128x32:invert').
+
+    Returns:
+        tuple: (width, height, invert)
+    """
+    size, _, option = spec.partition(":")
+    try:
+        width, height = (int(value) for value in size.lower().split("x"))
+    except ValueError:
+        width = height = 0
+    if width <= 0 or height <= 0 or option not in ("", "invert"):
+        raise argparse.ArgumentTypeError(f"'{spec}' is not WIDTHxHEIGHT or WIDTHxHEIGHT:invert")
+    return width, height, option == "invert"
+
+
+def target_output_path(output_ino_path, target):
+    """
+    Sketch path for one target: 'animation_updated/animation_updated.ino' becomes
+    'animation_updated_128x32_inverted/animation_updated_128x32_inverted.ino', next
+    to it (the Arduino IDE wants every sketch in a folder of the same name).
+    """
+    width, height, invert = target
+    sketch_dir = os.path.dirname(os.path.abspath(output_ino_path))
+    sketch_name = os.path.splitext(os.path.basename(output_ino_path))[0]
+    target_name = f"{sketch_name}_{width}x{height}{'_inverted' if invert else ''}"
+    return os.path.join(os.path.dirname(sketch_dir), target_name, target_name + ".ino")
+
+
+def _pack_frame_for_targets(canvas, targets, layout, frame_number, dither):
+    """Resizes and packs one composited frame for every (width, height, invert) target."""
+    return [image_to_mono_bytes(canvas, width, height, invert, layout, frame_number, dither)
+            for width, height, invert in targets]
+
+
+def _pack_worker(job):
+    """
+    Process pool worker for pack_gif_targets(): runs one packing call.
+    Returns (result, records), records being the worker's timing records, to be
+    replayed into the main process's instrumentation.
+    """
+    pack_function, args = job
+    records = instrumentation.RecordList()
+    worker_metrics = instrumentation.Instrumentation(instrumentation.MODE_QUIET)
+    worker_metrics.add_collector(records)
+    previous = instrumentation.install(worker_metrics)
+    try:
+        return pack_function(*args), records
+    finally:
+        instrumentation.install(previous)
+
+
+def _run_pack_jobs(jobs, workers=None):
+    """
+    Runs (slot, function, args) packing jobs taken from an iterator and yields
+    (slot, result) in job order.
+
+    With workers other than 1 the jobs run in worker processes. At most
+    FRAMES_IN_FLIGHT jobs per worker are submitted ahead of the results, so
+    the jobs of a long GIF are never all held at once. Their arguments are
+    pickled after submission and must not change afterwards. With workers=1
+    each job runs before the next one is taken from the iterator.
+    """
+    if workers == 1:
+        for slot, pack_function, args in jobs:
+            yield slot, pack_function(*args)
+        return
+
+    metrics = instrumentation.current()
+    in_flight = FRAMES_IN_FLIGHT * (workers or os.cpu_count() or 1)
+    pending = collections.deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for slot, pack_function, args in jobs:
+            pending.append((slot, executor.submit(_pack_worker, (pack_function, args))))
+            while len(pending) >= in_flight or (pending and pending[0][1].done()):
+                slot, future = pending.popleft()
+                result, records = future.result()
+                metrics.replay(records)
+                yield slot, result
+        while pending:
+            slot, future = pending.popleft()
+            result, records = future.result()
+            metrics.replay(records)
+            yield slot, result
+
+
+def pack_gif_targets(gif_path, targets, layout=LAYOUT_HORIZONTAL, cache=None, dither=DITHER_PILLOW, workers=None):
+    """
+    Decodes and composites a GIF once and packs every frame for several displays.
+
+    Each decoded frame is handed to worker processes that resize and pack it
+    for all targets, so the work of N targets is spread over the CPU cores
+    while the GIF is only decoded once. Only a few frames per worker are in
+    flight at a time, so memory does not grow with the length of the GIF.
+    Temporal dither modes need whole stacks: every frame is resized to a
+    grayscale frame per target as it is decoded, and each target's stack is
+    then dithered and packed by one worker.
+
+    Args:
+        gif_path (str): Path to the input GIF file.
+        targets (list[tuple]): (width, height, invert) of every display, see parse_target().
+        layout (str): Frame layout, see frame_generator.FRAME_LAYOUTS.
+        cache (BuildCache): Optional build cache, used as in pack_gif_frames()
+            for every target. The GIF is not decoded when all targets are cached.
+        dither (str): Dithering mode, see dithering.DITHER_MODES.
+        workers (int): Number of worker processes, None for one per CPU core, 1 to pack in this process.
+
+    Returns:
+        tuple: (target_frames, durations) - the packed frames of every target,
+        in the order of targets, and one display time in ms per GIF frame.
+    """
+    if dither in TEMPORAL_DITHER_MODES:
+        target_stacks = [[] for _ in targets]
+        durations = []
+        for frame_number, canvas in enumerate(iter_gif_frames(gif_path)):
+            durations.append(canvas.info.get("duration", 0))
+            for stack, (width, height, _) in zip(target_stacks, targets):
+                stack.append(reduce_image(canvas, width, height, dither, frame_number))
+        jobs = ((target_index, frame_stack_to_mono_frames, (stack, invert, layout, dither))
+                for target_index, (stack, (_, _, invert)) in enumerate(zip(target_stacks, targets)))
+        return [packed_frames for _, packed_frames in _run_pack_jobs(jobs, workers)], durations
+
+    params_keys = [conversion_key(width, height, invert, layout, dither) for width, height, invert in targets]
+    gif_hash = None
+    cached_frames = [[] for _ in targets]
+    if cache is not None:
+        gif_hash = hash_file(gif_path)
+        split_entry = cache.get_split(gif_hash)
+        if split_entry is not None:
+            frame_hashes, durations = split_entry
+            cached_frames = [[cache.get_packed(frame_hash, params_key) for frame_hash in frame_hashes]
+                             for params_key in params_keys]
+            if all(frame_bytes is not None for frames in cached_frames for frame_bytes in frames):
+                return cached_frames, durations
+
+    target_frames = [[] for _ in targets]
+    frame_hashes = []
+    durations = []
+
+    def frame_jobs():
+        """Yields a job for every decoded frame some target has no cached packed frame for."""
+        for frame_number, canvas in enumerate(iter_gif_frames(gif_path)):
+            durations.append(canvas.info.get("duration", 0))
+            frame_hash = None
+            if cache is not None:
+                frame_hash = hash_bytes(f"{canvas.mode}{canvas.size}", canvas.tobytes())
+                frame_hashes.append(frame_hash)
+
+            missing = []
+            for target_index, params_key in enumerate(params_keys):
+                frame_bytes = None
+                if cache is not None:
+                    # Reuse what the split stage lookup already found, otherwise ask the cache
+                    if frame_number < len(cached_frames[target_index]):
+                        frame_bytes = cached_frames[target_index][frame_number]
+                    else:
+                        frame_bytes = cache.get_packed(frame_hash, params_key)
+                if frame_bytes is None:
+                    missing.append(target_index)
+                target_frames[target_index].append(frame_bytes)
+
+            if missing:
+                # The iterator reuses its canvas, so a frame sent to a worker process is copied
+                frame = canvas if workers == 1 else canvas.copy()
+                yield ((frame_number, frame_hash, missing), _pack_frame_for_targets,
+                       (frame, [targets[i] for i in missing], layout, frame_number, dither))
+
+    for (frame_number, frame_hash, missing), packed in _run_pack_jobs(frame_jobs(), workers):
+        for target_index, frame_bytes in zip(missing, packed):
+            target_frames[target_index][frame_number] = frame_bytes
+            if cache is not None:
+                cache.put_packed(frame_hash, params_keys[target_index], frame_bytes)
+
+    if cache is not None:
+        cache.put_split(gif_hash, frame_hashes, durations)
+    return target_frames, durations
+
+
+def write_generated_sketch(output_ino_path, packed_frames, template_content, codec=False, dirty_rects=False,
+                           target_width=DEFAULT_WIDTH, target_height=DEFAULT_HEIGHT, layout=LAYOUT_HORIZONTAL,
+                           durations=None, timing=TIMING_DELAY):
+    """
+    Builds the sketch for a list of packed frames held in memory and streams it to output_ino_path.
+
+    Args:
+        output_ino_path (str): Where the generated sketch is written.
+        packed_frames (list[bytes]): Packed frames in playback order.
+        template_content (str): Contents of the template .ino file.
+        codec (bool): If True, frames are stored RLE / XOR delta compressed.
+        dirty_rects (bool): If True, only the region that changed is redrawn and sent.
+        target_width (int): Width of the display in pixels.
+        target_height (int): Height of the display in pixels.
+        layout (str): Layout the frames are packed in.
+        durations (list[int]): Optional per-frame display times in ms.
+        timing (str): TIMING_DELAY or TIMING_COMPENSATED, see build_frame_code().
+
+    Returns:
+        bool: True if the sketch was written successfully.
+    """
+    source_names = [f"frame {frame_index:03d}" for frame_index in range(len(packed_frames))]
+    frame_definitions, loop_code_blocks = build_frame_code(
+        packed_frames, source_names, codec, dirty_rects, target_width, target_height, layout,
+        durations, timing
+    )
+    return write_sketch(output_ino_path, template_content, frame_definitions, loop_code_blocks)
+
+
+def load_template(template_path=None, asset=False):
+    """
+    Reads a sketch template and checks it has the frame placeholders.
+
+    Args:
+        template_path (str): Template .ino file. None uses Template/animation.ino,
+            or Template/animation_littlefs.ino with asset=True.
+        asset (bool): If True, the sketch streams its frames from LittleFS.
+
+    Returns:
+        str: The template contents, or None if it is missing or unusable.
+    """
+    if template_path is None:
+        template_path = TEMPLATE_LITTLEFS_INO_PATH if asset else TEMPLATE_INO_PATH
+
+    template_content = read_file_content(template_path)
+    if not template_content:
+        print(f"Error: Could not read the template file '{template_path}'.")
+        return None
+
+    if PLACEHOLDER_DEFINITIONS not in template_content or PLACEHOLDER_LOOP not in template_content:
+        print(f"Error: Placeholders '{PLACEHOLDER_DEFINITIONS}' or '{PLACEHOLDER_LOOP}' not found in '{template_path}'.")
+        return None
+    return template_content
+
+
+def write_build_output(output_ino_path, template_content, packed_frames, durations, target_width, target_height,
+                       invert=False, codec=False, dirty_rects=False, layout=LAYOUT_HORIZONTAL, timing=TIMING_DELAY,
+                       cache=None, asset=False, dither=DITHER_PILLOW):
+    """
+    Writes the sketch for packed frames, and with asset=True the LittleFS frame
+    asset next to it. With a cache, an up-to-date sketch is left alone. The
+    caller saves the cache.
+
+    Args:
+        output_ino_path (str): Where the generated sketch is written.
+        template_content (str): Contents of the template .ino file.
+        packed_frames (list[bytes]): Packed frames in playback order.
+        durations (list[int]): Per-frame display times in ms.
+        target_width (int): Width of the frames in pixels.
+        target_height (int): Height of the frames in pixels.
+        invert, codec, dirty_rects, layout, timing, asset, dither: As for build_animation().
+        cache (BuildCache): Optional build cache.
+
+    Returns:
+        bool: True if the sketch was written successfully.
+    """
+    if dirty_rects and layout == LAYOUT_HORIZONTAL and target_width % 8:
+        # drawWindow() reads SCREEN_WIDTH / 8 bytes per row, the frames only hold whole bytes
+        print(f"Error: Dirty rectangles need a frame width that is a multiple of 8 in the "
+              f"{layout} layout (got {target_width}).")
+        return False
+    if not ensure_output_dir(output_ino_path):
+        return False
+
+    if asset:
+        asset_path = os.path.join(os.path.dirname(output_ino_path), "data", ASSET_FILE_NAME)
+        ok = write_frame_asset(asset_path, packed_frames, durations, target_width, target_height, layout)
+        if ok:
+            frame_definitions, loop_code_blocks = build_asset_code(
+                ASSET_FILE_NAME, len(packed_frames[0]), target_width, target_height, layout, timing
+            )
+            ok = write_sketch(output_ino_path, template_content, frame_definitions, loop_code_blocks)
+        return ok
+
+    if cache is None:
+        return write_generated_sketch(
+            output_ino_path, packed_frames, template_content, codec, dirty_rects, target_width, target_height,
+            layout, durations, timing
+        )
+
+    # Everything the sketch depends on, so an unchanged build is not regenerated
+    build_key = hash_bytes(
+        template_content,
+        f"codec={int(codec)}|dirty_rects={int(dirty_rects)}|timing={timing}|"
+        f"{conversion_key(target_width, target_height, invert, layout, dither)}",
+        repr(durations),
+        *packed_frames
+    )
+    if cache.output_is_current(output_ino_path, build_key):
+        print(f"Sketch '{output_ino_path}' is up to date.")
+        return True
+    ok = write_generated_sketch(
+        output_ino_path, packed_frames, template_content, codec, dirty_rects, target_width, target_height,
+        layout, durations, timing
+    )
+    if ok:
+        cache.put_output(output_ino_path, build_key)
+    return ok
+
+
+def build_animation(gif_path, output_ino_path=OUTPUT_INO_PATH, template_path=None,
+                    target_width=DEFAULT_WIDTH, target_height=DEFAULT_HEIGHT, invert=False, codec=False,
+                    dirty_rects=False, layout=LAYOUT_HORIZONTAL, timing=TIMING_DELAY, cache=None,
+                    flash_budget=None, merge_threshold=MERGE_THRESHOLD, asset=False, dither=DITHER_PILLOW,
+                    dither_report=False):
+    """
+    Runs the whole GIF -> sketch build in one process, without intermediate files.
+
+    Args:
+        gif_path (str): Path to the input GIF file.
+        output_ino_path (str): Where the generated sketch is written.
+        template_path (str): Template .ino containing the frame placeholders. None
+            uses Template/animation.ino, or Template/animation_littlefs.ino with asset=True.
+        target_width (int): Width of the display in pixels.
+        target_height (int): Height of the display in pixels.
+        invert (bool): If True, inverts pixels (white becomes black, black becomes white).
+        codec (bool): If True, frames are stored RLE / XOR delta compressed.
+        dirty_rects (bool): If True, only the region that changed is redrawn and sent.
+        layout (str): LAYOUT_HORIZONTAL (drawBitmap) or LAYOUT_PAGES (copied into the SSD1306 buffer).
+        timing (str): TIMING_DELAY waits each GIF frame duration after drawing,
+            TIMING_COMPENSATED takes the draw time out of the wait.
+        cache (BuildCache): Optional build cache. Unchanged stages are skipped
+            and the cache manifest is saved at the end of the build.
+        flash_budget (int): Optional flash available for frame data, in bytes.
+            The frames are then planned with flash_planner.py: smaller frames,
+            dropped frames and merged near-duplicates are used as needed to fit,
+            and the build stops if nothing fits. Planned frames come from the
+            planner's own decode, so the cache only covers the sketch stage.
+        merge_threshold (int): Largest number of differing pixels at which the
+            planner may merge two frames.
+        asset (bool): If True, the frames are written to a binary asset in the
+            sketch's data/ folder (see frame_asset.py) and the sketch streams
+            them from LittleFS. The codec and dirty rectangles are not
+            supported in this mode, and the sketch stage is not cached.
+        dither (str): Dithering mode, see dithering.DITHER_MODES.
+        dither_report (bool): If True, every dither mode is tried first and
+            the bits each one changes between frames are printed.
+
+    Returns:
+        bool: True if the sketch was written successfully.
+    """
+    if asset and (codec or dirty_rects):
+        print("Error: The frame codec and dirty rectangles are not supported with a LittleFS asset.")
+        return False
+    template_content = load_template(template_path, asset)
+    if template_content is None:
+        return False
+    # The display keeps the requested size even if the flash planner picks smaller, centred frames
+    template_content = set_screen_size(template_content, target_width, target_height)
+
+    plan = None
+    try:
+        if dither_report:
+            previews, _ = probe_gif_frames(gif_path, target_width, target_height)
+            print_dither_report({
+                mode: images_to_bit_stack(previews, target_width, target_height, mode) for mode in DITHER_MODES
+            })
+        if flash_budget is None:
+            packed_frames, durations = pack_gif_frames(gif_path, target_width, target_height, invert, layout, cache,
+                                                       dither)
+        else:
+            previews, source_durations = probe_gif_frames(gif_path, target_width, target_height)
+            with instrumentation.current().measure("plan"):
+                plan, packed_frames, durations = plan_flash_budget(
+                    previews, source_durations, flash_budget, target_width, target_height, invert, layout,
+                    codec, dirty_rects, merge_threshold, dither
+                )
+    except FileNotFoundError:
+        print(f"Error: GIF file not found at {gif_path}")
+        return False
+    except Exception as e:
+        print(f"An error occurred while processing the GIF: {e}")
+        return False
+
+    if plan is not None:
+        print_plan(plan)
+        if not plan["fits"]:
+            print(f"Error: The animation does not fit in {flash_budget} bytes of flash, even at "
+                  f"{plan['width']}x{plan['height']} keeping 1 of every {plan['step']} frames.")
+            return False
+        target_width, target_height = plan["width"], plan["height"]
+
+    print(f"Packed {len(packed_frames)} frames at {target_width}x{target_height} "
+          f"(Inverted: {'Yes' if invert else 'No'}, Dithering: {dither})")
+
+    ok = write_build_output(
+        output_ino_path, template_content, packed_frames, durations, target_width, target_height, invert, codec,
+        dirty_rects, layout, timing, cache, asset, dither
+    )
+    if cache is not None:
+        cache.print_summary(cache.save())
+    return ok
+
+
+def build_targets(gif_path, targets, output_ino_path=OUTPUT_INO_PATH, template_path=None, codec=False,
+                  dirty_rects=False, layout=LAYOUT_HORIZONTAL, timing=TIMING_DELAY, cache=None, asset=False,
+                  dither=DITHER_PILLOW, workers=None):
+    """
+    Builds one sketch per display from a single decode of the GIF.
+
+    Every frame is resized and packed for all targets in parallel (see
+    pack_gif_targets()). Each target's sketch goes to target_output_path()
+    and has SCREEN_WIDTH and SCREEN_HEIGHT set to the target's size.
+    A target listed more than once is only built once.
+
+    Args:
+        gif_path (str): Path to the input GIF file.
+        targets (list[tuple]): (width, height, invert) of every display, see parse_target().
+        output_ino_path (str): Sketch path the target sketch paths are derived from.
+        workers (int): Number of worker processes, None for one per CPU core.
+        template_path, codec, dirty_rects, layout, timing, cache, asset, dither: As for build_animation().
+
+    Returns:
+        bool: True if every target's sketch was written successfully.
+    """
+    if asset and (codec or dirty_rects):
+        print("Error: The frame codec and dirty rectangles are not supported with a LittleFS asset.")
+        return False
+    template_content = load_template(template_path, asset)
+    if template_content is None:
+        return False
+    targets = list(dict.fromkeys(targets))
+
+    try:
+        target_frames, durations = pack_gif_targets(gif_path, targets, layout, cache, dither, workers)
+    except FileNotFoundError:
+        print(f"Error: GIF file not found at {gif_path}")
+        return False
+    except Exception as e:
+        print(f"An error occurred while processing the GIF: {e}")
+        return False
+
+    results = []
+    for (width, height, invert), packed_frames in zip(targets, target_frames):
+        print(f"\nPacked {len(packed_frames)} frames at {width}x{height} "
+              f"(Inverted: {'Yes' if invert else 'No'}, Dithering: {dither})")
+        results.append(write_build_output(
+            target_output_path(output_ino_path, (width, height, invert)),
+            set_screen_size(template_content, width, height), packed_frames, durations, width, height, invert,
+            codec, dirty_rects, layout, timing, cache, asset, dither
+        ))
+
+    if cache is not None:
+        cache.print_summary(cache.save())
+    if not all(results):
+        print(f"Error: {results.count(False)} of {len(targets)} target(s) failed.")
+    return all(results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build an ESP8266 SSD1306 animation sketch straight from a GIF."
+    )
+    parser.add_argument("gif", nargs="?", default=os.path.join(SCRIPT_DIR, DEFAULT_GIF_FILE),
+                        help="input GIF file (default: %(default)s)")
+    parser.add_argument("-o", "--output", default=OUTPUT_INO_PATH,
+                        help="generated sketch path (default: %(default)s)")
+    parser.add_argument("-t", "--template",
+                        help="template sketch path (default: Template/animation.ino, "
+                             "or Template/animation_littlefs.ino with --asset)")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH,
+                        help="display width in pixels (default: %(default)s)")
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT,
+                        help="display height in pixels (default: %(default)s)")
+    parser.add_argument("--invert", action="store_true",
+                        help="invert pixels (white becomes 0, black becomes 1)")
+    parser.add_argument("--targets", nargs="+", type=parse_target, metavar="WxH[:invert]",
+                        help="build one sketch per display from a single decode, e.g. "
+                             "'128x64 128x32:invert 64x48'; replaces --width, --height and --invert, and each "
+                             "sketch goes to a folder named after the output sketch and the target")
+    parser.add_argument("--workers", type=int,
+                        help="with --targets, worker processes that resize and pack frames "
+                             "(default: one per CPU core)")
+    parser.add_argument("--codec", action="store_true",
+                        help="store frames RLE / XOR delta compressed and decode them on the device")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only redraw and send the part of the display that changed")
+    parser.add_argument("--layout", choices=FRAME_LAYOUTS, default=LAYOUT_HORIZONTAL,
+                        help="frame byte layout: drawBitmap rows or native SSD1306 pages (default: %(default)s)")
+    parser.add_argument("--timing", choices=FRAME_TIMINGS, default=TIMING_DELAY,
+                        help="'delay' waits each GIF frame duration after drawing, 'compensated' "
+                             "subtracts the draw time so playback matches the GIF (default: %(default)s)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="incremental build cache directory (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not read or write the build cache")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore cached results and rebuild every stage (the cache is refreshed)")
+    parser.add_argument("--asset", action="store_true",
+                        help="write the frames to data/" + ASSET_FILE_NAME + " next to the sketch and stream "
+                             "them from LittleFS instead of compiling them into the sketch")
+    parser.add_argument("--flash-budget", type=int, metavar="BYTES",
+                        help="flash available for frame data; frame size, frame rate and near-duplicate "
+                             "frames are reduced as needed to fit")
+    parser.add_argument("--merge-threshold", type=int, default=MERGE_THRESHOLD, metavar="PIXELS",
+                        help="with --flash-budget, frames differing in at most this many pixels may be "
+                             "merged (default: %(default)s)")
+    parser.add_argument("--dither", choices=DITHER_MODES, default=DITHER_PILLOW,
+                        help="dithering: Pillow's per-frame Floyd-Steinberg, a plain threshold, ordered "
+                             "Bayer, or error diffusion that keeps unchanged pixels stable between frames "
+                             "(default: %(default)s)")
+    parser.add_argument("--dither-report", action="store_true",
+                        help="print the bits every dither mode changes between frames, and its stored size")
+    parser.add_argument("--metrics", choices=instrumentation.METRICS_MODES, default=instrumentation.DEFAULT_MODE,
+                        help="stage timing output: errors only, a table per stage, or one JSON line per "
+                             "record (default: %(default)s)")
+    parser.add_argument("--metrics-file", default=instrumentation.DEFAULT_JSONL_PATH,
+                        help="with --metrics jsonl, append the records to this file instead of stdout")
+    args = parser.parse_args(argv)
+    if args.targets and (args.flash_budget is not None or args.dither_report):
+        parser.error("--flash-budget and --dither-report work on a single target")
+    if args.targets and len(set(args.targets)) != len(args.targets):
+        # Both would be built into the same sketch folder
+        duplicates = sorted({target for target in args.targets if args.targets.count(target) > 1})
+        parser.error("--targets lists the same display more than once: "
+                     + ", ".join(f"{w}x{h}{':invert' if invert else ''}" for w, h, invert in duplicates))
+    return args
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    args = parse_args()
+    cache = None if args.no_cache else BuildCache(args.cache_dir, force=args.force)
+    metrics = instrumentation.Instrumentation(args.metrics, args.metrics_file)
+    instrumentation.install(metrics)
+    with metrics.stage("pipeline"):
+        if args.targets:
+            ok = build_targets(
+                args.gif,
+                args.targets,
+                output_ino_path=args.output,
+                template_path=args.template,
+                codec=args.codec,
+                dirty_rects=args.dirty_rects,
+                layout=args.layout,
+                timing=args.timing,
+                cache=cache,
+                asset=args.asset,
+                dither=args.dither,
+                workers=args.workers,
+            )
+        else:
+            ok = build_animation(
+                args.gif,
+                output_ino_path=args.output,
+                template_path=args.template,
+                target_width=args.width,
+                target_height=args.height,
+                invert=args.invert,
+                codec=args.codec,
+                dirty_rects=args.dirty_rects,
+                layout=args.layout,
+                timing=args.timing,
+                cache=cache,
+                flash_budget=args.flash_budget,
+                merge_threshold=args.merge_threshold,
+                asset=args.asset,
+                dither=args.dither,
+                dither_report=args.dither_report,
+            )
+    metrics.close()
+    sys.exit(0 if ok else 1)
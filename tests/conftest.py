@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The build scripts are top-level modules in the repository root
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+TEST_GIF_PATH = os.path.join(REPO_DIR, "input_videos", "test.gif")
@@ -0,0 +1,31 @@
+from benchmarks.bench_stages import compare_results
+
+
+def results(**stages):
+    return {"results": {key.replace("__", "/"): {"fps": fps, "peak_memory_kb": memory}
+                        for key, (fps, memory) in stages.items()}}
+
+
+BASELINE = results(small__split=(100.0, 1000), small__convert=(50.0, 2000), test_gif__split=(80.0, 1500))
+
+
+def test_unchanged_results_pass():
+    assert compare_results(BASELINE, BASELINE)
+
+
+def test_slower_or_hungrier_stage_fails():
+    assert not compare_results(BASELINE, results(small__split=(80.0, 1000), small__convert=(50.0, 2000),
+                                                 test_gif__split=(80.0, 1500)), threshold=0.1)
+    assert not compare_results(BASELINE, results(small__split=(100.0, 1000), small__convert=(50.0, 3000),
+                                                 test_gif__split=(80.0, 1500)), memory_threshold=0.25)
+
+
+def test_missing_stage_or_case_fails(capsys):
+    # One stage of a case missing
+    assert not compare_results(BASELINE, results(small__split=(100.0, 1000), test_gif__split=(80.0, 1500)))
+    # A whole case missing
+    assert not compare_results(BASELINE, results(small__split=(100.0, 1000), small__convert=(50.0, 2000)))
+    assert "MISSING" in capsys.readouterr().out
+    # Extra stages in the new results are fine
+    assert compare_results(BASELINE, results(small__split=(100.0, 1000), small__convert=(50.0, 2000),
+                                             test_gif__split=(80.0, 1500), large__split=(10.0, 9000)))
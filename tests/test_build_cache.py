@@ -0,0 +1,128 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import TEST_GIF_PATH
+from build_cache import KEEP_BUILDS, BuildCache, conversion_key
+from dithering import DITHER_BAYER, DITHER_PILLOW, DITHER_THRESHOLD
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES
+from pipeline import build_animation, pack_gif_frames, parse_args
+
+DEFAULT_OPTIONS = {"target_width": 128, "target_height": 64, "invert": False, "layout": LAYOUT_HORIZONTAL,
+                   "dither": DITHER_PILLOW}
+
+
+def pack_with_cache(cache_dir, force=False, **options):
+    """One build's convert stages: packs test.gif through a fresh BuildCache and saves it."""
+    options = {**DEFAULT_OPTIONS, **options}
+    cache = BuildCache(cache_dir, force=force)
+    packed_frames, _ = pack_gif_frames(TEST_GIF_PATH, options["target_width"], options["target_height"],
+                                       options["invert"], options["layout"], cache, options["dither"])
+    cache.save()
+    return cache, packed_frames
+
+
+def build_with_cache(cache_dir, sketch_path, force=False):
+    cache = BuildCache(cache_dir, force=force)
+    assert build_animation(TEST_GIF_PATH, sketch_path, cache=cache)
+    return cache
+
+
+@pytest.fixture(scope="module")
+def filled_cache(tmp_path_factory):
+    """A cache holding one default build of test.gif, and that build's frames."""
+    cache_dir = str(tmp_path_factory.mktemp("filled") / "cache")
+    _, packed_frames = pack_with_cache(cache_dir)
+    return cache_dir, packed_frames
+
+
+def frame_files(cache_dir):
+    frames_dir = os.path.join(cache_dir, "frames")
+    return set(os.listdir(frames_dir)) if os.path.isdir(frames_dir) else set()
+
+
+def test_second_run_is_all_hits(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first, packed_frames = pack_with_cache(cache_dir)
+    assert first.hits == {"split": 0, "convert": 0, "generate": 0}
+    assert first.misses["split"] == 1 and first.misses["convert"] == len(packed_frames)
+
+    second, cached_frames = pack_with_cache(cache_dir)
+    assert cached_frames == packed_frames
+    assert second.hits["split"] == 1 and second.hits["convert"] == len(packed_frames)
+    assert second.misses == {"split": 0, "convert": 0, "generate": 0}
+
+
+@pytest.mark.parametrize("change", [{"target_width": 64}, {"target_height": 32}, {"invert": True},
+                                    {"layout": LAYOUT_PAGES}, {"dither": DITHER_THRESHOLD}])
+def test_changed_conversion_settings_miss(tmp_path, filled_cache, change):
+    cache_dir = str(tmp_path / "cache")
+    shutil.copytree(filled_cache[0], cache_dir)
+    packed_frames = filled_cache[1]
+    cache, changed_frames = pack_with_cache(cache_dir, **change)
+    assert cache.hits["split"] == 1   # Same GIF, its frame hashes are reused
+    assert cache.hits["convert"] == 0 and cache.misses["convert"] == len(packed_frames)
+    assert changed_frames != packed_frames
+    expected, _ = pack_gif_frames(TEST_GIF_PATH, **{**DEFAULT_OPTIONS, **change})
+    assert changed_frames == expected
+
+
+def test_dither_mode_only_keys_non_pillow_modes():
+    base = conversion_key(128, 64, False, LAYOUT_HORIZONTAL)
+    assert conversion_key(128, 64, False, LAYOUT_HORIZONTAL, DITHER_PILLOW) == base
+    assert "dither" not in base
+    keys = {conversion_key(128, 64, False, LAYOUT_HORIZONTAL, mode) for mode in (DITHER_THRESHOLD, DITHER_BAYER)}
+    assert len(keys) == 2 and base not in keys
+    assert all(key.startswith(base) for key in keys)
+
+
+def test_generate_stage_leaves_an_unchanged_sketch_alone(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    sketch_path = str(tmp_path / "animation_updated" / "animation_updated.ino")
+    first = build_with_cache(cache_dir, sketch_path)
+    assert first.misses["generate"] == 1
+    os.utime(sketch_path, ns=(1, 1))
+
+    second = build_with_cache(cache_dir, sketch_path)
+    assert second.hits["generate"] == 1 and second.misses["generate"] == 0
+    assert os.stat(sketch_path).st_mtime_ns == 1
+
+    # A sketch edited by hand is regenerated
+    with open(sketch_path, "a", encoding="utf-8") as f:
+        f.write("// edited\n")
+    third = build_with_cache(cache_dir, sketch_path)
+    assert third.misses["generate"] == 1
+    with open(sketch_path, encoding="utf-8") as f:
+        assert "// edited" not in f.read()
+
+
+def test_unused_entries_are_evicted_with_their_files(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    pack_with_cache(cache_dir, target_width=64)
+    small_files = frame_files(cache_dir)
+    assert small_files
+
+    for build in range(KEEP_BUILDS):
+        cache, _ = pack_with_cache(cache_dir)
+        if build < KEEP_BUILDS - 1:
+            assert small_files <= frame_files(cache_dir)
+    assert not small_files & frame_files(cache_dir)
+    assert all(f"{key}.bin" in frame_files(cache_dir) for key in cache.manifest["convert"])
+
+
+def test_force_rebuilds_everything(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    sketch_path = str(tmp_path / "animation_updated" / "animation_updated.ino")
+    build_with_cache(cache_dir, sketch_path)
+    os.utime(sketch_path, ns=(1, 1))
+
+    forced = build_with_cache(cache_dir, sketch_path, force=True)
+    assert forced.hits == {"split": 0, "convert": 0, "generate": 0}
+    assert forced.misses["split"] == 1 and forced.misses["generate"] == 1
+    assert os.stat(sketch_path).st_mtime_ns != 1
+    # The forced build refreshed the cache for the next one
+    assert build_with_cache(cache_dir, sketch_path).misses == {"split": 0, "convert": 0, "generate": 0}
+
+    assert parse_args([TEST_GIF_PATH, "--force"]).force
+    assert not parse_args([TEST_GIF_PATH]).force
@@ -0,0 +1,26 @@
+import numpy as np
+
+from dirty_rects import I2C_CHUNK_BYTES, compute_dirty_rects, display_transactions, estimate_i2c_bytes, window_transactions
+from frame_generator import pack_mono_pixels
+
+
+def test_window_transactions_follow_send_window():
+    # Six one-byte command transactions, then every page in chunks of up to I2C_CHUNK_BYTES data bytes
+    assert window_transactions((0, 2, 0, 1)) == [3] * 6 + [5, 5]
+    assert estimate_i2c_bytes((0, 9, 0, 7)) == 6 * 3 + 8 * (2 + 10)
+    assert window_transactions((0, 127, 3, 3)) == [3] * 6 + [2 + I2C_CHUNK_BYTES, 2 + 128 - I2C_CHUNK_BYTES]
+    assert estimate_i2c_bytes(None) == 0
+
+
+def test_display_transactions_send_the_whole_buffer():
+    transactions = display_transactions(128, 64)
+    assert sum(size - 2 for size in transactions[2:]) == 128 * 64 // 8
+    assert max(transactions) == 2 + I2C_CHUNK_BYTES
+
+
+def test_dirty_rects_are_page_aligned():
+    first = np.zeros((64, 128), dtype=bool)
+    second = first.copy()
+    second[10, 5] = second[20, 7] = True
+    frames = [pack_mono_pixels(frame).tobytes() for frame in (first, second, second)]
+    assert compute_dirty_rects(frames, 128, 64) == [(0, 127, 0, 7), (5, 7, 1, 2), None]
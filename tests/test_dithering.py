@@ -0,0 +1,33 @@
+import numpy as np
+
+from dithering import DITHER_MODES, bayer_matrix, bit_changes, diffuse_stack, dither_stack
+
+
+def test_slow_fade_still_updates():
+    # 128 frames fading from 0 to 254 in steps of 2, below the temporal tolerance per frame
+    gray = np.repeat(np.arange(0, 256, 2, dtype=np.uint8)[:, None, None], 32, axis=1).repeat(32, axis=2)
+    bits = diffuse_stack(gray)
+    plain = diffuse_stack(gray, tolerance=None)
+    for frame_number in (0, 64, 127):
+        assert abs(bits[frame_number].mean() - plain[frame_number].mean()) < 0.02
+
+
+def test_static_pixels_keep_their_dots():
+    rng = np.random.default_rng(3)
+    gray = np.repeat(rng.integers(0, 256, (1, 24, 32), dtype=np.uint8), 6, axis=0)
+    gray[3:, :8, :8] = 255 - gray[3:, :8, :8]   # only one corner changes, from frame 3 on
+    changes = bit_changes(diffuse_stack(gray))
+    assert changes[1] == changes[2] == changes[4] == changes[5] == 0
+    assert 0 < changes[3] <= 8 * 8 + 8 * 24   # the corner and at most the error it pushes on
+
+
+def test_bayer_matrix():
+    assert bayer_matrix(2).tolist() == [[0, 2], [3, 1]]
+    assert sorted(bayer_matrix(4).ravel().tolist()) == list(range(16))
+
+
+def test_every_mode_returns_a_bool_stack():
+    gray = np.random.default_rng(4).integers(0, 256, (3, 16, 24), dtype=np.uint8)
+    for mode in DITHER_MODES:
+        bits = dither_stack(gray, mode)
+        assert bits.shape == gray.shape and bits.dtype == bool
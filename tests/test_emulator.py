@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import TEST_GIF_PATH
+from emulator import I2C_IDLE_CLOCK, load_animation, replay_frames, simulate_timing
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES, pack_mono_pixels
+from frame_asset import write_frame_asset
+from pipeline import build_animation, pack_gif_frames
+
+
+def build_sketch(tmp_path, **options):
+    sketch_path = os.path.join(tmp_path, "animation_updated", "animation_updated.ino")
+    assert build_animation(TEST_GIF_PATH, sketch_path, **options)
+    return sketch_path
+
+
+def moving_bar_animation(screen_width, screen_height, frame_width=None, layout=LAYOUT_PAGES, frames=4):
+    """A hand-built animation: a vertical bar moving right, packed frame_width wide."""
+    frame_width = frame_width or screen_width
+    pixels = np.zeros((frames, screen_height, frame_width), dtype=bool)
+    for index in range(frames):
+        pixels[index, :, 3 * index:3 * index + 2] = True
+    packed = [frame.tobytes() for frame in pack_mono_pixels(pixels, layout=layout)]
+    return {
+        "source": "test", "screen": (screen_width, screen_height), "frame_size": (frame_width, screen_height),
+        "layout": layout, "codec": False, "dirty_rects": False, "asset": False, "timing": "delay",
+        "frame_delay": 70, "frames": packed, "durations": [0] * frames, "rects": None,
+        "frame_bytes": len(packed[0]), "window_clock": None,
+    }
+
+
+def test_load_sketch_reads_frames_and_settings(tmp_path):
+    sketch_path = build_sketch(tmp_path, layout=LAYOUT_PAGES, dirty_rects=True)
+    packed_frames, durations = pack_gif_frames(TEST_GIF_PATH, 128, 64, layout=LAYOUT_PAGES)
+    animation = load_animation(sketch_path)
+    assert animation["frames"] == packed_frames
+    assert animation["durations"] == durations
+    assert animation["screen"] == animation["frame_size"] == (128, 64)
+    assert animation["layout"] == LAYOUT_PAGES and animation["dirty_rects"] and not animation["codec"]
+    assert animation["frame_bytes"] == 1024
+    assert len(animation["rects"]) == len(packed_frames)
+    assert animation["window_clock"] is None   # The template raises the bus in sendWindow()
+
+
+@pytest.mark.parametrize("layout", [LAYOUT_HORIZONTAL, LAYOUT_PAGES])
+@pytest.mark.parametrize("codec, dirty_rects", [(False, False), (True, False), (False, True), (True, True)])
+def test_generated_sketches_replay_every_frame(tmp_path, layout, codec, dirty_rects):
+    animation = load_animation(build_sketch(tmp_path, layout=layout, codec=codec, dirty_rects=dirty_rects))
+    screens, work, mismatches = replay_frames(animation)
+    assert mismatches == []
+    assert len(screens) == len(work) == len(animation["frames"])
+
+
+@pytest.mark.parametrize("layout, frame_width, frame_bytes", [(LAYOUT_PAGES, 100, 100 * 7),
+                                                           (LAYOUT_HORIZONTAL, 96, 12 * 50)])
+@pytest.mark.parametrize("asset", [False, True])
+def test_width_not_a_byte_multiple_replays(tmp_path, layout, frame_width, frame_bytes, asset):
+    animation = load_animation(build_sketch(tmp_path, layout=layout, target_width=100, target_height=50, asset=asset))
+    assert animation["screen"] == (100, 50)
+    assert animation["frame_size"] == (frame_width, 50)
+    assert animation["frame_bytes"] == frame_bytes
+    assert replay_frames(animation)[2] == []
+
+
+def test_horizontal_dirty_rects_reject_width_not_a_byte_multiple(tmp_path):
+    sketch_path = os.path.join(tmp_path, "animation_updated.ino")
+    assert not build_animation(TEST_GIF_PATH, sketch_path, target_width=100, target_height=50, dirty_rects=True)
+    assert not os.path.exists(sketch_path)
+
+
+def test_asset_replays(tmp_path):
+    packed_frames, durations = pack_gif_frames(TEST_GIF_PATH, 128, 64, layout=LAYOUT_PAGES)
+    asset_path = os.path.join(tmp_path, "animation.bin")
+    assert write_frame_asset(asset_path, packed_frames, durations, 128, 64, LAYOUT_PAGES)
+    animation = load_animation(asset_path)
+    assert animation["asset"] and animation["frames"] == packed_frames
+    assert replay_frames(animation)[2] == []
+
+
+def test_wrong_page_stride_is_detected():
+    # Frames packed 96 columns wide, copied into a 100 pixel wide display buffer
+    animation = moving_bar_animation(100, 50, frame_width=96)
+    assert animation["frame_bytes"] == 672
+    screens, work, mismatches = replay_frames(animation)
+    assert mismatches == [0, 1, 2, 3]
+    assert replay_frames(moving_bar_animation(100, 50))[2] == []
+
+
+def test_corrupted_dirty_rect_is_detected():
+    animation = moving_bar_animation(128, 64)
+    animation["dirty_rects"] = True
+    animation["rects"] = [(0, 1, 0, 7), (0, 4, 0, 7), (3, 7, 0, 7), (6, 10, 0, 7)]
+    assert replay_frames(animation)[2] == []
+    animation["rects"][2] = (3, 6, 0, 7)   # Leaves column 7 of the bar out, frame 3 clears it again
+    assert replay_frames(animation)[2] == [2]
+
+
+def test_send_window_without_clock_change_runs_at_idle_speed(tmp_path):
+    sketch_path = build_sketch(tmp_path, dirty_rects=True)
+    animation = load_animation(sketch_path)
+    work = replay_frames(animation)[1]
+    fast = simulate_timing(animation, work, 400000)
+
+    with open(sketch_path, encoding="utf-8") as f:
+        text = f.read()
+    with open(sketch_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(line for line in text.splitlines() if "Wire.setClock" not in line))
+    animation = load_animation(sketch_path)
+    assert animation["window_clock"] == I2C_IDLE_CLOCK
+    slow = simulate_timing(animation, work, 400000)
+    idle = simulate_timing(animation, work, I2C_IDLE_CLOCK)
+    sent = [index for index, frame in enumerate(fast["frames"]) if frame["i2c_bytes"]]
+    assert sent
+    for index in sent:
+        assert slow["frames"][index]["i2c_ms"] > fast["frames"][index]["i2c_ms"]
+        # Only the window commands still go out at the display's speed
+        assert slow["frames"][index]["i2c_ms"] < idle["frames"][index]["i2c_ms"]
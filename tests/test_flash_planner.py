@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import TEST_GIF_PATH
+from flash_planner import (
+    DEFAULT_FRAME_DELAY,
+    DURATION_ENTRY_BYTES,
+    TABLE_ENTRY_BYTES,
+    estimate_flash_bytes,
+    pack_previews,
+    plan_flash_budget,
+    probe_gif_frames,
+    reduce_frames,
+)
+from frame_codec import encode_frames
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES
+from pipeline import build_animation
+
+CODEC_ESTIMATE_TOLERANCE = 0.1   # Sampled codec estimate vs. the real encode_frames() size
+
+
+@pytest.fixture(scope="module")
+def test_gif_previews():
+    return probe_gif_frames(TEST_GIF_PATH, 128, 64)
+
+
+@pytest.mark.parametrize("budget", [200000, 60000, 20000])
+def test_chosen_plan_fits_the_budget(test_gif_previews, budget):
+    previews, durations = test_gif_previews
+    plan, frames, frame_durations = plan_flash_budget(previews, durations, budget, 128, 64)
+    assert plan["fits"]
+    assert plan["flash_bytes"] <= budget
+    # Without the codec the estimate is exact: distinct frames plus the per-frame tables
+    stored = sum(len(frame) for frame in set(frames))
+    assert plan["flash_bytes"] == stored + (TABLE_ENTRY_BYTES + DURATION_ENTRY_BYTES) * len(frames)
+    assert (plan["width"] // 8) * plan["height"] == len(frames[0])
+    assert len(frame_durations) == len(frames) == plan["frames"]
+    assert sum(frame_durations) == sum(d or DEFAULT_FRAME_DELAY for d in durations)
+
+
+def test_generous_budget_keeps_everything(test_gif_previews):
+    previews, durations = test_gif_previews
+    plan, frames, _ = plan_flash_budget(previews, durations, 10 ** 7, 128, 64)
+    assert (plan["width"], plan["height"], plan["step"], plan["merge_threshold"]) == (128, 64, 1, 0)
+    assert frames == pack_previews(previews, 128, 64)
+
+
+def test_budget_below_every_candidate_fails(test_gif_previews, tmp_path):
+    previews, durations = test_gif_previews
+    plan, frames, _ = plan_flash_budget(previews, durations, 100, 128, 64)
+    assert not plan["fits"]
+    assert plan["flash_bytes"] > 100
+
+    sketch_path = os.path.join(tmp_path, "animation_updated.ino")
+    assert not build_animation(TEST_GIF_PATH, sketch_path, flash_budget=100)
+    assert not os.path.exists(sketch_path)
+
+
+def test_merged_frames_sum_their_durations():
+    a, b, c = bytes(8), bytes([0xFF] * 8), bytes([0x0F] * 8)
+    near_a = bytes([0x01] + [0] * 7)   # One pixel from a
+    frames = [a, a, near_a, b, c, a]
+    durations = [10, 20, 0, 40, 50, 60]
+
+    kept, kept_durations = reduce_frames(frames, durations, merge_threshold=0)
+    assert kept == [a, near_a, b, c, a]
+    assert kept_durations == [30, DEFAULT_FRAME_DELAY, 40, 50, 60]
+
+    kept, kept_durations = reduce_frames(frames, durations, merge_threshold=1)
+    assert kept == [a, b, c, a]
+    assert kept_durations == [30 + DEFAULT_FRAME_DELAY, 40, 50, 60]
+
+    kept, kept_durations = reduce_frames(frames, durations, step=2)
+    assert kept == [a, near_a, c]
+    assert kept_durations == [30, DEFAULT_FRAME_DELAY + 40, 110]
+
+
+@pytest.mark.parametrize("layout", [LAYOUT_HORIZONTAL, LAYOUT_PAGES])
+@pytest.mark.parametrize("step", [1, 2, 3])
+def test_codec_estimate_is_close_to_the_encoded_size(test_gif_previews, layout, step):
+    previews, durations = test_gif_previews
+    frames, _ = reduce_frames(pack_previews(previews, 128, 64, layout=layout), durations, step)
+    tables = (TABLE_ENTRY_BYTES + DURATION_ENTRY_BYTES) * len(frames)
+    estimate = estimate_flash_bytes(frames, codec=True) - tables
+    encoded = sum(len(frame) for frame in encode_frames(frames))
+    assert abs(estimate - encoded) <= CODEC_ESTIMATE_TOLERANCE * encoded
@@ -0,0 +1,76 @@
+import struct
+
+import numpy as np
+import pytest
+
+from frame_asset import HEADER_BYTES, FrameAssetReader, build_frame_asset, write_frame_asset
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES
+
+
+def random_frames(count, frame_bytes, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, frame_bytes, dtype=np.uint8).tobytes() for _ in range(count)]
+
+
+@pytest.mark.parametrize("width, height, layout, frame_bytes", [(128, 64, LAYOUT_HORIZONTAL, 1024),
+                                                                (100, 50, LAYOUT_PAGES, 700)])
+def test_round_trip(tmp_path, width, height, layout, frame_bytes):
+    asset_path = str(tmp_path / "data" / "animation.bin")
+    frames = random_frames(6, frame_bytes)
+    durations = [100, 0, 50, 70000, 20, 30]
+    assert write_frame_asset(asset_path, frames, durations, width, height, layout)
+
+    with FrameAssetReader(asset_path) as asset:
+        assert (asset.width, asset.height, asset.layout, asset.frame_bytes) == (width, height, layout, frame_bytes)
+        assert len(asset) == 6
+        assert [asset.frame(i) for i in range(6)] == frames
+        assert [asset.duration(i) for i in range(6)] == [100, 0, 50, 0xFFFF, 20, 30]
+        assert asset.verify() == []
+        assert asset.verify(layout) == []
+        with pytest.raises(IndexError):
+            asset.frame(6)
+
+
+def test_identical_frames_share_one_offset(tmp_path):
+    a, b, c = random_frames(3, 1024, seed=1)
+    frames = [a, b, a, c, b, a]
+    asset = build_frame_asset(frames, None, 128, 64)
+    data_offset = HEADER_BYTES + 6 * len(frames)
+    assert len(asset) == data_offset + 3 * 1024
+
+    asset_path = str(tmp_path / "animation.bin")
+    with open(asset_path, "wb") as f:
+        f.write(asset)
+    with FrameAssetReader(asset_path) as reader:
+        offsets = [reader.frame_offset(i) for i in range(len(frames))]
+        assert offsets == [data_offset, data_offset + 1024, data_offset, data_offset + 2048,
+                           data_offset + 1024, data_offset]
+        assert [reader.frame(i) for i in range(len(frames))] == frames
+        assert [reader.duration(i) for i in range(len(frames))] == [0] * 6
+
+
+def test_verify_catches_a_corrupted_offset(tmp_path):
+    frames = random_frames(4, 1024, seed=2)
+    asset = bytearray(build_frame_asset(frames, None, 128, 64))
+    asset_path = str(tmp_path / "animation.bin")
+    struct.pack_into("<I", asset, HEADER_BYTES + 4 * 2, len(asset) - 10)   # Frame 2 runs past the end
+    struct.pack_into("<I", asset, HEADER_BYTES + 4 * 3, 5)                 # Frame 3 points into the header
+    with open(asset_path, "wb") as f:
+        f.write(asset)
+    with FrameAssetReader(asset_path) as reader:
+        problems = reader.verify()
+    assert len(problems) == 2
+    assert "frame 2" in problems[0] and "frame 3" in problems[1]
+
+
+def test_verify_catches_the_other_layout(tmp_path):
+    asset_path = str(tmp_path / "animation.bin")
+    assert write_frame_asset(asset_path, random_frames(2, 1024), None, 128, 64, LAYOUT_HORIZONTAL)
+    with FrameAssetReader(asset_path) as reader:
+        assert reader.verify(LAYOUT_HORIZONTAL) == []
+        assert reader.verify(LAYOUT_PAGES) == ["frames are in the horizontal layout, the sketch expects pages"]
+
+
+def test_mismatched_frames_are_rejected():
+    with pytest.raises(ValueError):
+        build_frame_asset([bytes(1024), bytes(1000)], None, 128, 64)
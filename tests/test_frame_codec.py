@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import TEST_GIF_PATH
+from frame_codec import (
+    FRAME_RLE,
+    FRAME_XOR,
+    MAX_LITERAL_RUN,
+    MAX_REPEAT_RUN,
+    decode_frames,
+    encode_frame,
+    encode_frames,
+    rle_decode_into,
+    rle_encode,
+)
+from frame_generator import image_to_mono_bytes
+from image_splitter import iter_gif_frames
+
+
+def rle_decode(encoded, size):
+    buffer = bytearray(size)
+    rle_decode_into(buffer, encoded)
+    return bytes(buffer)
+
+
+def test_round_trip_test_gif():
+    frames = [image_to_mono_bytes(canvas, 128, 64) for canvas in iter_gif_frames(TEST_GIF_PATH)]
+    assert decode_frames(encode_frames(frames), len(frames[0])) == frames
+
+
+@pytest.mark.parametrize("length", [2, MAX_REPEAT_RUN - 1, MAX_REPEAT_RUN, MAX_REPEAT_RUN + 1,
+                                    MAX_REPEAT_RUN + 2, 3 * MAX_REPEAT_RUN])
+def test_repeat_run_limit(length):
+    data = b"\xAA" * length
+    encoded = rle_encode(data)
+    assert rle_decode(encoded, length) == data
+    # A full repeat run is one control byte (0xFF) and the repeated byte
+    if length >= MAX_REPEAT_RUN:
+        assert encoded[:2] == b"\xFF\xAA"
+
+
+@pytest.mark.parametrize("length", [1, MAX_LITERAL_RUN - 1, MAX_LITERAL_RUN, MAX_LITERAL_RUN + 1,
+                                    2 * MAX_LITERAL_RUN + 5])
+def test_literal_run_limit(length):
+    data = bytes(i % 256 for i in range(length))   # no two equal neighbours, so no repeat runs
+    encoded = rle_encode(data)
+    assert rle_decode(encoded, length) == data
+    # Literal runs hold at most MAX_LITERAL_RUN bytes: control 0x7F for a full one
+    full_runs, rest = divmod(length, MAX_LITERAL_RUN)
+    assert len(encoded) == length + full_runs + (1 if rest else 0)
+    if full_runs:
+        assert encoded[0] == MAX_LITERAL_RUN - 1
+
+
+def test_xor_delta_wins_for_small_changes():
+    previous = bytes((i * 37) % 251 for i in range(1024))   # noisy, RLE cannot shrink it
+    frame = bytearray(previous)
+    frame[500] ^= 0x10
+    frame = bytes(frame)
+    encoded = encode_frame(frame, previous)
+    assert encoded[0] == FRAME_XOR
+    assert len(encoded) < len(rle_encode(frame)) // 10
+    assert decode_frames([encode_frame(previous), encoded], len(frame)) == [previous, frame]
+
+
+def test_keyframe_is_never_delta_encoded():
+    frames = [bytes(64), bytes(64)]
+    encoded = encode_frames(frames)
+    assert encoded[0][0] == FRAME_RLE
+    assert decode_frames(encoded, 64) == frames
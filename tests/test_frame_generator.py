@@ -0,0 +1,103 @@
+import itertools
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import TEST_GIF_PATH
+from frame_generator import (
+    LAYOUT_HORIZONTAL,
+    LAYOUT_PAGES,
+    convert_frame_layout,
+    image_to_mono_bytes,
+    pack_mono_pixels,
+    packed_frame_bytes,
+    unpack_mono_pixels,
+)
+from image_splitter import iter_gif_frames
+
+FRAME_STEP = 8   # Every 8th frame of test.gif keeps the per-pixel reference fast enough
+
+
+def reference_mono_bytes(img, target_width, target_height, invert=False):
+    """The original per-pixel packing loop of frame_generator.py, kept as the reference."""
+    img = img.resize((target_width, target_height), Image.LANCZOS)
+    img = img.convert('1')
+    byte_array = bytearray()
+    for y in range(target_height):
+        for x_byte in range(target_width // 8):
+            current_byte = 0
+            for x_bit in range(8):
+                x = x_byte * 8 + x_bit
+                is_on = img.getpixel((x, y)) > 0
+                if invert:
+                    is_on = not is_on
+                if is_on:
+                    current_byte |= (1 << (7 - x_bit))
+            byte_array.append(current_byte)
+    return bytes(byte_array)
+
+
+@pytest.fixture(scope="module")
+def test_gif_frames():
+    return [canvas.copy() for canvas in itertools.islice(iter_gif_frames(TEST_GIF_PATH), 0, None, FRAME_STEP)]
+
+
+@pytest.mark.parametrize("width, height, invert", [(128, 64, False), (128, 64, True), (100, 50, False),
+                                                   (100, 50, True)])
+def test_packing_matches_per_pixel_loop(test_gif_frames, width, height, invert):
+    for frame_number, img in enumerate(test_gif_frames):
+        expected = reference_mono_bytes(img, width, height, invert)
+        assert image_to_mono_bytes(img, width, height, invert) == expected, f"frame {frame_number * FRAME_STEP}"
+
+
+def test_stack_packing_matches_single_frames():
+    rng = np.random.default_rng(0)
+    stack = rng.random((5, 20, 44)) > 0.5
+    packed = pack_mono_pixels(stack)
+    assert packed.shape == (5, 20, 5)
+    for frame, frame_packed in zip(stack, packed):
+        assert np.array_equal(pack_mono_pixels(frame), frame_packed)
+
+
+@pytest.mark.parametrize("layout", [LAYOUT_HORIZONTAL, LAYOUT_PAGES])
+@pytest.mark.parametrize("width, height", [(128, 64), (40, 21)])
+def test_pack_unpack_round_trip(layout, width, height):
+    pixels = np.random.default_rng(1).random((height, width)) > 0.5
+    frame_bytes = pack_mono_pixels(pixels, layout=layout).tobytes()
+    assert np.array_equal(unpack_mono_pixels(frame_bytes, width, height, layout), pixels)
+
+
+@pytest.mark.parametrize("width, height", [(128, 64), (40, 21)])
+def test_layouts_hold_the_same_image(width, height):
+    pixels = np.random.default_rng(2).random((height, width)) > 0.5
+    horizontal = pack_mono_pixels(pixels, layout=LAYOUT_HORIZONTAL).tobytes()
+    pages = pack_mono_pixels(pixels, layout=LAYOUT_PAGES).tobytes()
+    assert convert_frame_layout(horizontal, width, height, LAYOUT_HORIZONTAL, LAYOUT_PAGES) == pages
+    assert convert_frame_layout(pages, width, height, LAYOUT_PAGES, LAYOUT_HORIZONTAL) == horizontal
+
+
+def test_page_bit_order():
+    # 8 columns, 10 rows (two pages, the second only partly used)
+    pixels = np.zeros((10, 8), dtype=bool)
+    pixels[0, 0] = True     # top row of page 0 -> bit 0 of its column byte
+    pixels[7, 1] = True     # bottom row of page 0 -> bit 7
+    pixels[3, 2] = True
+    pixels[8, 3] = True     # first row of page 1
+    pixels[9, 4] = True     # last row of the frame, bit 1 of page 1
+    pages = pack_mono_pixels(pixels, layout=LAYOUT_PAGES).tobytes()
+    assert pages == bytes([0x01, 0x80, 0x08, 0x00, 0x00, 0x00, 0x00, 0x00,
+                           0x00, 0x00, 0x00, 0x01, 0x02, 0x00, 0x00, 0x00])
+    # The horizontal layout packs the same pixels MSB first, one byte per row
+    horizontal = pack_mono_pixels(pixels, layout=LAYOUT_HORIZONTAL).tobytes()
+    assert horizontal == bytes([0x80, 0x00, 0x00, 0x20, 0x00, 0x00, 0x00, 0x40, 0x10, 0x08])
+
+
+@pytest.mark.parametrize("width, height", [(100, 50), (128, 64), (12, 8)])
+def test_pages_frame_fills_the_display_buffer(width, height):
+    # memcpy_P copies FRAME_BYTES into a SCREEN_WIDTH * pages byte buffer, so every column is packed
+    pixels = np.random.default_rng(3).random((height, width)) > 0.5
+    pages = pack_mono_pixels(pixels, layout=LAYOUT_PAGES)
+    assert pages.size == packed_frame_bytes(width, height, LAYOUT_PAGES) == width * ((height + 7) // 8)
+    assert pixels[:, -1].any() and np.array_equal(unpack_mono_pixels(pages.tobytes(), width, height, LAYOUT_PAGES),
+                                                  pixels)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from conftest import TEST_GIF_PATH
+from frame_generator import LAYOUT_HORIZONTAL, LAYOUT_PAGES
+from frame_store import FrameStore
+from image_splitter import split_gif_frames
+from pipeline import pack_gif_frames
+
+
+def random_frames(count, frame_bytes, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, frame_bytes, dtype=np.uint8).tobytes() for _ in range(count)]
+
+
+def test_append_and_read_back(tmp_path):
+    store_path = str(tmp_path / "frames.fstore")
+    frames = random_frames(5, 1024)
+    with FrameStore.create(store_path, 128, 64) as store:
+        for index, frame in enumerate(frames):
+            assert store.append(frame, duration=10 * index, source_hash=f"{index:040x}") == index
+        assert len(store) == 5
+        assert bytes(store[2]) == frames[2]
+        assert bytes(store[-1]) == frames[-1]
+        assert [bytes(frame) for frame in store[1:3]] == frames[1:3]
+        assert list(store.durations) == [0, 10, 20, 30, 40]
+        assert store.duration(3) == 30
+        assert store.source_hash(4) == f"{4:040x}"
+        with pytest.raises(IndexError):
+            store[5]
+        with pytest.raises(ValueError):
+            store.append(bytes(10))
+
+
+def test_reopened_store_keeps_frames_and_settings(tmp_path):
+    store_path = str(tmp_path / "frames.fstore")
+    frames = random_frames(3, 100 * 7)
+    with FrameStore.create(store_path, 100, 50, LAYOUT_PAGES, invert=True) as store:
+        for frame in frames:
+            store.append(frame, duration=70)
+        assert store.source_hash(0) is None
+
+    with FrameStore(store_path) as store:
+        assert (store.width, store.height, store.layout, store.invert) == (100, 50, LAYOUT_PAGES, True)
+        assert store.frame_bytes == 700
+        assert [bytes(frame) for frame in store] == frames
+        assert np.array_equal(store.as_array(), np.frombuffer(b"".join(frames), dtype=np.uint8).reshape(3, 700))
+        assert list(store.durations) == [70, 70, 70]
+        with pytest.raises(IOError):
+            store.append(frames[0])
+
+    # Reopened for appending, new frames follow the old ones
+    with FrameStore(store_path, writable=True) as store:
+        store.append(frames[0], duration=5)
+    with FrameStore(store_path) as store:
+        assert len(store) == 4 and bytes(store[3]) == frames[0] and store.duration(3) == 5
+
+
+def test_append_while_a_frame_view_is_held(tmp_path):
+    store_path = str(tmp_path / "frames.fstore")
+    frames = random_frames(4, 1024, seed=1)
+    with FrameStore.create(store_path, 128, 64) as store:
+        store.append(frames[0])
+        first = store[0]   # Keeps the current mapping alive
+        durations = store.durations
+        for frame in frames[1:]:
+            store.append(frame, duration=20)
+        assert bytes(first) == frames[0]
+        assert len(durations) == 1
+        assert [bytes(frame) for frame in store] == frames
+        assert list(store.durations) == [0, 20, 20, 20]
+    # Closing with views still held leaves them readable
+    assert bytes(first) == frames[0]
+
+
+@pytest.mark.parametrize("width, height, layout, invert", [(128, 64, LAYOUT_HORIZONTAL, False),
+                                                           (100, 50, LAYOUT_PAGES, True)])
+def test_split_into_store_matches_pipeline(tmp_path, width, height, layout, invert):
+    store_path = str(tmp_path / "frames.fstore")
+    with FrameStore.create(store_path, width, height, layout, invert) as store:
+        split_gif_frames(TEST_GIF_PATH, None, store)
+    packed_frames, durations = pack_gif_frames(TEST_GIF_PATH, width, height, invert, layout)
+    with FrameStore(store_path) as store:
+        assert (store.width, store.height, store.layout, store.invert) == (width, height, layout, invert)
+        assert [bytes(frame) for frame in store] == packed_frames
+        assert list(store.durations) == durations
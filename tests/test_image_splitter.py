@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageSequence
+
+from image_splitter import iter_gif_frames
+
+
+def make_optimized_gif(path, disposal, size=(96, 64), frame_count=12):
+    """Writes a GIF with a static background and a moving sprite, saved with
+    optimize=True so frames after the first only update a small rectangle."""
+    width, height = size
+    background = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(background)
+    for x in range(0, width, 16):
+        draw.line((x, 0, x, height), fill="gray")
+
+    frames = []
+    for i in range(frame_count):
+        frame = background.copy()
+        x, y = (i * 7) % (width - 16), (i * 3) % (height - 16)
+        ImageDraw.Draw(frame).ellipse((x, y, x + 15, y + 15), fill="black")
+        frames.append(frame)
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=40, loop=0, optimize=True,
+                   disposal=disposal)
+
+
+@pytest.mark.parametrize("disposal", [0, 1, 2, 3])
+def test_composited_frames_match_pillow(tmp_path, disposal):
+    gif_path = str(tmp_path / f"disposal{disposal}.gif")
+    make_optimized_gif(gif_path, disposal)
+
+    with Image.open(gif_path) as im:
+        expected = [np.asarray(frame.convert("RGBA")) for frame in ImageSequence.Iterator(im)]
+    # The iterator reuses its canvas, so every frame is copied
+    frames = [np.array(canvas) for canvas in iter_gif_frames(gif_path)]
+
+    assert len(frames) == len(expected)
+    for frame_index, (frame, reference) in enumerate(zip(frames, expected)):
+        assert np.array_equal(frame, reference), f"frame {frame_index} differs"
+
+
+def test_frame_durations(tmp_path):
+    gif_path = str(tmp_path / "durations.gif")
+    make_optimized_gif(gif_path, 1)
+    assert [canvas.info["duration"] for canvas in iter_gif_frames(gif_path)] == [40] * 12
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from conftest import TEST_GIF_PATH
+from dithering import DITHER_DIFFUSION, DITHER_PILLOW
+from frame_generator import LAYOUT_HORIZONTAL
+from pipeline import build_targets, pack_gif_frames, pack_gif_targets, parse_args, target_output_path
+
+TARGETS = [(128, 64, False), (64, 32, True), (100, 50, False)]
+
+
+@pytest.fixture(scope="module")
+def single_target_frames():
+    """pack_gif_frames() output per (target, dither), computed once."""
+    frames = {}
+    for dither in (DITHER_PILLOW, DITHER_DIFFUSION):
+        for width, height, invert in TARGETS:
+            frames[(width, height, invert), dither] = pack_gif_frames(TEST_GIF_PATH, width, height, invert,
+                                                                      LAYOUT_HORIZONTAL, dither=dither)
+    return frames
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("dither", [DITHER_PILLOW, DITHER_DIFFUSION])
+def test_targets_match_single_target_packing(single_target_frames, workers, dither):
+    target_frames, durations = pack_gif_targets(TEST_GIF_PATH, TARGETS, dither=dither, workers=workers)
+    assert len(target_frames) == len(TARGETS)
+    for target, packed_frames in zip(TARGETS, target_frames):
+        expected_frames, expected_durations = single_target_frames[target, dither]
+        assert packed_frames == expected_frames, target
+        assert durations == expected_durations
+
+
+def test_target_output_path():
+    output = os.path.join("build", "animation_updated", "animation_updated.ino")
+    assert target_output_path(output, (128, 32, False)) == os.path.abspath(
+        os.path.join("build", "animation_updated_128x32", "animation_updated_128x32.ino"))
+    assert target_output_path(output, (64, 48, True)) == os.path.abspath(
+        os.path.join("build", "animation_updated_64x48_inverted", "animation_updated_64x48_inverted.ino"))
+    paths = {target_output_path(output, target) for target in TARGETS + [(128, 64, True)]}
+    assert len(paths) == len(TARGETS) + 1
+
+
+def test_duplicate_targets_are_rejected():
+    with pytest.raises(SystemExit):
+        parse_args([TEST_GIF_PATH, "--targets", "128x64", "64x32", "128X64"])
+    assert parse_args([TEST_GIF_PATH, "--targets", "128x64", "128x64:invert"]).targets == [(128, 64, False),
+                                                                                          (128, 64, True)]
+
+
+def test_duplicate_targets_are_built_once(tmp_path, capsys):
+    output = str(tmp_path / "animation_updated" / "animation_updated.ino")
+    assert build_targets(TEST_GIF_PATH, [(64, 32, False), (64, 32, False)], output, workers=1)
+    assert capsys.readouterr().out.count("Packed ") == 1
+    assert os.path.exists(target_output_path(output, (64, 32, False)))